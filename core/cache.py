@@ -0,0 +1,120 @@
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from .replicas import en_primaria, version_reciente
+
+PREFIJO_VERSION = 'version'
+
+# Backends que guardan los datos dentro de cada proceso: lo que escribe un worker no lo ve otro
+CACHES_POR_PROCESO = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+def cache_compartida(alias='default'):
+    return settings.CACHES[alias]['BACKEND'] not in CACHES_POR_PROCESO
+
+def _clave_version(nombre):
+    return f'{PREFIJO_VERSION}:{nombre}'
+
+def obtener_version(nombre):
+    """
+    Devuelve la versión actual de un grupo de datos cacheados.
+    La versión es un timestamp en milisegundos, así también sirve como "última modificación".
+    """
+    clave = _clave_version(nombre)
+    version = cache.get(clave)
+    if version is None:
+        # add() no pisa el valor si otro worker lo inicializó primero
+        cache.add(clave, int(time.time() * 1000), timeout=None)
+        version = cache.get(clave)
+    return version
+
+def incrementar_version(nombre):
+    """
+    Invalida todo lo que dependa de este grupo de datos en todos los workers.
+    """
+    clave = _clave_version(nombre)
+    anterior = cache.get(clave) or 0
+    nueva = max(anterior + 1, int(time.time() * 1000))
+    cache.set(clave, nueva, timeout=None)
+    return nueva
+
+def invalidar_version(nombre):
+    """
+    Incrementa la versión ahora (para lecturas dentro de la misma transacción)
+    y otra vez al confirmar, para que otro worker no reconstruya con datos sin commit.
+    """
+    incrementar_version(nombre)
+    transaction.on_commit(lambda: incrementar_version(nombre))
+
+class CacheLRU:
+    """
+    Cache en memoria del worker con tamaño máximo: al llenarse
+    descarta la entrada usada hace más tiempo.
+    """
+    def __init__(self, tamano_maximo):
+        self.tamano_maximo = tamano_maximo
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, clave, defecto=None):
+        with self._lock:
+            if clave not in self._datos:
+                return defecto
+            self._datos.move_to_end(clave)
+            return self._datos[clave]
+
+    def set(self, clave, valor):
+        with self._lock:
+            self._datos[clave] = valor
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.tamano_maximo:
+                self._datos.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._datos.clear()
+
+    def __len__(self):
+        return len(self._datos)
+
+class VersionCondicionalMixin:
+    """
+    Añade ETag débil y Last-Modified a list/retrieve de un ViewSet a partir de
+    la versión de `version_cache`, y responde 304 si el cliente ya la tiene.
+    """
+    version_cache = None
+
+    def list(self, request, *args, **kwargs):
+        return self.respuesta_condicional(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.respuesta_condicional(request, super().retrieve, *args, **kwargs)
+
+    def respuesta_condicional(self, request, vista, *args, **kwargs):
+        version = obtener_version(self.version_cache)
+        etag = f'W/"{self.version_cache}-{version}"'
+        ultima_modificacion = version // 1000
+
+        no_modificado = get_conditional_response(request._request, etag=etag, last_modified=ultima_modificacion)
+        if no_modificado is not None:
+            return no_modificado
+
+        # Justo después de un cambio la réplica puede ir atrasada: no queremos
+        # servir datos viejos con el ETag de la versión nueva
+        if version_reciente(version):
+            with en_primaria():
+                response = vista(request, *args, **kwargs)
+        else:
+            response = vista(request, *args, **kwargs)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(ultima_modificacion)
+        # Que el navegador revalide siempre en lugar de usar su heurística de frescura
+        patch_cache_control(response, no_cache=True)
+        return response
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+from .cache import cache_compartida
+
+@register()
+def revisar_cache_compartida(app_configs, **kwargs):
+    """
+    Las versiones que invalidan los índices en memoria (ranking, tablas públicas)
+    viven en la cache por defecto: si es por proceso, una escritura en un worker
+    no invalida lo que tienen memorizado los demás.
+    """
+    if not settings.DEBUG and not cache_compartida():
+        return [Warning(
+            "La cache por defecto es local a cada proceso: con varios workers las invalidaciones no se propagan.",
+            hint="Configura CACHE_BACKEND con una cache compartida (por ejemplo DatabaseCache o Redis).",
+            id='core.W001',
+        )]
+    return []
@@ -0,0 +1,25 @@
+"""
+Contadores de las métricas públicas y del dashboard. Los guarda dashboard (tabla
+Contador, mantenida por señales y por reconciliar_contadores) y registra su lector
+al arrancar; las demás apps los leen desde aquí sin importar dashboard.
+"""
+QUIZZES_COMPLETADOS = 'quizzes_completados'
+TOTAL_USUARIOS = 'total_usuarios'
+TOTAL_PARTIDOS = 'total_partidos'
+TOTAL_PREGUNTAS = 'total_preguntas'
+
+NOMBRES = (QUIZZES_COMPLETADOS, TOTAL_USUARIOS, TOTAL_PARTIDOS, TOTAL_PREGUNTAS)
+
+_lector = None
+
+def registrar_lector(lector):
+    global _lector
+    _lector = lector
+
+def leer_contadores():
+    """
+    ({nombre: valor}, fecha de la reconciliación más antigua). Sin lector registrado, todo en cero.
+    """
+    if _lector is None:
+        return dict.fromkeys(NOMBRES, 0), None
+    return _lector()
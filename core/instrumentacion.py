@@ -0,0 +1,191 @@
+"""
+Instrumentación opcional de las peticiones (INSTRUMENTACION=true).
+
+InstrumentacionMiddleware mide por petición el tiempo total, el número de consultas
+y el tiempo en base de datos (con execute_wrapper sobre cada conexión), los acumula
+en memoria por vista y acción en histogramas de cubetas geométricas y añade la
+cabecera Server-Timing. /api/dashboard/perf/ muestra los percentiles.
+
+Desactivada, el middleware lanza MiddlewareNotUsed y no queda nada en el camino
+de la petición. Cada worker acumula lo suyo: el endpoint muestra el worker que
+atiende la petición. Funciona con WSGI y con ASGI: las conexiones de Django son
+locales al contexto, así que el execute_wrapper instalado en el event loop también
+cuenta las consultas que el ORM asíncrono lanza en su hilo. En las respuestas en
+streaming solo se mide hasta que empieza el envío.
+"""
+import math
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+PERCENTILES = (50, 90, 99)
+
+class Histograma:
+    """
+    Conteos por cubetas de límites minimo * FACTOR^i: memoria acotada y percentiles
+    con un error relativo de como mucho FACTOR - 1, sin guardar las muestras.
+    """
+    FACTOR = 1.1
+
+    def __init__(self, minimo):
+        self.minimo = minimo
+        self.cubetas = Counter()
+        self.total = 0
+        self.suma = 0
+        self.maximo = 0
+
+    def agregar(self, valor):
+        cubeta = 0 if valor <= self.minimo else math.ceil(math.log(valor / self.minimo, self.FACTOR))
+        self.cubetas[cubeta] += 1
+        self.total += 1
+        self.suma += valor
+        self.maximo = max(self.maximo, valor)
+
+    def percentil(self, p):
+        """
+        Límite superior de la cubeta donde cae el percentil p (nunca mayor que el máximo visto).
+        """
+        objetivo = math.ceil(self.total * p / 100)
+        acumulado = 0
+        for cubeta in sorted(self.cubetas):
+            acumulado += self.cubetas[cubeta]
+            if acumulado >= objetivo:
+                return min(self.minimo * self.FACTOR ** cubeta, self.maximo)
+        return self.maximo
+
+    def resumen(self, decimales=1):
+        redondear = (lambda v: round(v, decimales)) if decimales else math.floor
+        return {
+            **{f'p{p}': redondear(self.percentil(p)) for p in PERCENTILES},
+            'media': round(self.suma / self.total, 1) if self.total else 0,
+            'max': redondear(self.maximo),
+        }
+
+class MetricasEndpoint:
+    def __init__(self):
+        self.tiempo_ms = Histograma(0.1)
+        self.db_ms = Histograma(0.1)
+        # Las consultas son enteras: con mínimo 0.5 la cubeta 0 es solo el 0 y el
+        # suelo del límite de cada cubeta es el mayor entero que puede contener
+        self.consultas = Histograma(0.5)
+
+    def resumen(self):
+        return {
+            'peticiones': self.tiempo_ms.total,
+            'tiempo_total_ms': round(self.tiempo_ms.suma, 1),
+            'tiempo_ms': self.tiempo_ms.resumen(),
+            'db_ms': self.db_ms.resumen(),
+            'consultas': self.consultas.resumen(decimales=0),
+        }
+
+class Estadisticas:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def registrar(self, endpoint, tiempo_ms, db_ms, consultas):
+        with self._lock:
+            metricas = self._endpoints.get(endpoint)
+            if metricas is None:
+                metricas = self._endpoints[endpoint] = MetricasEndpoint()
+            metricas.tiempo_ms.agregar(tiempo_ms)
+            metricas.db_ms.agregar(db_ms)
+            metricas.consultas.agregar(consultas)
+
+    def resumen(self):
+        """
+        [{endpoint, peticiones, tiempo_ms, db_ms, consultas}] de más a menos tiempo acumulado.
+        """
+        with self._lock:
+            filas = [{'endpoint': endpoint, **metricas.resumen()} for endpoint, metricas in self._endpoints.items()]
+        return sorted(filas, key=lambda fila: -fila['tiempo_total_ms'])
+
+    def reiniciar(self):
+        with self._lock:
+            self._endpoints.clear()
+
+estadisticas = Estadisticas()
+
+def instrumentacion_activa():
+    return settings.INSTRUMENTACION
+
+class ContadorConsultas:
+    """
+    execute_wrapper que cuenta las consultas y suma su duración.
+    """
+    def __init__(self):
+        self.consultas = 0
+        self.segundos = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.segundos += time.perf_counter() - inicio
+            self.consultas += 1
+
+def nombre_endpoint(request):
+    """
+    'Vista.accion' para los viewsets y APIView de DRF, 'modulo.funcion' para las
+    vistas de función y 'sin_resolver' si la URL no existe.
+    """
+    resolver_match = getattr(request, 'resolver_match', None)
+    if resolver_match is None:
+        return 'sin_resolver'
+    vista = resolver_match.func
+    clase = getattr(vista, 'cls', None) or getattr(vista, 'view_class', None)
+    metodo = request.method.lower()
+    if clase is None:
+        return f'{vista.__module__}.{vista.__name__}'
+    # Los viewsets guardan en .actions el mapeo método -> acción
+    acciones = getattr(vista, 'actions', None) or {}
+    return f'{clase.__name__}.{acciones.get(metodo, metodo)}'
+
+def _contando_consultas(contador):
+    pila = ExitStack()
+    for conexion in connections.all():
+        pila.enter_context(conexion.execute_wrapper(contador))
+    return pila
+
+class InstrumentacionMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not instrumentacion_activa():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        contador = ContadorConsultas()
+        inicio = time.perf_counter()
+        with _contando_consultas(contador):
+            response = self.get_response(request)
+        return self.registrar(request, response, inicio, contador)
+
+    async def __acall__(self, request):
+        contador = ContadorConsultas()
+        inicio = time.perf_counter()
+        with _contando_consultas(contador):
+            response = await self.get_response(request)
+        return self.registrar(request, response, inicio, contador)
+
+    def registrar(self, request, response, inicio, contador):
+        tiempo_ms = (time.perf_counter() - inicio) * 1000
+        db_ms = contador.segundos * 1000
+
+        estadisticas.registrar(nombre_endpoint(request), tiempo_ms, db_ms, contador.consultas)
+        response['Server-Timing'] = (
+            f'app;dur={tiempo_ms:.1f}, db;dur={db_ms:.1f};desc="{contador.consultas} consultas"'
+        )
+        return response
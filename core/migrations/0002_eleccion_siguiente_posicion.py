@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-18 18:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eleccion',
+            name='siguiente_posicion',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -84,4 +84,7 @@ class Candidato(models.Model):
 class Eleccion(models.Model):
     nombre = models.CharField(max_length=100)
     anio = models.IntegerField(unique=True)
-    actual = models.BooleanField(default=False)
\ No newline at end of file
+    actual = models.BooleanField(default=False)
+    # Próxima Pregunta.posicion de la elección. Solo crece: la posición de una pregunta
+    # borrada no se reutiliza porque sigue siendo su byte en las sesiones empaquetadas
+    siguiente_posicion = models.PositiveIntegerField(default=0, editable=False)
\ No newline at end of file
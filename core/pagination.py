@@ -0,0 +1,28 @@
+from rest_framework.pagination import CursorPagination
+
+class CursorPaginacion(CursorPagination):
+    """
+    Paginación por cursor (keyset) para los listados de administración:
+    cada página es un WHERE id > x, sin OFFSET ni COUNT(*).
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = 'id'
+
+class CursorPaginacionOpcional(CursorPaginacion):
+    """
+    Solo pagina cuando se pide ?cursor= o ?page_size=, así los clientes
+    públicos que esperan una lista plana siguen funcionando.
+    """
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if self.cursor_query_param not in params and self.page_size_query_param not in params:
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+class CursorPaginacionRecientes(CursorPaginacion):
+    """
+    Lo más reciente primero: keyset sobre (-fecha, -id) apoyado en un índice compuesto.
+    """
+    ordering = ('-fecha', '-id')
@@ -0,0 +1,129 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DatabaseError, connections
+
+ALIAS_REPLICA = 'replica'
+
+# Cookie que mantiene al cliente en la primaria justo después de escribir
+COOKIE_PRIMARIA = 'decide_primaria'
+
+# Lo activa LecturaReplicaMixin solo durante las peticiones de lectura
+_usar_replica = ContextVar('usar_replica', default=False)
+
+# Hasta cuándo (time.monotonic) damos la réplica por caída en este worker
+_replica_caida_hasta = 0.0
+
+def replica_configurada():
+    return ALIAS_REPLICA in settings.DATABASES
+
+def replica_disponible():
+    """
+    Comprueba la conexión a la réplica. Si falla, este worker usa la primaria
+    durante REPLICA_REINTENTO_SEGUNDOS antes de volver a intentarlo.
+    """
+    global _replica_caida_hasta
+    if not replica_configurada() or time.monotonic() < _replica_caida_hasta:
+        return False
+    try:
+        # No hace nada si ya hay conexión abierta; conn_health_checks la valida al empezar cada petición
+        connections[ALIAS_REPLICA].ensure_connection()
+    except DatabaseError:
+        _replica_caida_hasta = time.monotonic() + settings.REPLICA_REINTENTO_SEGUNDOS
+        return False
+    return True
+
+@contextmanager
+def leyendo_de_replica():
+    token = _usar_replica.set(True)
+    try:
+        yield
+    finally:
+        _usar_replica.reset(token)
+
+@contextmanager
+def en_primaria():
+    """
+    Fuerza la primaria dentro del bloque. Se usa al reconstruir índices y caches
+    versionadas: si se leyera de una réplica atrasada, el dato viejo quedaría
+    guardado con la versión nueva hasta el siguiente cambio.
+    """
+    token = _usar_replica.set(False)
+    try:
+        yield
+    finally:
+        _usar_replica.reset(token)
+
+def version_reciente(version):
+    """
+    True si la versión (timestamp en ms) cambió hace menos que el retraso tolerado de la réplica.
+    """
+    return time.time() * 1000 - version < settings.REPLICA_RETRASO_SEGUNDOS * 1000
+
+class ReplicaRouter:
+    """
+    Envía las lecturas a la réplica solo dentro de leyendo_de_replica();
+    todo lo demás (escrituras, admin, comandos) va a la primaria.
+    """
+    def db_for_read(self, model, **hints):
+        if _usar_replica.get() and replica_disponible():
+            return ALIAS_REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Réplica y primaria tienen los mismos datos
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+class LecturaReplicaMixin:
+    """
+    Para vistas públicas de lectura: los GET/HEAD/OPTIONS leen de la réplica,
+    salvo que el cliente haya escrito hace poco (cookie de PrimariaTrasEscrituraMiddleware).
+    """
+    def dispatch(self, request, *args, **kwargs):
+        if request.method in ('GET', 'HEAD', 'OPTIONS') and COOKIE_PRIMARIA not in request.COOKIES:
+            with leyendo_de_replica():
+                return super().dispatch(request, *args, **kwargs)
+        return super().dispatch(request, *args, **kwargs)
+
+class PrimariaTrasEscrituraMiddleware:
+    """
+    Tras una escritura correcta marca al cliente con una cookie de vida corta,
+    así sus siguientes lecturas van a la primaria y ve lo que acaba de guardar.
+    Sin réplica configurada se desactiva.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not replica_configurada():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.marcar(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.marcar(request, await self.get_response(request))
+
+    def marcar(self, request, response):
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400:
+            # El frontend llama a la API desde otro origen (CORS con credenciales):
+            # con SameSite=Lax el navegador no la reenviaría en esas peticiones
+            response.set_cookie(
+                COOKIE_PRIMARIA, '1', max_age=settings.REPLICA_RETRASO_SEGUNDOS,
+                httponly=True, samesite='None', secure=True,
+            )
+        return response
@@ -2,6 +2,27 @@ from rest_framework import serializers
 from .models import Usuario, Partido, PartidoMetadata, Candidato, Region, Eleccion
 from django.contrib.auth.password_validation import validate_password
 
+def campos_pedidos(request):
+    """
+    Conjunto de campos de ?fields=a,b,c, o None si no se pidió proyección.
+    """
+    valor = request.query_params.get('fields') if request is not None else None
+    if not valor:
+        return None
+    return {campo.strip() for campo in valor.split(',') if campo.strip()}
+
+class ProyeccionMixin:
+    """
+    Con ?fields= el serializer solo devuelve (y calcula) esos campos; los nombres
+    desconocidos se ignoran.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        campos = campos_pedidos(self.context.get('request'))
+        if campos is not None:
+            for nombre in set(self.fields) - campos:
+                self.fields.pop(nombre)
+
 class RegionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Region
@@ -0,0 +1,12 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .cache import invalidar_version
+from .models import Partido, PartidoMetadata
+
+# Versión de /api/partidos/: cambia con cualquier escritura en Partido o su metadata
+VERSION_PARTIDOS = 'partidos'
+
+@receiver([post_save, post_delete], sender=Partido)
+@receiver([post_save, post_delete], sender=PartidoMetadata)
+def invalidar_partidos(sender, **kwargs):
+    invalidar_version(VERSION_PARTIDOS)
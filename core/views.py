@@ -3,7 +3,10 @@ from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAdminUser, A
 from rest_framework.decorators import action
 from django.shortcuts import get_object_or_404
 from rest_framework.response import Response
+from .cache import VersionCondicionalMixin
+from .replicas import LecturaReplicaMixin
 from .models import Usuario, Partido, Eleccion, Region
+from .signals import VERSION_PARTIDOS
 from .serializers import UsuarioSerializer, PartidoSerializer, EleccionSerializer, CandidatoSerializer, RegionSerializer
 from quiz.models import PartidoRespuesta
 from quiz.serializers import PartidoRespuestaSerializer
@@ -19,16 +22,18 @@ class UsuarioViewSet(viewsets.ModelViewSet):
         # Para cualquier otra acción (list, retrieve, update, delete), solo admin
         return [IsAdminUser()]
 
-class PartidoViewSet(viewsets.ModelViewSet):
-    queryset = Partido.objects.all()
+class PartidoViewSet(LecturaReplicaMixin, VersionCondicionalMixin, viewsets.ModelViewSet):
+    # select_related evita una consulta de metadata por partido al serializar
+    queryset = Partido.objects.select_related('metadata')
     serializer_class = PartidoSerializer
     permission_classes = [AllowAny]
+    version_cache = VERSION_PARTIDOS
 
     # Esta es la acción que estaba causando el error por falta de import
     @action(detail=False, url_path='sigla/(?P<sigla>[^/.]+)')
     def por_sigla(self, request, sigla=None):
         # iexact sirve para que no importe si es mayúscula o minúscula
-        partido = get_object_or_404(Partido, sigla__iexact=sigla)
+        partido = get_object_or_404(self.get_queryset(), sigla__iexact=sigla)
         serializer = self.get_serializer(partido)
         return Response(serializer.data)
 
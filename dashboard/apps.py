@@ -3,3 +3,10 @@ from django.apps import AppConfig
 
 class DashboardConfig(AppConfig):
     name = 'dashboard'
+
+    def ready(self):
+        from core.contadores import registrar_lector
+        from . import signals  # noqa: F401
+        from .contadores import leer_contadores
+
+        registrar_lector(leer_contadores)
@@ -0,0 +1,63 @@
+"""
+Contadores en la tabla Contador: las señales de dashboard/signals.py los mueven
+al crear y borrar, y reconciliar_contadores los recalcula con COUNT(*).
+
+bulk_create, bulk_update y queryset.update no disparan señales. Los que hay hoy no
+tocan nada contado (PartidoRespuesta, PartidoPosicion, respuestas_empaquetadas,
+buffer_pendiente); uno nuevo que cree o borre usuarios, partidos o preguntas, o que
+cambie UsuarioSesion.completado, debe llamar a incrementar(). Para lo que se escape
+(borrados por SQL, restauraciones) hay que programar `manage.py reconciliar_contadores`
+en el cron; /api/metrics/ publica la fecha de la última pasada.
+"""
+from django.db.models import F
+from django.utils import timezone
+from core.contadores import QUIZZES_COMPLETADOS, TOTAL_USUARIOS, TOTAL_PARTIDOS, TOTAL_PREGUNTAS
+from core.models import Usuario, Partido
+from quiz.models import Pregunta, UsuarioSesion, SesionArchivada
+from .models import Contador
+
+# Conteo real de cada contador, solo se usa al reconciliar
+CONSULTAS = {
+    QUIZZES_COMPLETADOS: lambda: (
+        UsuarioSesion.objects.filter(completado=True).count() + SesionArchivada.objects.filter(completado=True).count()
+    ),
+    TOTAL_USUARIOS: lambda: Usuario.objects.count(),
+    TOTAL_PARTIDOS: lambda: Partido.objects.count(),
+    TOTAL_PREGUNTAS: lambda: Pregunta.objects.count(),
+}
+
+def incrementar(nombre, delta=1):
+    """
+    Suma (o resta) al contador en la base de datos, sin leerlo antes.
+    Si la fila aún no existe no hacemos nada: la primera lectura la crea con el conteo real.
+    """
+    Contador.objects.filter(nombre=nombre).update(valor=F('valor') + delta)
+
+def reconciliar_contadores(nombres=None):
+    """
+    Recalcula los contadores con COUNT(*) y guarda la fecha de reconciliación.
+    """
+    ahora = timezone.now()
+    resultado = {}
+    for nombre in nombres or CONSULTAS.keys():
+        valor = CONSULTAS[nombre]()
+        Contador.objects.update_or_create(
+            nombre=nombre,
+            defaults={'valor': valor, 'fecha_reconciliacion': ahora}
+        )
+        resultado[nombre] = valor
+    return resultado
+
+def leer_contadores():
+    """
+    Devuelve ({nombre: valor}, fecha de la reconciliación más antigua) con una sola consulta.
+    """
+    filas = {c.nombre: c for c in Contador.objects.filter(nombre__in=CONSULTAS.keys())}
+
+    faltantes = [nombre for nombre in CONSULTAS if nombre not in filas]
+    if faltantes:
+        reconciliar_contadores(faltantes)
+        filas = {c.nombre: c for c in Contador.objects.filter(nombre__in=CONSULTAS.keys())}
+
+    fechas = [c.fecha_reconciliacion for c in filas.values() if c.fecha_reconciliacion]
+    return {nombre: c.valor for nombre, c in filas.items()}, min(fechas) if fechas else None
@@ -0,0 +1,362 @@
+# Cada importador recibe el archivo, los datos del formulario y un callback opcional
+# de progreso, y devuelve (cuerpo, código HTTP): lo usan las vistas y el worker de importaciones.
+import time
+from django.db import transaction
+from rest_framework import status
+from core.cache import invalidar_version
+from core.models import Eleccion, Partido, Candidato, Region, PartidoMetadata
+from core.serializers import PartidoMetadataImportSerializer
+from quiz.comparacion import VERSION_COMPARACION
+from quiz.models import Pregunta, PartidoRespuesta
+from quiz.posiciones import recalcular_posiciones
+from .utils import leer_filas, en_bloques, es_archivo_valido
+
+# Filas por lote en el upsert de respuestas de partidos
+TAMANO_LOTE_RESPUESTAS = 1000
+
+def normalizar_texto(texto):
+    # Equivalente en memoria de __iexact sobre el valor sin espacios alrededor
+    return (texto or '').strip().casefold()
+
+def _avisar(progreso, filas):
+    if progreso:
+        progreso(filas)
+
+def importar_partidos(archivo, datos, progreso=None):
+    if not archivo:
+        return {"error": "No se envió el archivo"}, 400
+    if not es_archivo_valido(archivo):
+        return {"error": "Sube un archivo CSV o XLSX válido"}, 400
+
+    creados = 0
+    actualizados = 0
+
+    try:
+        # Leemos el archivo por bloques; cada bloque se confirma en su propia transacción
+        for bloque in en_bloques(leer_filas(archivo)):
+            with transaction.atomic():
+                for row in bloque:
+                    # El 'nombre' es nuestra llave para buscar
+                    partido, created = Partido.objects.update_or_create(
+                        nombre=row['nombre'],
+                        defaults={
+                            'nombre_largo': row.get('nombre_largo', ''),
+                            'sigla': row.get('sigla', '')
+                        }
+                    )
+                    if created:
+                        creados += 1
+                    else:
+                        actualizados += 1
+            _avisar(progreso, creados + actualizados)
+
+        return {
+            "status": "Éxito",
+            "msg": f"Proceso completado. Creados: {creados}, Actualizados: {actualizados}"
+        }, 200
+    except Exception as e:
+        # Los bloques anteriores al error ya quedaron guardados
+        return {
+            "error": f"Error en Partidos: {str(e)}",
+            "msg": f"Guardados antes del error. Creados: {creados}, Actualizados: {actualizados}"
+        }, 500
+
+def importar_respuestas_partidos(archivo, datos, progreso=None):
+    inicio = time.perf_counter()
+    anio_eleccion = datos.get('eleccion')
+
+    if not archivo or not anio_eleccion:
+        return {"error": "Faltan datos (archivo o eleccion)"}, 400
+    if not es_archivo_valido(archivo):
+        return {"error": "Sube un archivo CSV o XLSX válido"}, 400
+
+    try:
+        # 1. Validamos la elección
+        eleccion_obj = Eleccion.objects.filter(anio=anio_eleccion).first()
+        if not eleccion_obj:
+            return {"error": f"No existe la elección registrada para el año {anio_eleccion}"}, 404
+
+        # 2. Precargamos los mapas de búsqueda (una consulta por tabla)
+        preguntas, partidos = cargar_mapas(eleccion_obj)
+
+        filas = 0
+        procesadas = 0
+        errores = []
+        partidos_afectados = set()
+
+        # 3. Resolvemos cada bloque en memoria y lo escribimos en su propia transacción
+        for bloque in en_bloques(enumerate(leer_filas(archivo), start=2), TAMANO_LOTE_RESPUESTAS):
+            respuestas, errores_bloque = resolver_filas(bloque, preguntas, partidos)
+            errores.extend(errores_bloque)
+
+            with transaction.atomic():
+                # 4. Upsert apoyado en la restricción única (partido, pregunta)
+                PartidoRespuesta.objects.bulk_create(
+                    [
+                        PartidoRespuesta(partido_id=partido_id, pregunta_id=pregunta_id, valor=valor, fuente=fuente)
+                        for (partido_id, pregunta_id), (valor, fuente) in respuestas.items()
+                    ],
+                    update_conflicts=True,
+                    unique_fields=['partido', 'pregunta'],
+                    update_fields=['valor', 'fuente'],
+                )
+            filas += len(bloque)
+            procesadas += len(respuestas)
+            partidos_afectados.update(partido_id for partido_id, pregunta_id in respuestas)
+            _avisar(progreso, filas)
+
+        with transaction.atomic():
+            # 5. Recalcular las posiciones de los partidos afectados con un solo GROUP BY
+            #    (el upsert masivo no pasa por las señales que las mantienen al día)
+            if partidos_afectados:
+                recalcular_posiciones(eleccion_obj.id, partidos_afectados)
+
+            # bulk_create no dispara señales: invalidamos la tabla comparativa a mano
+            invalidar_version(VERSION_COMPARACION)
+
+        return {
+            "status": "Éxito",
+            "msg": f"Se procesaron {procesadas} respuestas. Se actualizó la posición de {len(partidos_afectados)} partidos.",
+            "errores": errores,
+            "tiempo_segundos": round(time.perf_counter() - inicio, 3)
+        }, status.HTTP_200_OK if not errores else status.HTTP_207_MULTI_STATUS
+    except Exception as e:
+        return {"error": str(e)}, 500
+
+def cargar_mapas(eleccion):
+    """
+    Devuelve {texto normalizado: pregunta_id} de la elección y {nombre o sigla: partido_id}.
+    Ante duplicados gana el id más bajo, igual que el antiguo .first().
+    """
+    preguntas = {}
+    for pregunta_id, texto in Pregunta.objects.filter(eleccion=eleccion).order_by('id').values_list('id', 'texto'):
+        preguntas.setdefault(normalizar_texto(texto), pregunta_id)
+
+    por_nombre, por_sigla = {}, {}
+    for partido_id, nombre, sigla in Partido.objects.order_by('id').values_list('id', 'nombre', 'sigla'):
+        por_nombre.setdefault(normalizar_texto(nombre), partido_id)
+        if sigla:
+            por_sigla.setdefault(normalizar_texto(sigla), partido_id)
+
+    # El nombre tiene prioridad sobre la sigla
+    return preguntas, {**por_sigla, **por_nombre}
+
+def resolver_filas(filas, preguntas, partidos):
+    """
+    Convierte las filas del CSV en {(partido_id, pregunta_id): (valor, fuente)}
+    y acumula un error por cada fila que no se puede importar.
+    """
+    respuestas = {}
+    errores = []
+    for i, row in filas:
+        texto = row.get('pregunta_texto') or ''
+        nombre_partido = row.get('partido') or ''
+
+        pregunta_id = preguntas.get(normalizar_texto(texto))
+        partido_id = partidos.get(normalizar_texto(nombre_partido))
+        if not pregunta_id:
+            errores.append(f"Fila {i}: La pregunta '{texto.strip()}' no existe en esta elección.")
+            continue
+        if not partido_id:
+            errores.append(f"Fila {i}: Partido '{nombre_partido.strip()}' no existe.")
+            continue
+
+        try:
+            valor = int(row.get('valor'))
+        except (TypeError, ValueError):
+            errores.append(f"Fila {i}: Valor '{row.get('valor')}' no es un número.")
+            continue
+        if not -2 <= valor <= 2:
+            errores.append(f"Fila {i}: Valor {valor} fuera de rango (-2 a 2).")
+            continue
+
+        # Si el archivo repite el par (partido, pregunta), gana la última fila
+        respuestas[(partido_id, pregunta_id)] = (valor, row.get('fuente', ''))
+    return respuestas, errores
+
+def importar_preguntas(archivo, datos, progreso=None):
+    anio_eleccion = datos.get('anio') # El año para asociar las preguntas
+
+    if not archivo or not anio_eleccion:
+        return {"error": "Faltan datos: archivo y anio son requeridos"}, 400
+    if not es_archivo_valido(archivo):
+        return {"error": "Sube un archivo CSV o XLSX válido"}, 400
+
+    creadas = 0
+
+    try:
+        # Buscamos la elección
+        eleccion_obj = Eleccion.objects.filter(anio=anio_eleccion).first()
+        if not eleccion_obj:
+            return {"error": f"No existe elección para el año {anio_eleccion}"}, 404
+
+        for bloque in en_bloques(leer_filas(archivo)):
+            with transaction.atomic():
+                for row in bloque:
+                    # Usamos update_or_create para evitar duplicar preguntas si se sube el CSV dos veces
+                    Pregunta.objects.update_or_create(
+                        texto=row['texto'],
+                        eleccion=eleccion_obj,
+                        defaults={
+                            'eje': row['eje'].upper(), # 'X' o 'Y'
+                            'direccion': int(row['direccion']), # 1 o -1
+                            'categoria': row.get('categoria', 'General'), # Evita el error de null
+                            'estado': row.get('estado', 'activa')
+                        }
+                    )
+                    creadas += 1
+            _avisar(progreso, creadas)
+
+        return {
+            "status": "Éxito",
+            "msg": f"Se importaron {creadas} preguntas para la elección {anio_eleccion}."
+        }, 200
+    except Exception as e:
+        # Los bloques anteriores al error ya quedaron guardados
+        return {
+            "error": f"Error al importar preguntas: {str(e)}",
+            "msg": f"Se guardaron {creadas} preguntas antes del error."
+        }, 500
+
+def importar_candidatos(archivo, datos, progreso=None):
+    if not es_archivo_valido(archivo):
+        return {"error": "Sube un archivo CSV o XLSX válido"}, status.HTTP_400_BAD_REQUEST
+
+    try:
+        # Lectura incremental con detección de delimitador (ver dashboard.utils)
+        lector = leer_filas(archivo, como_dict=False)
+
+        next(lector) # Saltar cabecera
+
+        contador_nuevos = 0
+        contador_actualizados = 0
+        errores = []
+        filas = 0
+
+        for bloque in en_bloques(enumerate(lector, start=2)):
+            with transaction.atomic():
+                for i, row in bloque:
+                    # Ignorar filas vacías o mal formadas
+                    if not row or len(row) < 8:
+                        continue
+
+                    try:
+                        # Limpiar espacios de cada columna
+                        nombres, apellidos, cargo, numero, sigla_partido, nombre_region, foto, hojavida = [col.strip() for col in row[:8]]
+
+                        # Buscar Partido y Región
+                        partido = Partido.objects.get(sigla__iexact=sigla_partido)
+                        region = Region.objects.filter(nombre__icontains=nombre_region).first() if nombre_region else None
+
+                        # Evitar duplicados con update_or_create
+                        candidato, created = Candidato.objects.update_or_create(
+                            nombres=nombres,
+                            apellidos=apellidos,
+                            cargo=cargo,
+                            partido=partido, # Agregamos partido al criterio de búsqueda por seguridad
+                            defaults={
+                                'numero': int(numero) if numero and numero.isdigit() else None,
+                                'region_rel': region,
+                                'foto': foto,
+                                'hojavida': hojavida
+                            }
+                        )
+
+                        if created:
+                            contador_nuevos += 1
+                        else:
+                            contador_actualizados += 1
+
+                    except Partido.DoesNotExist:
+                        errores.append(f"Fila {i}: Partido '{sigla_partido}' no existe.")
+                    except Exception as e:
+                        errores.append(f"Fila {i}: {str(e)}")
+            filas += len(bloque)
+            _avisar(progreso, filas)
+
+        return {
+            "message": f"Proceso completado. {contador_nuevos} nuevos, {contador_actualizados} actualizados.",
+            "errores": errores
+        }, status.HTTP_200_OK
+
+    except Exception as e:
+        return {"error": f"Error al leer el archivo: {str(e)}"}, status.HTTP_500_INTERNAL_SERVER_ERROR
+
+def importar_metadata(archivo, datos, progreso=None):
+    if not es_archivo_valido(archivo):
+        return {"error": "Sube un archivo CSV o XLSX válido"}, status.HTTP_400_BAD_REQUEST
+
+    try:
+        # Lectura incremental con detección de delimitador (ver dashboard.utils)
+        lector = leer_filas(archivo, como_dict=False)
+
+        next(lector, None) # Saltar cabecera
+
+        procesados = 0
+        errores = []
+        filas = 0
+
+        for bloque in en_bloques(enumerate(lector, start=2)):
+            with transaction.atomic():
+                for i, row in bloque:
+                    if not row or len(row) < 1:
+                        continue
+
+                    try:
+                        # Extraer datos del CSV (ajusta el orden si es necesario)
+                        # sigla, candidato, lider, color, plan_url, cand_key, anio, tipo
+                        sigla = row[0].strip()
+
+                        # Buscamos el objeto Partido por sigla
+                        partido = Partido.objects.get(sigla__iexact=sigla)
+
+                        # Preparamos los datos para el Serializer
+                        datos_fila = {
+                            'partido': partido.id,
+                            'candidato_presidencial': row[1].strip() if len(row) > 1 else None,
+                            'lider_partido': row[2].strip() if len(row) > 2 else None,
+                            'color_primario': row[3].strip() if len(row) > 3 and row[3] else '#000000',
+                            'plan_gobierno': row[4].strip() if len(row) > 4 else None,
+                            'candidato_key': row[5].strip() if len(row) > 5 and row[5] else 'DEFAULT_CANDIDATE',
+                            'anio_fundacion': int(row[6].strip()) if len(row) > 6 and row[6].strip().isdigit() else None,
+                            'tipo_organizacion': row[7].strip() if len(row) > 7 and row[7] else 'Partido Político'
+                        }
+
+                        # Instanciamos el Serializer para validar
+                        serializer = PartidoMetadataImportSerializer(data=datos_fila)
+
+                        if serializer.is_valid():
+                            # Usamos update_or_create con los datos ya validados
+                            PartidoMetadata.objects.update_or_create(
+                                partido=partido,
+                                defaults=serializer.validated_data
+                            )
+                            procesados += 1
+                        else:
+                            # Capturamos errores de validación (ej: URL mal formada)
+                            errores.append(f"Fila {i} ({sigla}): {serializer.errors}")
+
+                    except Partido.DoesNotExist:
+                        errores.append(f"Fila {i}: La sigla '{sigla}' no existe.")
+                    except Exception as e:
+                        errores.append(f"Fila {i}: Error -> {str(e)}")
+            filas += len(bloque)
+            _avisar(progreso, filas)
+
+        return {
+            "status": "proceso completado",
+            "metadata_procesada": procesados,
+            "errores": errores
+        }, status.HTTP_200_OK if not errores else status.HTTP_207_MULTI_STATUS
+
+    except Exception as e:
+        return {"error": f"Error crítico: {str(e)}"}, status.HTTP_500_INTERNAL_SERVER_ERROR
+
+# Tipo de importación -> (función, parámetros obligatorios del formulario)
+IMPORTADORES = {
+    'partidos': (importar_partidos, []),
+    'respuestas': (importar_respuestas_partidos, ['eleccion']),
+    'preguntas': (importar_preguntas, ['anio']),
+    'candidatos': (importar_candidatos, []),
+    'metadata': (importar_metadata, []),
+}
@@ -0,0 +1,87 @@
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .importadores import IMPORTADORES
+from .models import ImportacionJob
+from .utils import contar_filas
+
+logger = logging.getLogger(__name__)
+
+def encolar_importacion(tipo, archivo, datos, usuario=None):
+    parametros = {clave: datos.get(clave) for clave in IMPORTADORES[tipo][1]}
+    return ImportacionJob.objects.create(
+        tipo=tipo,
+        archivo=archivo,
+        parametros=parametros,
+        usuario=usuario if usuario and usuario.is_authenticated else None,
+    )
+
+def recuperar_jobs_abandonados():
+    """
+    Devuelve a la cola los jobs 'procesando' sin avances en IMPORTACION_JOB_TIMEOUT
+    segundos (el worker que los tenía murió) y da por fallidos los que ya agotaron
+    IMPORTACION_JOB_INTENTOS. Devuelve (reencolados, fallidos).
+    """
+    ahora = timezone.now()
+    abandonados = ImportacionJob.objects.filter(
+        estado='procesando',
+        fecha_latido__lt=ahora - timedelta(seconds=settings.IMPORTACION_JOB_TIMEOUT),
+    )
+    fallidos = abandonados.filter(intentos__gte=settings.IMPORTACION_JOB_INTENTOS).update(
+        estado='error',
+        resultado={"error": "El worker dejó de responder en todos los intentos"},
+        codigo_estado=500,
+        fecha_fin=ahora,
+    )
+    reencolados = abandonados.update(estado='pendiente', filas_procesadas=0, fecha_inicio=None, fecha_latido=None)
+    if reencolados or fallidos:
+        logger.warning("Jobs abandonados: %s reencolados, %s fallidos", reencolados, fallidos)
+    return reencolados, fallidos
+
+def tomar_siguiente_job():
+    """
+    Reserva el job pendiente más antiguo. skip_locked permite varios workers
+    sobre la misma tabla sin que dos tomen el mismo job.
+    """
+    recuperar_jobs_abandonados()
+    with transaction.atomic():
+        job = (
+            ImportacionJob.objects.select_for_update(skip_locked=True)
+            .filter(estado='pendiente')
+            .order_by('id')
+            .first()
+        )
+        if job:
+            job.estado = 'procesando'
+            job.fecha_inicio = job.fecha_latido = timezone.now()
+            job.intentos += 1
+            job.save(update_fields=['estado', 'fecha_inicio', 'fecha_latido', 'intentos'])
+        return job
+
+def ejecutar_job(job):
+    importar, _ = IMPORTADORES[job.tipo]
+    # Si el job se reencoló mientras tanto, este intento ya no escribe su estado
+    este_intento = ImportacionJob.objects.filter(pk=job.pk, estado='procesando', intentos=job.intentos)
+
+    def progreso(filas):
+        este_intento.update(filas_procesadas=filas, fecha_latido=timezone.now())
+
+    try:
+        with job.archivo.open('rb') as archivo:
+            este_intento.update(filas_totales=contar_filas(archivo), fecha_latido=timezone.now())
+            cuerpo, codigo = importar(archivo, job.parametros, progreso)
+    except Exception as e:
+        logger.exception("Falló la importación %s", job.pk)
+        cuerpo, codigo = {"error": str(e)}, 500
+
+    terminado = este_intento.update(
+        estado='completado' if codigo < 400 else 'error',
+        resultado=cuerpo,
+        codigo_estado=codigo,
+        fecha_fin=timezone.now(),
+    )
+    # El archivo ya no hace falta una vez procesado
+    if terminado:
+        job.archivo.delete(save=False)
@@ -0,0 +1,24 @@
+import time
+from django.core.management.base import BaseCommand
+from dashboard.jobs import tomar_siguiente_job, ejecutar_job
+
+class Command(BaseCommand):
+    help = "Worker de importaciones: procesa los ImportacionJob pendientes usando la base de datos como cola."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--una-vez', action='store_true', help="Vacía la cola y termina en lugar de quedarse esperando.")
+        parser.add_argument('--intervalo', type=float, default=2.0, help="Segundos entre consultas cuando la cola está vacía.")
+
+    def handle(self, *args, **options):
+        while True:
+            job = tomar_siguiente_job()
+            if job:
+                self.stdout.write(f"Procesando {job}...")
+                ejecutar_job(job)
+                job.refresh_from_db()
+                self.stdout.write(f"{job}: {job.filas_procesadas} filas")
+                continue
+
+            if options['una_vez']:
+                break
+            time.sleep(options['intervalo'])
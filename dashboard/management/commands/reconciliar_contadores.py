@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from dashboard.contadores import reconciliar_contadores
+
+class Command(BaseCommand):
+    help = "Recalcula los contadores del dashboard con COUNT(*). Pensado para ejecutarse periódicamente (cron)."
+
+    def handle(self, *args, **options):
+        for nombre, valor in reconciliar_contadores().items():
+            self.stdout.write(f"{nombre}: {valor}")
+        self.stdout.write(self.style.SUCCESS("Contadores reconciliados."))
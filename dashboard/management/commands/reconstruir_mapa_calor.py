@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from dashboard.mapa_calor import reconstruir_mapa_calor
+
+class Command(BaseCommand):
+    help = "Regenera el mapa de calor desde las sesiones completadas (recorre la tabla con un cursor del servidor)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=10_000, help="Filas que trae el cursor en cada viaje.")
+
+    def handle(self, *args, **options):
+        sesiones, celdas = reconstruir_mapa_calor(options['lote'])
+        self.stdout.write(self.style.SUCCESS(f"Mapa de calor reconstruido: {sesiones} sesiones en {celdas} celdas."))
@@ -0,0 +1,96 @@
+from collections import Counter
+from itertools import chain
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from quiz.models import UsuarioSesion, SesionArchivada
+from .models import CeldaMapaCalor
+
+# Rejilla de 20 x 20 celdas de 10 puntos sobre el plano de -100 a 100
+CELDAS_POR_EJE = 20
+LIMITE = 100
+
+def celda(valor):
+    # Redondeamos como la columna decimal(5,2) para que el float recién calculado
+    # y el valor leído de la base caigan siempre en la misma celda
+    indice = int((round(float(valor), 2) + LIMITE) * CELDAS_POR_EJE // (2 * LIMITE))
+    # 100 exacto cae en la última celda en lugar de abrir una 21
+    return max(0, min(CELDAS_POR_EJE - 1, indice))
+
+def clave_sesion(eleccion_id, region_id, completado, resultado_x, resultado_y):
+    """
+    Celda (eleccion, region, x, y) en la que cuenta una sesión, o None si no cuenta.
+    """
+    if not completado or eleccion_id is None or resultado_x is None or resultado_y is None:
+        return None
+    return eleccion_id, region_id, celda(resultado_x), celda(resultado_y)
+
+def sumar(clave, delta):
+    """
+    Suma delta a una celda con un UPDATE ... SET total = total + delta,
+    creando la fila la primera vez que se usa.
+    """
+    eleccion_id, region_id, celda_x, celda_y = clave
+    filtro = {'eleccion_id': eleccion_id, 'region_id': region_id, 'celda_x': celda_x, 'celda_y': celda_y}
+    if CeldaMapaCalor.objects.filter(**filtro).update(total=F('total') + delta):
+        return
+    try:
+        with transaction.atomic():
+            CeldaMapaCalor.objects.create(total=delta, **filtro)
+    except IntegrityError:
+        # Otro worker la creó entre el UPDATE y el INSERT
+        CeldaMapaCalor.objects.filter(**filtro).update(total=F('total') + delta)
+
+def mover(antes, despues):
+    """
+    Aplica el cambio de celda de una sesión (cualquiera de las dos claves puede ser None).
+    """
+    if antes == despues:
+        return
+    if antes is not None:
+        sumar(antes, -1)
+    if despues is not None:
+        sumar(despues, 1)
+
+def leer_mapa_calor(eleccion_id, region_id=None):
+    """
+    Devuelve (conteos[y][x], total) de la elección; sin región suma todas las regiones.
+    """
+    celdas = CeldaMapaCalor.objects.filter(eleccion_id=eleccion_id)
+    if region_id is not None:
+        celdas = celdas.filter(region_id=region_id)
+
+    conteos = [[0] * CELDAS_POR_EJE for _ in range(CELDAS_POR_EJE)]
+    total = 0
+    for celda_x, celda_y, suma in celdas.values_list('celda_x', 'celda_y').annotate(suma=Sum('total')):
+        conteos[celda_y][celda_x] = suma
+        total += suma
+    return conteos, total
+
+def reconstruir_mapa_calor(tamano_lote=10_000):
+    """
+    Recalcula todas las celdas desde las sesiones completadas, activas y archivadas.
+    iterator() usa un cursor del lado del servidor en PostgreSQL, así que la tabla
+    de sesiones nunca se carga entera en memoria; solo el contador de celdas.
+    """
+    conteo = Counter()
+    sesiones = chain.from_iterable(
+        modelo.objects.filter(completado=True)
+        .values_list('eleccion_id', 'region_id', 'resultado_x', 'resultado_y')
+        .iterator(chunk_size=tamano_lote)
+        for modelo in (UsuarioSesion, SesionArchivada)
+    )
+    for eleccion_id, region_id, x, y in sesiones:
+        clave = clave_sesion(eleccion_id, region_id, True, x, y)
+        if clave is not None:
+            conteo[clave] += 1
+
+    with transaction.atomic():
+        CeldaMapaCalor.objects.all().delete()
+        CeldaMapaCalor.objects.bulk_create(
+            [
+                CeldaMapaCalor(eleccion_id=e, region_id=r, celda_x=cx, celda_y=cy, total=total)
+                for (e, r, cx, cy), total in conteo.items()
+            ],
+            batch_size=1000,
+        )
+    return sum(conteo.values()), len(conteo)
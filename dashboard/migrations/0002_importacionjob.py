@@ -0,0 +1,37 @@
+# Generated by Django 6.0.1 on 2026-10-18 09:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportacionJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('partidos', 'Partidos'), ('respuestas', 'Respuestas de partidos'), ('preguntas', 'Preguntas'), ('candidatos', 'Candidatos'), ('metadata', 'Metadata de partidos')], max_length=20)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('procesando', 'Procesando'), ('completado', 'Completado'), ('error', 'Error')], default='pendiente', max_length=20)),
+                ('archivo', models.FileField(upload_to='importaciones/')),
+                ('parametros', models.JSONField(blank=True, default=dict)),
+                ('filas_totales', models.IntegerField(blank=True, null=True)),
+                ('filas_procesadas', models.IntegerField(default=0)),
+                ('resultado', models.JSONField(blank=True, null=True)),
+                ('codigo_estado', models.IntegerField(blank=True, null=True)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_inicio', models.DateTimeField(blank=True, null=True)),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True)),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['estado', 'id'], name='importacionjob_cola_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 6.0.1 on 2026-10-18 10:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('dashboard', '0002_importacionjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CeldaMapaCalor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('celda_x', models.PositiveSmallIntegerField()),
+                ('celda_y', models.PositiveSmallIntegerField()),
+                ('total', models.BigIntegerField(default=0)),
+                ('eleccion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.eleccion')),
+                ('region', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='core.region')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(condition=models.Q(('region__isnull', False)), fields=('eleccion', 'region', 'celda_x', 'celda_y'), name='celdamapacalor_region_unica'), models.UniqueConstraint(condition=models.Q(('region__isnull', True)), fields=('eleccion', 'celda_x', 'celda_y'), name='celdamapacalor_sin_region_unica')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-18 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0003_celdamapacalor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importacionjob',
+            name='fecha_latido',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='importacionjob',
+            name='intentos',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
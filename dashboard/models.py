@@ -1,3 +1,87 @@
+from django.conf import settings
 from django.db import models
 
-# Create your models here.
+class Contador(models.Model):
+    """
+    Totales desnormalizados para las métricas públicas y del dashboard.
+    Las señales los mantienen al día y reconciliar_contadores corrige la deriva.
+    """
+    nombre = models.CharField(max_length=50, unique=True)
+    valor = models.BigIntegerField(default=0)
+    fecha_reconciliacion = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.nombre}: {self.valor}'
+
+class ImportacionJob(models.Model):
+    """
+    Importación encolada desde el dashboard. La procesa el comando procesar_importaciones.
+    """
+    TIPOS = (
+        ('partidos', 'Partidos'),
+        ('respuestas', 'Respuestas de partidos'),
+        ('preguntas', 'Preguntas'),
+        ('candidatos', 'Candidatos'),
+        ('metadata', 'Metadata de partidos'),
+    )
+    ESTADOS = (
+        ('pendiente', 'Pendiente'),
+        ('procesando', 'Procesando'),
+        ('completado', 'Completado'),
+        ('error', 'Error'),
+    )
+
+    tipo = models.CharField(max_length=20, choices=TIPOS)
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='pendiente')
+    archivo = models.FileField(upload_to='importaciones/')
+    parametros = models.JSONField(default=dict, blank=True)
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+
+    filas_totales = models.IntegerField(null=True, blank=True)
+    filas_procesadas = models.IntegerField(default=0)
+    resultado = models.JSONField(null=True, blank=True)
+    codigo_estado = models.IntegerField(null=True, blank=True)
+
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_inicio = models.DateTimeField(null=True, blank=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+    # Lo renueva el worker con cada avance; si se para, el job vuelve a la cola
+    fecha_latido = models.DateTimeField(null=True, blank=True)
+    intentos = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        # El worker busca siempre el pendiente más antiguo
+        indexes = [models.Index(fields=['estado', 'id'], name='importacionjob_cola_idx')]
+
+    def __str__(self):
+        return f'{self.tipo} #{self.id} ({self.estado})'
+
+class CeldaMapaCalor(models.Model):
+    """
+    Histograma 2D de los resultados de las sesiones completadas por elección y región.
+    Cada fila es una celda de la rejilla; las señales de UsuarioSesion la mantienen al día
+    y reconstruir_mapa_calor la regenera desde cero.
+    """
+    eleccion = models.ForeignKey('core.Eleccion', on_delete=models.CASCADE)
+    region = models.ForeignKey('core.Region', on_delete=models.CASCADE, null=True, blank=True)
+    celda_x = models.PositiveSmallIntegerField()
+    celda_y = models.PositiveSmallIntegerField()
+    total = models.BigIntegerField(default=0)
+
+    class Meta:
+        # Dos índices parciales porque NULL no cuenta como duplicado en un UNIQUE normal
+        constraints = [
+            models.UniqueConstraint(
+                fields=['eleccion', 'region', 'celda_x', 'celda_y'],
+                condition=models.Q(region__isnull=False),
+                name='celdamapacalor_region_unica',
+            ),
+            models.UniqueConstraint(
+                fields=['eleccion', 'celda_x', 'celda_y'],
+                condition=models.Q(region__isnull=True),
+                name='celdamapacalor_sin_region_unica',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.eleccion_id}/{self.region_id} ({self.celda_x}, {self.celda_y}): {self.total}'
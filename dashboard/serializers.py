@@ -1,4 +1,6 @@
+from django.utils import timezone
 from rest_framework import serializers
+from .models import ImportacionJob
 
 class CargaMasivaSerializer(serializers.Serializer):
     """
@@ -14,4 +16,43 @@ class EstadisticasDashboardSerializer(serializers.Serializer):
     total_usuarios = serializers.IntegerField()
     total_partidos = serializers.IntegerField()
     test_completados = serializers.IntegerField()
-    test_en_progreso = serializers.IntegerField()
\ No newline at end of file
+    test_en_progreso = serializers.IntegerField()
+
+class ImportacionJobSerializer(serializers.ModelSerializer):
+    """
+    Estado de un job de importación para que el dashboard pueda hacer polling.
+    """
+    errores = serializers.SerializerMethodField()
+    filas_por_segundo = serializers.SerializerMethodField()
+    eta_segundos = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ImportacionJob
+        fields = [
+            'id', 'tipo', 'estado', 'parametros',
+            'filas_totales', 'filas_procesadas', 'filas_por_segundo', 'eta_segundos',
+            'errores', 'resultado', 'codigo_estado',
+            'intentos', 'fecha_creacion', 'fecha_inicio', 'fecha_fin'
+        ]
+
+    def get_errores(self, obj):
+        if not obj.resultado:
+            return []
+        if 'error' in obj.resultado:
+            return [obj.resultado['error']]
+        return obj.resultado.get('errores', [])
+
+    def get_filas_por_segundo(self, obj):
+        if not obj.fecha_inicio:
+            return None
+        fin = obj.fecha_fin or timezone.now()
+        segundos = (fin - obj.fecha_inicio).total_seconds()
+        return round(obj.filas_procesadas / segundos, 1) if segundos > 0 else None
+
+    def get_eta_segundos(self, obj):
+        if obj.estado != 'procesando' or not obj.filas_totales:
+            return None
+        velocidad = self.get_filas_por_segundo(obj)
+        if not velocidad:
+            return None
+        return round(max(obj.filas_totales - obj.filas_procesadas, 0) / velocidad, 1)
@@ -0,0 +1,72 @@
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+from core.models import Usuario, Partido
+from quiz.archivo import archivando
+from quiz.models import Pregunta, UsuarioSesion
+from .contadores import (
+    incrementar, QUIZZES_COMPLETADOS, TOTAL_USUARIOS, TOTAL_PARTIDOS, TOTAL_PREGUNTAS
+)
+from . import mapa_calor
+
+# Campos de UsuarioSesion que deciden su celda del mapa de calor
+CAMPOS_MAPA_CALOR = ('eleccion_id', 'region_id', 'completado', 'resultado_x', 'resultado_y')
+
+# Celda desconocida: algún campo venía diferido y no podemos saber dónde contaba
+DESCONOCIDA = object()
+
+CONTADOR_POR_MODELO = {
+    Usuario: TOTAL_USUARIOS,
+    Partido: TOTAL_PARTIDOS,
+    Pregunta: TOTAL_PREGUNTAS,
+}
+
+@receiver(post_save, sender=Usuario)
+@receiver(post_save, sender=Partido)
+@receiver(post_save, sender=Pregunta)
+def contar_creacion(sender, created, **kwargs):
+    if created:
+        incrementar(CONTADOR_POR_MODELO[sender], 1)
+
+@receiver(post_delete, sender=Usuario)
+@receiver(post_delete, sender=Partido)
+@receiver(post_delete, sender=Pregunta)
+def contar_borrado(sender, **kwargs):
+    incrementar(CONTADOR_POR_MODELO[sender], -1)
+
+@receiver(post_init, sender=UsuarioSesion)
+def recordar_completado(sender, instance, **kwargs):
+    # Guardamos el estado cargado para detectar la transición en post_save.
+    # Leemos __dict__ para no disparar una consulta si el campo viene diferido (.only())
+    instance._completado_inicial = instance.__dict__.get('completado')
+    instance._celda_inicial = celda_cargada(instance)
+
+def celda_cargada(instance):
+    if any(campo not in instance.__dict__ for campo in CAMPOS_MAPA_CALOR):
+        return DESCONOCIDA
+    return mapa_calor.clave_sesion(*(instance.__dict__[campo] for campo in CAMPOS_MAPA_CALOR))
+
+@receiver(post_save, sender=UsuarioSesion)
+def contar_quiz_completado(sender, instance, created, **kwargs):
+    antes = False if created else instance._completado_inicial
+    if antes is not None and instance.completado != antes:
+        incrementar(QUIZZES_COMPLETADOS, 1 if instance.completado else -1)
+    instance._completado_inicial = instance.completado
+
+@receiver(post_save, sender=UsuarioSesion)
+def actualizar_mapa_calor(sender, instance, created, **kwargs):
+    # Al volver a finalizar una sesión se descuenta de su celda anterior
+    antes = None if created else instance._celda_inicial
+    despues = celda_cargada(instance)
+    if antes is not DESCONOCIDA and despues is not DESCONOCIDA:
+        mapa_calor.mover(antes, despues)
+    instance._celda_inicial = despues
+
+@receiver(post_delete, sender=UsuarioSesion)
+def descontar_quiz_completado(sender, instance, **kwargs):
+    # Archivar mueve la sesión a SesionArchivada, que sigue contando
+    if archivando():
+        return
+    if instance._completado_inicial:
+        incrementar(QUIZZES_COMPLETADOS, -1)
+    if instance._celda_inicial not in (None, DESCONOCIDA):
+        mapa_calor.sumar(instance._celda_inicial, -1)
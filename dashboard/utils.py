@@ -0,0 +1,108 @@
+import csv
+import io
+from itertools import islice
+from openpyxl import load_workbook
+
+# Filas que se confirman en cada transacción de los importadores
+TAMANO_BLOQUE = 500
+
+# Caracteres que se leen para detectar el delimitador
+TAMANO_MUESTRA = 2048
+
+EXTENSIONES_VALIDAS = ('.csv', '.xlsx')
+
+def es_archivo_valido(archivo):
+    return bool(archivo) and archivo.name.lower().endswith(EXTENSIONES_VALIDAS)
+
+def leer_filas(archivo, como_dict=True, delimitadores=',;'):
+    """
+    Genera las filas de un CSV o XLSX subido sin cargarlo completo en memoria.
+    Con como_dict=True cada fila es un dict indexado por la cabecera;
+    si no, una lista de columnas (cabecera incluida).
+    """
+    if archivo.name.lower().endswith('.xlsx'):
+        return _leer_filas_xlsx(archivo, como_dict)
+    return _leer_filas_csv(archivo, como_dict, delimitadores)
+
+def contar_filas(archivo):
+    """
+    Cuenta las filas de datos (sin cabecera) para estimar el progreso de un job.
+    En CSV cuenta saltos de línea leyendo en binario por bloques.
+    """
+    archivo.seek(0)
+    if archivo.name.lower().endswith('.xlsx'):
+        libro = load_workbook(archivo.file, read_only=True)
+        try:
+            total = libro.active.max_row or 0
+        finally:
+            libro.close()
+    else:
+        total = 0
+        ultimo = b'\n'
+        for trozo in iter(lambda: archivo.read(64 * 1024), b''):
+            total += trozo.count(b'\n')
+            ultimo = trozo[-1:]
+        # Última línea sin salto final
+        if ultimo != b'\n':
+            total += 1
+    archivo.seek(0)
+    return max(total - 1, 0)
+
+def en_bloques(filas, tamano=TAMANO_BLOQUE):
+    """
+    Agrupa cualquier iterable en listas de `tamano` elementos.
+    """
+    iterador = iter(filas)
+    while True:
+        bloque = list(islice(iterador, tamano))
+        if not bloque:
+            return
+        yield bloque
+
+def _leer_filas_csv(archivo, como_dict, delimitadores):
+    archivo.seek(0)
+    # utf-8-sig elimina el BOM de Excel; TextIOWrapper decodifica a medida que se lee
+    texto = io.TextIOWrapper(archivo.file, encoding='utf-8-sig', newline='')
+    try:
+        # Detección de delimitador sobre el primer bloque
+        muestra = texto.read(TAMANO_MUESTRA)
+        try:
+            dialecto = csv.Sniffer().sniff(muestra, delimiters=delimitadores)
+        except csv.Error:
+            # Si falla el sniffer, asumimos coma por defecto
+            dialecto = csv.excel
+        texto.seek(0)
+
+        if como_dict:
+            yield from csv.DictReader(texto, dialect=dialecto)
+        else:
+            yield from csv.reader(texto, dialecto)
+    finally:
+        # Soltamos el archivo sin cerrarlo: sigue siendo del request
+        texto.detach()
+
+def _leer_filas_xlsx(archivo, como_dict):
+    archivo.seek(0)
+    libro = load_workbook(archivo.file, read_only=True, data_only=True)
+    try:
+        cabecera = None
+        for valores in libro.active.iter_rows(values_only=True):
+            fila = [_celda_a_texto(v) for v in valores]
+            if not any(fila):
+                continue # Excel suele dejar filas vacías al final
+            if not como_dict:
+                yield fila
+            elif cabecera is None:
+                cabecera = fila
+            else:
+                yield dict(zip(cabecera, fila))
+    finally:
+        libro.close()
+
+def _celda_a_texto(valor):
+    # Los importadores esperan texto como en el CSV: 2.0 -> '2', None -> ''
+    if valor is None:
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return str(valor)
@@ -1,341 +1,175 @@
+import os
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import IsAdminUser
+from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.parsers import MultiPartParser
 from rest_framework import status
-from core.models import Eleccion, Partido, Candidato, Region, PartidoMetadata, Usuario
-from quiz.models import Pregunta, PartidoRespuesta, PartidoPosicion, UsuarioSesion
-from quiz.utils import calcular_posicion
-from core.serializers import PartidoMetadataImportSerializer
-from django.db import transaction
-import io
-import csv
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from core.instrumentacion import estadisticas, instrumentacion_activa
+from core.models import Eleccion
+from core.replicas import LecturaReplicaMixin
+from quiz.catalogo import resolver_eleccion
+from quiz.exportacion import FORMATOS, filas_exportacion, parquet_disponible, rango_fechas
+from .contadores import leer_contadores, QUIZZES_COMPLETADOS, TOTAL_USUARIOS, TOTAL_PARTIDOS, TOTAL_PREGUNTAS
+from .importadores import IMPORTADORES
+from .mapa_calor import CELDAS_POR_EJE, LIMITE, leer_mapa_calor
+from .jobs import encolar_importacion
+from .models import ImportacionJob
+from .serializers import ImportacionJobSerializer
+from .utils import es_archivo_valido
 
 class AdminStatsView(APIView):
     permission_classes = [IsAdminUser]
     def get(self, request):
+        contadores, reconciliado = leer_contadores()
         data = {
-            "total_usuarios": Usuario.objects.count(),
-            "total_partidos": Partido.objects.count(),
-            "total_preguntas": Pregunta.objects.count(),
+            "total_usuarios": contadores[TOTAL_USUARIOS],
+            "total_partidos": contadores[TOTAL_PARTIDOS],
+            "total_preguntas": contadores[TOTAL_PREGUNTAS],
             "elecciones": Eleccion.objects.values('nombre', 'anio', 'actual'),
-            "quizzes_completados": UsuarioSesion.objects.filter(completado=True).count(),
+            "quizzes_completados": contadores[QUIZZES_COMPLETADOS],
+            "contadores_reconciliados": reconciliado,
         }
         return Response(data)
 
-class ImportarPartidosView(APIView):
+class ImportacionView(APIView):
+    """
+    Base de los endpoints importar-*. Por defecto encola un ImportacionJob y responde
+    202 con su id; con en_segundo_plano=false importa dentro del request.
+    """
     permission_classes = [IsAdminUser]
-    parser_classes = [MultiPartParser]
+    tipo = None
 
     def post(self, request):
         archivo = request.FILES.get('archivo')
-        if not archivo:
-            return Response({"error": "No se envió el archivo"}, status=400)
+        importar, parametros = IMPORTADORES[self.tipo]
 
-        try:
-            # Usamos utf-8-sig para manejar caracteres especiales como '¡' o tildes
-            decoded_file = archivo.read().decode('utf-8-sig')
-            reader = csv.DictReader(io.StringIO(decoded_file))
-            
-            creados = 0
-            actualizados = 0
-            
-            with transaction.atomic():
-                for row in reader:
-                    # El 'nombre' es nuestra llave para buscar
-                    partido, created = Partido.objects.update_or_create(
-                        nombre=row['nombre'],
-                        defaults={
-                            'nombre_largo': row.get('nombre_largo', ''),
-                            'sigla': row.get('sigla', '')
-                        }
-                    )
-                    if created:
-                        creados += 1
-                    else:
-                        actualizados += 1
-            
+        if self.en_segundo_plano(request):
+            faltantes = ([] if archivo else ['archivo']) + [clave for clave in parametros if not request.data.get(clave)]
+            if faltantes:
+                return Response({"error": f"Faltan datos: {', '.join(faltantes)}"}, status=400)
+            if not es_archivo_valido(archivo):
+                return Response({"error": "Sube un archivo CSV o XLSX válido"}, status=400)
+
+            job = encolar_importacion(self.tipo, archivo, request.data, request.user)
             return Response({
-                "status": "Éxito", 
-                "msg": f"Proceso completado. Creados: {creados}, Actualizados: {actualizados}"
-            })
-        except Exception as e:
-            return Response({"error": f"Error en Partidos: {str(e)}"}, status=500)
+                "job_id": job.id,
+                "estado": job.estado,
+                "url": f"/api/dashboard/jobs/{job.id}/"
+            }, status=status.HTTP_202_ACCEPTED)
 
-from core.models import Eleccion
+        cuerpo, codigo = importar(archivo, request.data)
+        return Response(cuerpo, status=codigo)
+
+    def en_segundo_plano(self, request):
+        valor = request.query_params.get('en_segundo_plano') or request.data.get('en_segundo_plano')
+        return valor is None or str(valor).lower() not in ('0', 'false', 'no')
 
-class ImportarSoloRespuestasView(APIView):
+class ImportarPartidosView(ImportacionView):
     permission_classes = [IsAdminUser]
     parser_classes = [MultiPartParser]
+    tipo = 'partidos'
 
-    def post(self, request):
-        archivo = request.FILES.get('archivo')
-        anio_eleccion = request.data.get('eleccion') 
-
-        if not archivo or not anio_eleccion: 
-            return Response({"error": "Faltan datos (archivo o eleccion)"}, status=400)
-
-        try:
-            # 1. Validamos la elección
-            eleccion_obj = Eleccion.objects.filter(anio=anio_eleccion).first()
-            if not eleccion_obj:
-                return Response({"error": f"No existe la elección registrada para el año {anio_eleccion}"}, status=404)
-
-            decoded_file = archivo.read().decode('utf-8-sig')
-            reader = csv.DictReader(io.StringIO(decoded_file))
-            
-            count = 0
-            partidos_afectados = set()
-
-            with transaction.atomic():
-                for row in reader:
-                    # 2. Buscamos la pregunta por ID (dentro de la elección correcta)
-                    pregunta = Pregunta.objects.filter(texto__iexact=row['pregunta_texto'].strip(), eleccion=eleccion_obj).first()
-                    
-                    # 3. Buscamos el partido por NOMBRE o SIGLA (ignora mayúsculas/minúsculas)
-                    nombre_partido = row['partido'].strip()
-                    partido = Partido.objects.filter(nombre__iexact=nombre_partido).first()
-                    if not partido:
-                        partido = Partido.objects.filter(sigla__iexact=nombre_partido).first()
-                    
-                    if pregunta and partido:
-                        # 4. Crear o actualizar la respuesta
-                        PartidoRespuesta.objects.update_or_create(
-                            pregunta=pregunta,
-                            partido=partido,
-                            defaults={
-                                'valor': int(row['valor']),
-                                'fuente': row.get('fuente', '')
-                            }
-                        )
-                        count += 1
-                        partidos_afectados.add(partido)
-
-                # 5. Recalcular caché de posiciones al finalizar la carga
-                for p in partidos_afectados:
-                    self.actualizar_posicion_cache(p, eleccion_obj)
-
-            return Response({
-                "status": "Éxito", 
-                "msg": f"Se procesaron {count} respuestas. Se actualizó la posición de {len(partidos_afectados)} partidos."
-            })
-        except Exception as e:
-            return Response({"error": str(e)}, status=500)
-
-    def actualizar_posicion_cache(self, partido, eleccion):
-        """
-        Calcula el promedio de las respuestas del partido y guarda su posición.
-        """
-        respuestas = PartidoRespuesta.objects.filter(
-            partido=partido, 
-            pregunta__eleccion=eleccion
-        )
-        
-        if respuestas.exists():
-            posX, posY = calcular_posicion(respuestas)
-            
-            PartidoPosicion.objects.update_or_create(
-                partido=partido,
-                defaults={
-                    'posicion_x': posX,
-                    'posicion_y': posY
-                }
-            )
-        
-class ImportarPreguntasView(APIView):
+class ImportarSoloRespuestasView(ImportacionView):
     permission_classes = [IsAdminUser]
     parser_classes = [MultiPartParser]
+    tipo = 'respuestas'
 
-    def post(self, request):
-        archivo = request.FILES.get('archivo')
-        anio_eleccion = request.data.get('anio') # El año para asociar las preguntas
-
-        if not archivo or not anio_eleccion:
-            return Response({"error": "Faltan datos: archivo y anio son requeridos"}, status=400)
-
-        try:
-            # Buscamos la elección
-            eleccion_obj = Eleccion.objects.filter(anio=anio_eleccion).first()
-            if not eleccion_obj:
-                return Response({"error": f"No existe elección para el año {anio_eleccion}"}, status=404)
+class ImportarPreguntasView(ImportacionView):
+    permission_classes = [IsAdminUser]
+    parser_classes = [MultiPartParser]
+    tipo = 'preguntas'
 
-            decoded_file = archivo.read().decode('utf-8-sig')
-            reader = csv.DictReader(io.StringIO(decoded_file))
-            
-            creadas = 0
-            
-            with transaction.atomic():
-                for row in reader:
-                    # Usamos update_or_create para evitar duplicar preguntas si se sube el CSV dos veces
-                    Pregunta.objects.update_or_create(
-                        texto=row['texto'],
-                        eleccion=eleccion_obj,
-                        defaults={
-                            'eje': row['eje'].upper(), # 'X' o 'Y'
-                            'direccion': int(row['direccion']), # 1 o -1
-                            'categoria': row.get('categoria', 'General'), # Evita el error de null
-                            'estado': row.get('estado', 'activa')
-                        }
-                    )
-                    creadas += 1
-            
-            return Response({
-                "status": "Éxito", 
-                "msg": f"Se importaron {creadas} preguntas para la elección {anio_eleccion}."
-            })
-        except Exception as e:
-            return Response({"error": f"Error al importar preguntas: {str(e)}"}, status=500)
-        
-class ImportarCandidatosView(APIView):
-    def post(self, request):
-        archivo = request.FILES.get('archivo')
-        
-        if not archivo or not archivo.name.endswith('.csv'):
-            return Response({"error": "Sube un archivo CSV válido"}, status=status.HTTP_400_BAD_REQUEST)
+class ImportarCandidatosView(ImportacionView):
+    tipo = 'candidatos'
 
-        try:
-            # Leer y decodificar el archivo
-            data_set = archivo.read().decode('UTF-8-sig') # 'UTF-8-sig' elimina el BOM de Excel
-            io_string = io.StringIO(data_set)
-            
-            # --- MEJORA: Detección segura de delimitador ---
-            try:
-                primeras_lineas = io_string.read(2048)
-                dialect = csv.Sniffer().sniff(primeras_lineas, delimiters=',;')
-                io_string.seek(0)
-                lector = csv.reader(io_string, dialect)
-            except csv.Error:
-                # Si falla el sniffer, asumimos coma por defecto
-                io_string.seek(0)
-                lector = csv.reader(io_string, delimiter=',')
-            
-            next(lector) # Saltar cabecera
-            
-            contador_nuevos = 0
-            contador_actualizados = 0
-            errores = []
+class ImportarMetadataView(ImportacionView):
+    tipo = 'metadata'
 
-            with transaction.atomic():
-                for i, row in enumerate(lector, start=2):
-                    # Ignorar filas vacías o mal formadas
-                    if not row or len(row) < 8:
-                        continue
-                    
-                    try:
-                        # Limpiar espacios de cada columna
-                        nombres, apellidos, cargo, numero, sigla_partido, nombre_region, foto, hojavida = [col.strip() for col in row[:8]]
+class ImportacionJobView(APIView):
+    """
+    Progreso de una importación encolada: filas procesadas, errores, velocidad y ETA.
+    """
+    permission_classes = [IsAdminUser]
 
-                        # Buscar Partido y Región
-                        partido = Partido.objects.get(sigla__iexact=sigla_partido)
-                        region = Region.objects.filter(nombre__icontains=nombre_region).first() if nombre_region else None
+    def get(self, request, pk):
+        job = get_object_or_404(ImportacionJob, pk=pk)
+        return Response(ImportacionJobSerializer(job).data)
 
-                        # Evitar duplicados con update_or_create
-                        candidato, created = Candidato.objects.update_or_create(
-                            nombres=nombres,
-                            apellidos=apellidos,
-                            cargo=cargo,
-                            partido=partido, # Agregamos partido al criterio de búsqueda por seguridad
-                            defaults={
-                                'numero': int(numero) if numero and numero.isdigit() else None,
-                                'region_rel': region,
-                                'foto': foto,
-                                'hojavida': hojavida
-                            }
-                        )
-                        
-                        if created:
-                            contador_nuevos += 1
-                        else:
-                            contador_actualizados += 1
-                            
-                    except Partido.DoesNotExist:
-                        errores.append(f"Fila {i}: Partido '{sigla_partido}' no existe.")
-                    except Exception as e:
-                        errores.append(f"Fila {i}: {str(e)}")
+class MapaCalorView(LecturaReplicaMixin, APIView):
+    """
+    Mapa de calor público de los resultados: ?anio= (por defecto la elección actual)
+    y ?region= opcional. `conteos` es una matriz densa [y][x] de CELDAS_POR_EJE celdas por lado.
+    """
+    permission_classes = [AllowAny]
 
-            return Response({
-                "message": f"Proceso completado. {contador_nuevos} nuevos, {contador_actualizados} actualizados.",
-                "errores": errores
-            }, status=status.HTTP_200_OK)
+    def get(self, request):
+        region = request.query_params.get('region')
+        if region and not region.isdigit():
+            return Response({"error": "'region' debe ser numérico"}, status=400)
+
+        eleccion = resolver_eleccion(request.query_params.get('anio'))
+        if not eleccion:
+            return Response({"error": "No se encontró la elección"}, status=404)
+
+        conteos, total = leer_mapa_calor(eleccion.id, int(region) if region else None)
+        return Response({
+            "anio": eleccion.anio,
+            "region": int(region) if region else None,
+            "celdas_por_eje": CELDAS_POR_EJE,
+            "rango": [-LIMITE, LIMITE],
+            "total": total,
+            "conteos": conteos,
+        })
+
+class ExportarResultadosView(APIView):
+    """
+    Descarga en streaming de las sesiones con sus respuestas:
+    ?formato=csv|jsonl|parquet, ?anio=, ?desde= y ?hasta= (YYYY-MM-DD) y
+    ?archivadas=false para dejar fuera SesionArchivada.
+    """
+    permission_classes = [IsAdminUser]
 
-        except Exception as e:
-            return Response({"error": f"Error al leer el archivo: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        
-class ImportarMetadataView(APIView):
-    def post(self, request):
-        archivo = request.FILES.get('archivo')
-        
-        if not archivo or not archivo.name.endswith('.csv'):
-            return Response({"error": "Sube un archivo CSV válido"}, status=status.HTTP_400_BAD_REQUEST)
+    def get(self, request):
+        formato = request.query_params.get('formato', 'csv')
+        if formato not in FORMATOS:
+            return Response({"error": f"'formato' debe ser uno de: {', '.join(FORMATOS)}"}, status=400)
+        if formato == 'parquet' and not parquet_disponible():
+            return Response({"error": "La exportación a Parquet requiere pyarrow"}, status=400)
 
+        desde, hasta = request.query_params.get('desde'), request.query_params.get('hasta')
         try:
-            data_set = archivo.read().decode('utf-8-sig')
-            io_string = io.StringIO(data_set)
-            
-            # Detección de delimitador
-            try:
-                sample = io_string.read(2048)
-                dialect = csv.Sniffer().sniff(sample, delimiters=',;')
-                io_string.seek(0)
-                lector = csv.reader(io_string, dialect)
-            except Exception:
-                io_string.seek(0)
-                lector = csv.reader(io_string, delimiter=',')
-
-            next(lector, None) # Saltar cabecera
-            
-            procesados = 0
-            errores = []
-
-            with transaction.atomic():
-                for i, row in enumerate(lector, start=2):
-                    if not row or len(row) < 1:
-                        continue
-                    
-                    try:
-                        # Extraer datos del CSV (ajusta el orden si es necesario)
-                        # sigla, candidato, lider, color, plan_url, cand_key, anio, tipo
-                        sigla = row[0].strip()
-                        
-                        # Buscamos el objeto Partido por sigla
-                        partido = Partido.objects.get(sigla__iexact=sigla)
-
-                        # Preparamos los datos para el Serializer
-                        datos_fila = {
-                            'partido': partido.id,
-                            'candidato_presidencial': row[1].strip() if len(row) > 1 else None,
-                            'lider_partido': row[2].strip() if len(row) > 2 else None,
-                            'color_primario': row[3].strip() if len(row) > 3 and row[3] else '#000000',
-                            'plan_gobierno': row[4].strip() if len(row) > 4 else None,
-                            'candidato_key': row[5].strip() if len(row) > 5 and row[5] else 'DEFAULT_CANDIDATE',
-                            'anio_fundacion': int(row[6].strip()) if len(row) > 6 and row[6].strip().isdigit() else None,
-                            'tipo_organizacion': row[7].strip() if len(row) > 7 and row[7] else 'Partido Político'
-                        }
+            rango_fechas(desde, hasta)
+        except ValueError:
+            return Response({"error": "'desde' y 'hasta' deben tener formato YYYY-MM-DD"}, status=400)
 
-                        # Instanciamos el Serializer para validar
-                        serializer = PartidoMetadataImportSerializer(data=datos_fila)
-                        
-                        if serializer.is_valid():
-                            # Usamos update_or_create con los datos ya validados
-                            PartidoMetadata.objects.update_or_create(
-                                partido=partido,
-                                defaults=serializer.validated_data
-                            )
-                            procesados += 1
-                        else:
-                            # Capturamos errores de validación (ej: URL mal formada)
-                            errores.append(f"Fila {i} ({sigla}): {serializer.errors}")
+        anio = request.query_params.get('anio')
+        eleccion = get_object_or_404(Eleccion, anio=anio) if anio else None
 
-                    except Partido.DoesNotExist:
-                        errores.append(f"Fila {i}: La sigla '{sigla}' no existe.")
-                    except Exception as e:
-                        errores.append(f"Fila {i}: Error -> {str(e)}")
-
-            return Response({
-                "status": "proceso completado",
-                "metadata_procesada": procesados,
-                "errores": errores
-            }, status=status.HTTP_200_OK if not errores else status.HTTP_207_MULTI_STATUS)
+        generador, content_type, extension = FORMATOS[formato]
+        filas = filas_exportacion(
+            eleccion.id if eleccion else None, desde, hasta,
+            archivadas=request.query_params.get('archivadas', 'true').lower() != 'false',
+        )
+        response = StreamingHttpResponse(generador(filas), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="resultados_{anio or "todas"}.{extension}"'
+        return response
+
+class RendimientoView(APIView):
+    """
+    Percentiles de tiempo, tiempo en base de datos y consultas por vista y acción
+    que acumuló este worker (INSTRUMENTACION=true). DELETE los reinicia.
+    """
+    permission_classes = [IsAdminUser]
 
-        except Exception as e:
-            return Response({"error": f"Error crítico: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+    def get(self, request):
+        return Response({
+            "activa": instrumentacion_activa(),
+            "pid": os.getpid(),
+            "endpoints": estadisticas.resumen(),
+        })
+
+    def delete(self, request):
+        estadisticas.reiniciar()
+        return Response(status=status.HTTP_204_NO_CONTENT)
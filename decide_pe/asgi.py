@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'decide_pe.settings')
+# Deja fuera de MIDDLEWARE lo que solo es síncrono (ver settings.py)
+os.environ['DECIDE_PE_ASGI'] = 'true'
 
 application = get_asgi_application()
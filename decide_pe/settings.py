@@ -52,6 +52,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Primero, para medir la petición completa; sin INSTRUMENTACION=true se desactiva solo
+    'core.instrumentacion.InstrumentacionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -59,10 +61,17 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.replicas.PrimariaTrasEscrituraMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# WhiteNoise solo es síncrono: bajo ASGI (decide_pe/asgi.py) obligaría a Django a pasar
+# cada petición por un hilo. El servicio ASGI solo atiende la API; los estáticos y el
+# admin los sirve el servicio WSGI
+if os.environ.get('DECIDE_PE_ASGI') == 'true':
+    MIDDLEWARE.remove('whitenoise.middleware.WhiteNoiseMiddleware')
+
 ROOT_URLCONF = 'decide_pe.urls'
 
 TEMPLATES = [
@@ -99,13 +108,78 @@ SIMPLE_JWT = {
 
 import dj_database_url
 
-DATABASES = {
-    'default': dj_database_url.config(
-        default=os.environ.get('DATABASE_URL'),
-        conn_max_age=600
+# DATABASE_POOL=true usa el pool de conexiones de Django (requiere psycopg 3 con psycopg[pool]);
+# en ese caso las conexiones no se reutilizan con conn_max_age sino desde el pool
+DATABASE_POOL = os.environ.get('DATABASE_POOL', 'false').lower() == 'true'
+
+def configurar_base(url):
+    if not url:
+        return {}
+    base = dj_database_url.parse(
+        url,
+        conn_max_age=0 if DATABASE_POOL else 600,
+        # Verifica la conexión reutilizada al empezar cada petición
+        conn_health_checks=True,
     )
+    if DATABASE_POOL:
+        base.setdefault('OPTIONS', {})['pool'] = {
+            'min_size': int(os.environ.get('DATABASE_POOL_MIN', 2)),
+            'max_size': int(os.environ.get('DATABASE_POOL_MAX', 10)),
+            'timeout': int(os.environ.get('DATABASE_POOL_TIMEOUT', 10)),
+        }
+    return base
+
+DATABASES = {
+    'default': configurar_base(os.environ.get('DATABASE_URL')),
 }
 
+# Réplica de lectura opcional para las vistas públicas (ver core/replicas.py)
+if os.environ.get('DATABASE_REPLICA_URL'):
+    DATABASES['replica'] = configurar_base(os.environ['DATABASE_REPLICA_URL'])
+    # En los tests la "réplica" es la misma base que default
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+
+# Retraso tolerado de la réplica: tiempo que un cliente lee de la primaria tras escribir
+REPLICA_RETRASO_SEGUNDOS = int(os.environ.get('REPLICA_RETRASO_SEGUNDOS', 5))
+# Segundos que se usa la primaria tras un fallo de conexión a la réplica
+REPLICA_REINTENTO_SEGUNDOS = int(os.environ.get('REPLICA_REINTENTO_SEGUNDOS', 30))
+
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+# Guarda las versiones de los índices en memoria (ranking, tablas públicas).
+# Con varios workers debe ser compartida, por ejemplo:
+# CACHE_BACKEND=django.core.cache.backends.db.DatabaseCache y CACHE_LOCATION=decide_pe_cache
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'decide-pe'),
+    }
+}
+
+# Write-behind de /answers: las respuestas esperan en la cache y se vuelcan por lotes
+# (ver quiz/buffer_respuestas.py). Requiere una cache compartida y `manage.py volcar_respuestas`
+RESPUESTAS_WRITE_BEHIND = os.environ.get('RESPUESTAS_WRITE_BEHIND', 'false').lower() == 'true'
+RESPUESTAS_BUFFER_MAXIMO = int(os.environ.get('RESPUESTAS_BUFFER_MAXIMO', 20))
+RESPUESTAS_BUFFER_TTL = int(os.environ.get('RESPUESTAS_BUFFER_TTL', 60 * 60 * 24))
+
+# Las sesiones nuevas guardan sus respuestas como un vector de bytes (ver quiz/empaquetado.py)
+RESPUESTAS_EMPAQUETADAS = os.environ.get('RESPUESTAS_EMPAQUETADAS', 'false').lower() == 'true'
+
+# Segundos que navegadores y CDN pueden reutilizar /api/preguntas/bundle/ sin revalidar
+PREGUNTAS_BUNDLE_MAX_AGE = int(os.environ.get('PREGUNTAS_BUNDLE_MAX_AGE', 3600))
+
+# Snapshot del índice espacial de sesiones (lo genera `manage.py indice_espacial`)
+INDICE_SESIONES_RUTA = os.environ.get('INDICE_SESIONES_RUTA', str(BASE_DIR / 'indices' / 'sesiones.npz'))
+
+# Tiempos, consultas y Server-Timing por endpoint (ver core/instrumentacion.py y /api/dashboard/perf/)
+INSTRUMENTACION = os.environ.get('INSTRUMENTACION', 'false').lower() == 'true'
+
+# Carpeta de los snapshots CSV/Parquet de `manage.py archivar_sesiones`
+ARCHIVO_DIR = os.environ.get('ARCHIVO_DIR', str(BASE_DIR / 'archivo'))
+
 # Lee el dominio que Render te da automáticamente
 RENDER_EXTERNAL_HOSTNAME = os.environ.get('RENDER_EXTERNAL_HOSTNAME')
 
@@ -122,6 +196,15 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static'),
 ]
 
+# Archivos subidos (importaciones encoladas que procesa el worker)
+MEDIA_URL = '/media/'
+MEDIA_ROOT = os.environ.get('MEDIA_ROOT', BASE_DIR / 'media')
+
+# Segundos sin avances tras los que un job 'procesando' se da por abandonado
+# (el worker murió) y vuelve a la cola, hasta IMPORTACION_JOB_INTENTOS veces
+IMPORTACION_JOB_TIMEOUT = int(os.environ.get('IMPORTACION_JOB_TIMEOUT', 15 * 60))
+IMPORTACION_JOB_INTENTOS = int(os.environ.get('IMPORTACION_JOB_INTENTOS', 3))
+
 if not DEBUG:
     STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
@@ -19,9 +19,10 @@ from django.urls import path, include
 from rest_framework import routers
 from core.views import PartidoViewSet, EleccionViewSet, UsuarioViewSet, RegionViewSet
 from quiz.views import PreguntaViewSet, UsuarioSesionViewSet, UsuarioRespuestaViewSet
-from dashboard.views import AdminStatsView, ImportarPartidosView, ImportarSoloRespuestasView, ImportarPreguntasView, ImportarCandidatosView, ImportarMetadataView
+from dashboard.views import AdminStatsView, ImportarPartidosView, ImportarSoloRespuestasView, ImportarPreguntasView, ImportarCandidatosView, ImportarMetadataView, ImportacionJobView, MapaCalorView, ExportarResultadosView, RendimientoView
 from rest_framework_simplejwt.views import TokenRefreshView
 from quiz.views import MyTokenObtainPairView, RespuestaPartidoViewSet, PartidoPosicionViewSet, MetricsDashboardView, ComparisonTableView
+from quiz import vistas_async
 
 router = routers.DefaultRouter()
 router.register(r'partidos', PartidoViewSet)
@@ -47,8 +48,18 @@ urlpatterns = [
     path('api/dashboard/importar-preguntas/', ImportarPreguntasView.as_view()),
     path('api/dashboard/importar-candidatos/', ImportarCandidatosView.as_view()),
     path('api/dashboard/importar-metadata/', ImportarMetadataView.as_view(), name='importar-metadata'),
+    path('api/dashboard/jobs/<int:pk>/', ImportacionJobView.as_view(), name='importacion-job'),
+    path('api/dashboard/exportar-resultados/', ExportarResultadosView.as_view(), name='exportar-resultados'),
+    path('api/dashboard/perf/', RendimientoView.as_view(), name='rendimiento'),
+    path('api/mapa-calor/', MapaCalorView.as_view(), name='mapa-calor'),
     path('api/login/', MyTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api/metrics/', MetricsDashboardView.as_view(), name='metrics'),
     path('api/comparison/', ComparisonTableView.as_view(), name='comparison-table'),
+
+    # Versiones asíncronas de los endpoints calientes (servir con uvicorn decide_pe.asgi:application)
+    path('api/async/quiz/answers/', vistas_async.answers, name='async-answers'),
+    path('api/async/quiz/<str:token>/finalizar/', vistas_async.finalizar, name='async-finalizar'),
+    path('api/async/quiz/<str:token>/matches/', vistas_async.matches, name='async-matches'),
+    path('api/async/partido-posiciones/', vistas_async.partido_posiciones, name='async-partido-posiciones'),
 ]
\ No newline at end of file
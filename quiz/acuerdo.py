@@ -0,0 +1,127 @@
+"""
+Coincidencia pregunta a pregunta entre un usuario y cada partido.
+
+Por elección se guarda en el worker una matriz int8 partidos x preguntas con las
+respuestas de PartidoRespuesta, con las columnas en el orden de Pregunta.posicion
+(el mismo que el vector empaquetado de una sesión, ver quiz/empaquetado.py).
+Puntuar una sesión es una sola operación sobre la matriz: la coincidencia en
+cada pregunta es 4 - |usuario - partido| (respuestas de -2 a 2) y el porcentaje
+de un partido es la media sobre las preguntas activas que respondieron ambos.
+"""
+import numpy as np
+from core.cache import CacheLRU, obtener_version
+from core.replicas import en_primaria
+from .empaquetado import SIN_RESPUESTA, empaquetar, obtener_mapa_preguntas, vector
+from .models import PartidoRespuesta
+
+# Máxima distancia entre dos respuestas (de -2 a 2)
+DISTANCIA_RESPUESTAS = 4
+
+# Preguntas en las que más coincide / discrepa cada partido
+TOP_PREGUNTAS = 3
+
+# "Coincide" si las respuestas distan como mucho 1 y "discrepa" si distan 3 o más
+MINIMO_COINCIDE = DISTANCIA_RESPUESTAS - 1
+MAXIMO_DISCREPA = DISTANCIA_RESPUESTAS - 3
+
+class MatrizAcuerdo:
+    """
+    Respuestas de los partidos de una elección: fila por partido, columna por posición.
+    """
+    def __init__(self, partidos, siglas, valores):
+        self.partidos = partidos
+        self.siglas = siglas
+        self.valores = valores
+
+    @classmethod
+    def construir(cls, eleccion_id, mapa):
+        filas = (
+            PartidoRespuesta.objects.filter(pregunta__eleccion_id=eleccion_id, pregunta__posicion__isnull=False)
+            .order_by('partido_id')
+            .values_list('partido_id', 'partido__sigla', 'pregunta__posicion', 'valor')
+        )
+        fila_de, partidos, siglas, celdas = {}, [], [], []
+        for partido_id, sigla, posicion, valor in filas:
+            if partido_id not in fila_de:
+                fila_de[partido_id] = len(partidos)
+                partidos.append(partido_id)
+                siglas.append(sigla)
+            celdas.append((fila_de[partido_id], posicion, valor))
+
+        valores = np.full((len(partidos), len(mapa)), SIN_RESPUESTA, dtype=np.int8)
+        for fila, posicion, valor in celdas:
+            if posicion < len(mapa):
+                valores[fila, posicion] = valor
+        return cls(partidos, siglas, valores)
+
+    def __len__(self):
+        return len(self.partidos)
+
+    def acuerdo(self, datos, mapa):
+        """
+        Lista por partido (de más a menos coincidencia) con su porcentaje y las
+        preguntas en las que más coincide y discrepa con el vector `datos`.
+        """
+        n = self.valores.shape[1]
+        usuario = np.full(n, SIN_RESPUESTA, dtype=np.int8)
+        recibido = vector(datos)[:n]
+        usuario[:len(recibido)] = recibido
+
+        activas = mapa.eje_x[:n] | mapa.eje_y[:n]
+        comunes = (self.valores != SIN_RESPUESTA) & (usuario != SIN_RESPUESTA) & activas
+        distancias = np.abs(self.valores.astype(np.int16) - usuario.astype(np.int16))
+        # -1 marca las preguntas que no cuentan para no confundirlas con un desacuerdo total
+        coincidencia = np.where(comunes, DISTANCIA_RESPUESTAS - distancias, -1)
+
+        en_comun = comunes.sum(axis=1)
+        porcentajes = np.where(
+            en_comun > 0,
+            np.round(np.clip(coincidencia, 0, None).sum(axis=1) * 100 / (DISTANCIA_RESPUESTAS * np.maximum(en_comun, 1))),
+            -1,
+        ).astype(np.int64)
+
+        mas_coincide = np.argsort(-coincidencia, axis=1, kind='stable')[:, :TOP_PREGUNTAS]
+        mas_discrepa = np.argsort(np.where(comunes, coincidencia, DISTANCIA_RESPUESTAS + 1), axis=1, kind='stable')[:, :TOP_PREGUNTAS]
+
+        resultado = []
+        for i in np.argsort(-porcentajes, kind='stable').tolist():
+            fila = coincidencia[i]
+            resultado.append({
+                'id': self.partidos[i],
+                'sigla': self.siglas[i],
+                'porcentaje': int(porcentajes[i]) if en_comun[i] else None,
+                'preguntas_en_comun': int(en_comun[i]),
+                'coincide_en': [mapa.pregunta_en[p] for p in mas_coincide[i].tolist() if fila[p] >= MINIMO_COINCIDE],
+                'discrepa_en': [mapa.pregunta_en[p] for p in mas_discrepa[i].tolist() if 0 <= fila[p] <= MAXIMO_DISCREPA],
+            })
+        return resultado
+
+_matrices = CacheLRU(16)
+
+def obtener_matriz_acuerdo(eleccion_id):
+    """
+    Matriz de la elección memorizada en el worker. Cambia con las respuestas de los
+    partidos ('comparacion') y con el orden de las preguntas ('preguntas').
+    """
+    from .catalogo import VERSION_PREGUNTAS
+    from .comparacion import VERSION_COMPARACION
+
+    clave = (obtener_version(VERSION_COMPARACION), obtener_version(VERSION_PREGUNTAS), eleccion_id)
+    matriz = _matrices.get(clave)
+    if matriz is None:
+        with en_primaria():
+            matriz = MatrizAcuerdo.construir(eleccion_id, obtener_mapa_preguntas(eleccion_id))
+        _matrices.set(clave, matriz)
+    return matriz
+
+def acuerdo_por_partido(eleccion_id, respuestas):
+    """
+    Coincidencia de unas respuestas (bytes empaquetados o {pregunta_id: valor})
+    con cada partido de la elección. Vacía si la sesión no tiene elección.
+    """
+    if eleccion_id is None:
+        return []
+    mapa = obtener_mapa_preguntas(eleccion_id)
+    if isinstance(respuestas, dict):
+        respuestas = empaquetar(respuestas, mapa)
+    return obtener_matriz_acuerdo(eleccion_id).acuerdo(respuestas, mapa)
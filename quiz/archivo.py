@@ -0,0 +1,143 @@
+"""
+Archivado por elección: las sesiones completadas de elecciones que ya no son la actual
+salen de UsuarioSesion/UsuarioRespuesta hacia SesionArchivada (respuestas empaquetadas)
+o hacia un snapshot comprimido (CSV.gz o Parquet), así los índices y conteos del
+camino caliente solo ven la elección en curso.
+
+Archivar no es "olvidar": el contador de quizzes completados y el mapa de calor
+siguen contando las sesiones archivadas, y /matches las sigue encontrando por token.
+"""
+import csv
+import gzip
+import json
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.db import transaction
+from core.models import Eleccion
+from .empaquetado import empaquetar, esta_empaquetada, obtener_mapa_preguntas, desempaquetar
+from .models import UsuarioSesion, UsuarioRespuesta, SesionArchivada
+
+DESTINOS = ('tabla', 'csv', 'parquet')
+
+COLUMNAS = ['id', 'token', 'usuario_id', 'eleccion_id', 'region_id', 'fecha', 'resultado_x', 'resultado_y', 'respuestas']
+
+# Mientras está activo, las señales de contadores y mapa de calor ignoran los borrados
+_archivando = ContextVar('archivando', default=False)
+
+def archivando():
+    return _archivando.get()
+
+@contextmanager
+def borrado_por_archivo():
+    token = _archivando.set(True)
+    try:
+        yield
+    finally:
+        _archivando.reset(token)
+
+def elecciones_archivables():
+    """
+    Elecciones que no son la actual (ni la más reciente si ninguna está marcada).
+    """
+    from .catalogo import resolver_eleccion
+
+    actual = resolver_eleccion()
+    elecciones = Eleccion.objects.filter(actual=False)
+    if actual:
+        elecciones = elecciones.exclude(id=actual.id)
+    return elecciones
+
+def _respuestas_empaquetadas(sesiones):
+    """
+    {sesion_id: bytes} del lote, empaquetando las que aún usan UsuarioRespuesta.
+    Se llama dentro de la transacción del lote, con sus filas bloqueadas.
+    """
+    filas = {}
+    pendientes = [s.id for s in sesiones if not esta_empaquetada(s)]
+    for sesion_id, pregunta_id, valor in UsuarioRespuesta.objects.select_for_update().filter(sesion_id__in=pendientes).values_list('sesion_id', 'pregunta_id', 'valor'):
+        filas.setdefault(sesion_id, {})[pregunta_id] = valor
+
+    empaquetadas = {}
+    for sesion in sesiones:
+        if esta_empaquetada(sesion):
+            empaquetadas[sesion.id] = bytes(sesion.respuestas_empaquetadas)
+        else:
+            empaquetadas[sesion.id] = empaquetar(filas.get(sesion.id, {}), obtener_mapa_preguntas(sesion.eleccion_id))
+    return empaquetadas
+
+def archivar_lote(sesiones, escritor=None):
+    """
+    Copia el lote a SesionArchivada (o al snapshot de `escritor`) y lo borra de UsuarioSesion
+    en la misma transacción; el CASCADE se lleva sus filas de UsuarioRespuesta.
+    """
+    with transaction.atomic():
+        # Releemos el lote bloqueado: un /answers en curso termina antes o espera al borrado
+        sesiones = list(UsuarioSesion.objects.select_for_update().filter(id__in=[s.id for s in sesiones]).order_by('id'))
+        empaquetadas = _respuestas_empaquetadas(sesiones)
+        if escritor is None:
+            SesionArchivada.objects.bulk_create([
+                SesionArchivada(
+                    id=s.id, token=s.token, usuario_id=s.usuario_id, eleccion_id=s.eleccion_id, region_id=s.region_id,
+                    fecha=s.fecha, resultado_x=s.resultado_x, resultado_y=s.resultado_y,
+                    respuestas_empaquetadas=empaquetadas[s.id],
+                )
+                for s in sesiones
+            ], ignore_conflicts=True)
+        else:
+            escritor.escribir(sesiones, empaquetadas)
+
+        with borrado_por_archivo():
+            UsuarioSesion.objects.filter(id__in=[s.id for s in sesiones]).delete()
+    return len(sesiones)
+
+def archivar_eleccion(eleccion, escritor=None, tamano_lote=1000):
+    """
+    Archiva por lotes (keyset por id) las sesiones completadas de la elección.
+    """
+    sesiones = UsuarioSesion.objects.filter(eleccion=eleccion, completado=True).order_by('id')
+    total = 0
+    while True:
+        lote = list(sesiones[:tamano_lote])
+        if not lote:
+            return total
+        total += archivar_lote(lote, escritor)
+
+class EscritorSnapshot:
+    """
+    Snapshot comprimido de una elección en una carpeta con un archivo por lote
+    (part-00001.csv.gz, ... o .parquet con pandas + pyarrow). Cada parte se cierra
+    antes de borrar su lote, así un fallo a mitad nunca pierde sesiones.
+    Las respuestas van como JSON {pregunta_id: valor}.
+    """
+    def __init__(self, carpeta, eleccion, formato):
+        self.formato = formato
+        self.eleccion = eleccion
+        self.ruta = os.path.join(carpeta, f'sesiones_{eleccion.anio}_{eleccion.id}')
+        os.makedirs(self.ruta, exist_ok=True)
+        # Continúa la numeración de un archivado anterior de la misma elección
+        self.partes = len(os.listdir(self.ruta))
+
+    def escribir(self, sesiones, empaquetadas):
+        mapa = obtener_mapa_preguntas(self.eleccion.id)
+        filas = [
+            [
+                s.id, s.token, s.usuario_id, s.eleccion_id, s.region_id, s.fecha.isoformat(),
+                None if s.resultado_x is None else float(s.resultado_x),
+                None if s.resultado_y is None else float(s.resultado_y),
+                json.dumps(desempaquetar(empaquetadas[s.id], mapa)),
+            ]
+            for s in sesiones
+        ]
+        self.partes += 1
+        nombre = os.path.join(self.ruta, f'part-{self.partes:05d}')
+
+        if self.formato == 'parquet':
+            import pandas as pd
+
+            pd.DataFrame(filas, columns=COLUMNAS).to_parquet(f'{nombre}.parquet', compression='zstd', index=False)
+        else:
+            with gzip.open(f'{nombre}.csv.gz', 'wt', encoding='utf-8', newline='') as archivo:
+                escritor = csv.writer(archivo)
+                escritor.writerow(COLUMNAS)
+                escritor.writerows(filas)
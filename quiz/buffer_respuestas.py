@@ -0,0 +1,127 @@
+"""
+Modo write-behind de /answers (RESPUESTAS_WRITE_BEHIND=true).
+
+Las respuestas de cada sesión se acumulan en la cache bajo su token y se
+vuelcan a UsuarioRespuesta con un solo upsert cuando:
+  - el buffer llega a RESPUESTAS_BUFFER_MAXIMO preguntas,
+  - la sesión se finaliza, o
+  - pasa el comando `volcar_respuestas` (periódico y de recuperación).
+
+Escrituras y volcados de una misma sesión se serializan con un bloqueo en la
+propia cache (cache.add), así dos peticiones no se pisan el buffer. Solo la
+escritura que abre un buffer vacío marca UsuarioSesion.buffer_pendiente; el
+resto no toca la base de datos. El volcado que lo vacía quita la marca con el
+bloqueo tomado, así que nunca queda sin marca un buffer con respuestas. El
+comando encuentra en la base de datos los buffers que quedaron sin volcar
+aunque el worker que los escribió se haya caído. Necesita una cache compartida
+entre procesos (ver quiz/checks.py).
+
+Mientras no se vuelquen, las respuestas no aparecen en GET /api/quiz/<token>/
+ni en /api/respuestas_usuario/; /finalizar sí las tiene en cuenta.
+"""
+import time
+import uuid
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from .empaquetado import escribir_respuestas, leer_respuestas
+from .models import Pregunta, UsuarioSesion
+
+def write_behind_activo():
+    return settings.RESPUESTAS_WRITE_BEHIND
+
+def _clave(sesion):
+    return f'respuestas:buffer:{sesion.token}'
+
+# Segundos que vive el bloqueo de una sesión si su dueño se cae sin soltarlo.
+# Se espera como mucho lo mismo: un bloqueo abandonado caduca antes de rendirse
+BLOQUEO_TTL = 10
+BLOQUEO_REINTENTO = 0.01
+
+@contextmanager
+def _bloqueo(sesion):
+    clave = f'respuestas:buffer:bloqueo:{sesion.token}'
+    dueno = uuid.uuid4().hex
+    limite = time.monotonic() + BLOQUEO_TTL
+    while not cache.add(clave, dueno, timeout=BLOQUEO_TTL):
+        if time.monotonic() > limite:
+            raise TimeoutError(f"Buffer de respuestas ocupado: {sesion.token}")
+        time.sleep(BLOQUEO_REINTENTO)
+    try:
+        yield
+    finally:
+        # No soltar un bloqueo que ya caducó y tomó otro
+        if cache.get(clave) == dueno:
+            cache.delete(clave)
+
+def leer_buffer(sesion):
+    """
+    {pregunta_id: valor} pendientes de la sesión (vacío si no hay buffer).
+    """
+    return cache.get(_clave(sesion)) or {}
+
+def bufferizar(sesion, validas):
+    """
+    Añade las respuestas validadas al buffer de la sesión y lo vuelca si se llenó.
+    """
+    if not validas:
+        return
+    with _bloqueo(sesion):
+        buffer = leer_buffer(sesion)
+        # Solo se marca al abrir el buffer. La instancia puede traer la marca vieja
+        # de antes de un volcado, pero entonces el buffer ya está vacío
+        if not buffer or not sesion.buffer_pendiente:
+            UsuarioSesion.objects.filter(id=sesion.id).update(buffer_pendiente=True)
+        sesion.buffer_pendiente = True
+
+        buffer.update(validas)
+        cache.set(_clave(sesion), buffer, timeout=settings.RESPUESTAS_BUFFER_TTL)
+        if len(buffer) >= settings.RESPUESTAS_BUFFER_MAXIMO:
+            _volcar(sesion)
+
+def volcar_buffer(sesion):
+    """
+    Escribe el buffer en UsuarioRespuesta y lo vacía. Devuelve cuántas respuestas volcó.
+    """
+    with _bloqueo(sesion):
+        return _volcar(sesion)
+
+def _volcar(sesion):
+    buffer = leer_buffer(sesion)
+    with transaction.atomic():
+        if buffer:
+            escribir_respuestas(sesion, buffer)
+        UsuarioSesion.objects.filter(id=sesion.id).update(buffer_pendiente=False)
+    # Tras el commit: si falla la escritura, el buffer sigue ahí y marcado
+    cache.delete(_clave(sesion))
+    sesion.buffer_pendiente = False
+    return len(buffer)
+
+def valores_combinados(sesion):
+    """
+    {pregunta_id: valor} con lo ya guardado en la base de datos y, por encima, lo que sigue en el buffer.
+    """
+    valores = leer_respuestas(sesion)
+    valores.update(leer_buffer(sesion))
+    return valores
+
+def respuestas_combinadas(sesion, valores=None):
+    """
+    Tuplas (eje, direccion, valor) de las preguntas activas de valores_combinados
+    (o de los `valores` ya leídos). Listas para calcular_posicion_desde_tuplas.
+    """
+    if valores is None:
+        valores = valores_combinados(sesion)
+    preguntas = Pregunta.objects.filter(id__in=valores.keys(), estado='activa').values_list('id', 'eje', 'direccion')
+    return [(eje, direccion, valores[pregunta_id]) for pregunta_id, eje, direccion in preguntas]
+
+def volcar_pendientes():
+    """
+    Vuelca todos los buffers marcados en la base de datos. Devuelve (sesiones, respuestas).
+    """
+    sesiones = respuestas = 0
+    for sesion in UsuarioSesion.objects.filter(buffer_pendiente=True).only('id', 'token', 'eleccion_id', 'buffer_pendiente', 'respuestas_empaquetadas').iterator():
+        respuestas += volcar_buffer(sesion)
+        sesiones += 1
+    return sesiones, respuestas
@@ -0,0 +1,57 @@
+import hashlib
+import json
+from django.core.cache import cache
+from rest_framework.renderers import JSONRenderer
+from core.cache import obtener_version
+from core.replicas import en_primaria
+from core.models import Eleccion
+from core.serializers import EleccionSerializer
+from .models import Pregunta
+from .serializers import PreguntaSerializer
+
+# Grupo de versión que invalidan las señales de Pregunta y Eleccion
+VERSION_PREGUNTAS = 'preguntas'
+
+TIMEOUT_BUNDLE = 60 * 60 * 24
+
+def resolver_eleccion(anio=None):
+    """
+    La elección pedida por año o, si no se indica, la actual
+    (con respaldo en la del año más reciente, igual que al crear una sesión).
+    """
+    if anio:
+        return Eleccion.objects.filter(anio=anio).first()
+    return (
+        Eleccion.objects.filter(actual=True).first() or
+        Eleccion.objects.order_by('-anio').first()
+    )
+
+def obtener_bundle_preguntas(eleccion):
+    """
+    Devuelve (json en bytes, hash del contenido) con las preguntas activas de la elección.
+    Se serializa una sola vez por versión y se reutiliza desde la cache.
+    """
+    version = obtener_version(VERSION_PREGUNTAS)
+    clave = f'preguntas:bundle:{version}:{eleccion.id}'
+
+    bundle = cache.get(clave)
+    if bundle is None:
+        with en_primaria():
+            bundle = construir_bundle_preguntas(eleccion)
+        cache.set(clave, bundle, timeout=TIMEOUT_BUNDLE)
+    return bundle
+
+def construir_bundle_preguntas(eleccion):
+    preguntas = (
+        Pregunta.objects.filter(eleccion=eleccion, estado='activa')
+        .select_related('eleccion')
+        .order_by('id')
+    )
+    contenido = {
+        "eleccion": EleccionSerializer(eleccion).data,
+        "preguntas": PreguntaSerializer(preguntas, many=True).data,
+    }
+    # El hash depende solo del contenido: si nada cambió, el ETag se mantiene entre versiones
+    huella = hashlib.sha256(json.dumps(contenido, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    contenido["hash"] = huella
+    return JSONRenderer().render(contenido), huella
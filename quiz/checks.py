@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.checks import Error, register
+from core.cache import cache_compartida
+
+@register()
+def revisar_write_behind(app_configs, **kwargs):
+    """
+    El buffer write-behind vive en la cache: en una cache por proceso cada worker
+    tendría el suyo y `volcar_respuestas` no vería las respuestas de los demás.
+    """
+    if settings.RESPUESTAS_WRITE_BEHIND and not cache_compartida():
+        return [Error(
+            "RESPUESTAS_WRITE_BEHIND necesita una cache compartida entre procesos.",
+            hint="Configura CACHE_BACKEND (por ejemplo DatabaseCache o Redis) o desactiva RESPUESTAS_WRITE_BEHIND.",
+            id='quiz.E001',
+        )]
+    return []
@@ -0,0 +1,79 @@
+from django.core.cache import cache
+from core.cache import obtener_version
+from core.replicas import en_primaria
+from core.models import Partido
+from .models import Pregunta, PartidoRespuesta
+
+# Grupo de versión que invalidan las señales de PartidoRespuesta, Pregunta y Partido
+VERSION_COMPARACION = 'comparacion'
+
+# Las entradas viejas quedan huérfanas al cambiar la versión; este timeout las limpia
+TIMEOUT_COMPARACION = 60 * 60 * 24
+
+PARTIDOS_POR_DEFECTO = 3
+
+# Tope de ?partidos=: acota la clave de cache (memcached no acepta más de 250 bytes)
+# y las columnas, que van de la 'a' a la 'j'
+MAXIMO_PARTIDOS = 10
+
+MAPEO_VALORES = {
+    2: "Muy a favor",
+    1: "A favor",
+    0: "Neutral",
+    -1: "En contra",
+    -2: "Muy en contra"
+}
+
+def obtener_tabla_comparacion(anio=None, partido_ids=None):
+    """
+    Devuelve la tabla de la landing desde la cache, construyéndola si la
+    versión cambió o si es la primera vez que se pide esta combinación.
+    """
+    version = obtener_version(VERSION_COMPARACION)
+    seleccion = ','.join(str(i) for i in partido_ids) if partido_ids else 'default'
+    clave = f'comparacion:{version}:{anio or "todas"}:{seleccion}'
+
+    tabla = cache.get(clave)
+    if tabla is None:
+        with en_primaria():
+            tabla = construir_tabla_comparacion(anio, partido_ids)
+        cache.set(clave, tabla, timeout=TIMEOUT_COMPARACION)
+    return tabla
+
+def construir_tabla_comparacion(anio=None, partido_ids=None):
+    if partido_ids:
+        encontrados = Partido.objects.in_bulk(partido_ids)
+        # Respetamos el orden pedido en ?partidos=
+        partidos = [encontrados[i] for i in partido_ids if i in encontrados]
+    else:
+        partidos = list(Partido.objects.order_by('id')[:PARTIDOS_POR_DEFECTO])
+
+    preguntas = Pregunta.objects.all()
+    respuestas = PartidoRespuesta.objects.filter(partido__in=partidos)
+    if anio:
+        preguntas = preguntas.filter(eleccion__anio=anio)
+        respuestas = respuestas.filter(pregunta__eleccion__anio=anio)
+
+    categorias = preguntas.values_list('categoria', flat=True).distinct()
+
+    # Una sola consulta para todas las celdas: nos quedamos con la primera
+    # respuesta (por id) de cada partido en cada categoría
+    celdas = {}
+    for partido_id, categoria, valor in respuestas.order_by('id').values_list('partido_id', 'pregunta__categoria', 'valor'):
+        celdas.setdefault((partido_id, categoria), valor)
+
+    rows = []
+    for cat in categorias:
+        if not cat: continue # Saltar categorías vacías
+        row = {"topic": cat}
+        for i, p in enumerate(partidos):
+            letra = chr(97 + i)  # i < MAXIMO_PARTIDOS
+            valor = celdas.get((p.id, cat))
+            row[letra] = MAPEO_VALORES.get(valor, "Sin datos") if valor is not None else "Sin postura"
+        rows.append(row)
+
+    return {
+        # En el nuevo modelo de Partido el campo es 'nombre'
+        "headers": [p.nombre for p in partidos],
+        "rows": rows
+    }
@@ -0,0 +1,197 @@
+"""
+Almacenamiento compacto de respuestas: UsuarioSesion.respuestas_empaquetadas guarda
+un byte con signo por pregunta de la elección, en el orden de Pregunta.posicion,
+en lugar de una fila de UsuarioRespuesta por pregunta.
+
+Con RESPUESTAS_EMPAQUETADAS=true las sesiones nuevas nacen en este modo; las
+existentes se convierten con `manage.py empaquetar_respuestas` (y se deshace con
+`desempaquetar_respuestas`). Quien lee o escribe respuestas pasa por
+leer_respuestas / escribir_respuestas y no necesita saber en qué modo está la sesión.
+"""
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from core.cache import CacheLRU, obtener_version
+from .models import Pregunta, UsuarioSesion, UsuarioRespuesta
+
+# Byte de una pregunta sin responder (las respuestas van de -2 a 2)
+SIN_RESPUESTA = -128
+
+def empaquetadas_por_defecto():
+    return settings.RESPUESTAS_EMPAQUETADAS
+
+def esta_empaquetada(sesion):
+    return sesion.respuestas_empaquetadas is not None
+
+# --- Mapa de preguntas de cada elección ---
+
+class MapaPreguntas:
+    """
+    Preguntas de una elección indexadas por posición, con arrays para puntuar sin bucles.
+    """
+    def __init__(self, filas):
+        longitud = max((posicion for _, posicion, _, _, _ in filas), default=-1) + 1
+        self.posicion_de = {}
+        self.pregunta_en = [None] * longitud
+        self.eje_x = np.zeros(longitud, dtype=bool)
+        self.eje_y = np.zeros(longitud, dtype=bool)
+        self.direcciones = np.zeros(longitud, dtype=np.int64)
+        for pregunta_id, posicion, eje, direccion, estado in filas:
+            self.posicion_de[pregunta_id] = posicion
+            self.pregunta_en[posicion] = pregunta_id
+            activa = estado == 'activa'
+            self.eje_x[posicion] = activa and eje == 'X'
+            self.eje_y[posicion] = activa and eje == 'Y'
+            self.direcciones[posicion] = direccion
+
+    def __len__(self):
+        return len(self.pregunta_en)
+
+_mapas = CacheLRU(64)
+
+def obtener_mapa_preguntas(eleccion_id):
+    """
+    Mapa de la elección memorizado en el worker hasta que cambie la versión de 'preguntas'.
+    """
+    from .catalogo import VERSION_PREGUNTAS
+
+    clave = (obtener_version(VERSION_PREGUNTAS), eleccion_id)
+    mapa = _mapas.get(clave)
+    if mapa is None:
+        filas = Pregunta.objects.filter(eleccion_id=eleccion_id, posicion__isnull=False).values_list(
+            'id', 'posicion', 'eje', 'direccion', 'estado'
+        )
+        mapa = MapaPreguntas(list(filas))
+        _mapas.set(clave, mapa)
+    return mapa
+
+# --- Bytes <-> respuestas ---
+
+def empaquetar(valores, mapa):
+    """
+    {pregunta_id: valor} -> bytes. Las preguntas que no son de la elección se ignoran.
+    """
+    bytes_sesion = np.full(len(mapa), SIN_RESPUESTA, dtype=np.int8)
+    for pregunta_id, valor in valores.items():
+        posicion = mapa.posicion_de.get(pregunta_id)
+        if posicion is not None:
+            bytes_sesion[posicion] = valor
+    return bytes_sesion.tobytes()
+
+def vector(datos):
+    return np.frombuffer(bytes(datos or b''), dtype=np.int8)
+
+def desempaquetar(datos, mapa):
+    """
+    bytes -> {pregunta_id: valor}, en orden de posición.
+    """
+    bytes_sesion = vector(datos)
+    valores = {}
+    for posicion in np.flatnonzero(bytes_sesion != SIN_RESPUESTA).tolist():
+        pregunta_id = mapa.pregunta_en[posicion] if posicion < len(mapa) else None
+        if pregunta_id is not None:
+            valores[pregunta_id] = int(bytes_sesion[posicion])
+    return valores
+
+def calcular_posicion_empaquetada(datos, mapa):
+    """
+    calcular_posicion leyendo directamente los bytes: suma ponderada y conteo por eje
+    sobre las preguntas activas, sin tocar UsuarioRespuesta.
+    """
+    from .utils import _normalizar_eje
+
+    valores = vector(datos)[:len(mapa)].astype(np.int64)
+    n = len(valores)
+    respondidas = valores != SIN_RESPUESTA
+    ponderados = valores * mapa.direcciones[:n]
+    eje_x = respondidas & mapa.eje_x[:n]
+    eje_y = respondidas & mapa.eje_y[:n]
+    return (
+        _normalizar_eje(int(ponderados[eje_x].sum()), int(eje_x.sum())),
+        _normalizar_eje(int(ponderados[eje_y].sum()), int(eje_y.sum())),
+    )
+
+def tiene_respuestas(datos):
+    return bool((vector(datos) != SIN_RESPUESTA).any())
+
+# --- Lectura y escritura en cualquiera de los dos modos ---
+
+def leer_respuestas(sesion):
+    """
+    {pregunta_id: valor} de la sesión, esté empaquetada o en UsuarioRespuesta.
+    """
+    if esta_empaquetada(sesion):
+        return desempaquetar(sesion.respuestas_empaquetadas, obtener_mapa_preguntas(sesion.eleccion_id))
+    return dict(sesion.respuestas.values_list('pregunta_id', 'valor'))
+
+def escribir_respuestas(sesion, validas):
+    """
+    Guarda {pregunta_id: valor} con un upsert en UsuarioRespuesta o, si la sesión
+    está empaquetada, fusionándolas en sus bytes bajo SELECT ... FOR UPDATE.
+    """
+    if not esta_empaquetada(sesion):
+        # Un solo INSERT ... ON CONFLICT apoyado en la restricción única (sesion, pregunta)
+        UsuarioRespuesta.objects.bulk_create(
+            [UsuarioRespuesta(sesion_id=sesion.id, pregunta_id=pregunta_id, valor=valor) for pregunta_id, valor in validas.items()],
+            update_conflicts=True,
+            unique_fields=['sesion', 'pregunta'],
+            update_fields=['valor'],
+        )
+        return
+
+    mapa = obtener_mapa_preguntas(sesion.eleccion_id)
+    with transaction.atomic():
+        actuales = UsuarioSesion.objects.select_for_update().values_list('respuestas_empaquetadas', flat=True).get(id=sesion.id)
+        valores = desempaquetar(actuales, mapa)
+        valores.update(validas)
+        datos = empaquetar(valores, mapa)
+        UsuarioSesion.objects.filter(id=sesion.id).update(respuestas_empaquetadas=datos)
+    sesion.respuestas_empaquetadas = datos
+
+# --- Conversión por lotes (comandos) ---
+
+def empaquetar_sesiones(sesiones):
+    """
+    Pasa un lote de sesiones de UsuarioRespuesta a bytes y borra sus filas.
+    Se salta las sesiones con respuestas a preguntas que no están en el mapa de su elección.
+    """
+    ids = [s.id for s in sesiones if s.eleccion_id and not esta_empaquetada(s)]
+    with transaction.atomic():
+        # Con las sesiones y sus filas bloqueadas, un /answers en curso no se pierde al borrar
+        sesiones = list(UsuarioSesion.objects.select_for_update().filter(id__in=ids, respuestas_empaquetadas__isnull=True).only('id', 'eleccion_id', 'respuestas_empaquetadas'))
+        respuestas = {}
+        filas = UsuarioRespuesta.objects.select_for_update().filter(sesion__in=sesiones).values_list('sesion_id', 'pregunta_id', 'valor')
+        for sesion_id, pregunta_id, valor in filas:
+            respuestas.setdefault(sesion_id, {})[pregunta_id] = valor
+
+        empaquetadas = []
+        for sesion in sesiones:
+            mapa = obtener_mapa_preguntas(sesion.eleccion_id)
+            valores = respuestas.get(sesion.id, {})
+            if not valores.keys() <= mapa.posicion_de.keys():
+                continue
+            sesion.respuestas_empaquetadas = empaquetar(valores, mapa)
+            empaquetadas.append(sesion)
+        # bulk_update no dispara señales: respuestas_empaquetadas no cuenta en contadores ni en el mapa de calor
+        UsuarioSesion.objects.bulk_update(empaquetadas, ['respuestas_empaquetadas'])
+        UsuarioRespuesta.objects.filter(sesion__in=empaquetadas).delete()
+    return len(empaquetadas)
+
+def desempaquetar_sesiones(sesiones):
+    """
+    Inverso de empaquetar_sesiones: recrea las filas de UsuarioRespuesta.
+    """
+    sesiones = [s for s in sesiones if esta_empaquetada(s)]
+    filas = [
+        UsuarioRespuesta(sesion_id=sesion.id, pregunta_id=pregunta_id, valor=valor)
+        for sesion in sesiones
+        for pregunta_id, valor in desempaquetar(sesion.respuestas_empaquetadas, obtener_mapa_preguntas(sesion.eleccion_id)).items()
+    ]
+    with transaction.atomic():
+        UsuarioRespuesta.objects.bulk_create(
+            filas, update_conflicts=True, unique_fields=['sesion', 'pregunta'], update_fields=['valor'], batch_size=1000,
+        )
+        for sesion in sesiones:
+            sesion.respuestas_empaquetadas = None
+        UsuarioSesion.objects.bulk_update(sesiones, ['respuestas_empaquetadas'])
+    return len(sesiones)
@@ -0,0 +1,217 @@
+import os
+import threading
+import numpy as np
+from django.conf import settings
+from .ranking import obtener_indice_posiciones
+
+# Las coordenadas del quiz van de -100 a 100 en ambos ejes
+LIMITE = 100.0
+
+# Lado de cada celda de la rejilla: 40 x 40 celdas sobre el plano
+TAMANO_CELDA = 5.0
+
+class IndiceEspacial:
+    """
+    Rejilla uniforme sobre el plano del quiz. Los puntos se guardan ordenados por
+    celda y `inicios` marca dónde empieza cada una (como una matriz CSR), así que
+    una fila de celdas contiguas es un único slice de los arrays. `grupos` (opcional)
+    etiqueta cada punto para restringir las consultas a uno, p. ej. su elección.
+    """
+    def __init__(self, ids, xs, ys, inicios, tamano_celda=TAMANO_CELDA, version=None, grupos=None):
+        self.ids = ids
+        self.xs = xs
+        self.ys = ys
+        self.grupos = grupos
+        self.inicios = inicios
+        self.tamano_celda = float(tamano_celda)
+        self.celdas_por_lado = int(round(2 * LIMITE / self.tamano_celda))
+        self.version = version
+
+    @classmethod
+    def construir(cls, ids, xs, ys, tamano_celda=TAMANO_CELDA, version=None, grupos=None):
+        ids = np.asarray(ids, dtype=np.int64)
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        lado = int(round(2 * LIMITE / tamano_celda))
+
+        celdas = cls._celda(ys, tamano_celda, lado) * lado + cls._celda(xs, tamano_celda, lado)
+        orden = np.argsort(celdas, kind='stable')
+        inicios = np.searchsorted(celdas[orden], np.arange(lado * lado + 1))
+        if grupos is not None:
+            grupos = np.asarray(grupos, dtype=np.int64)[orden]
+        return cls(ids[orden], xs[orden], ys[orden], inicios, tamano_celda, version, grupos)
+
+    @staticmethod
+    def _celda(valores, tamano_celda, lado):
+        return np.clip(((valores + LIMITE) // tamano_celda).astype(np.int64), 0, lado - 1)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def total(self, grupo=None):
+        return len(self) if grupo is None else int(np.count_nonzero(self.grupos == grupo))
+
+    # --- Snapshot binario ---
+
+    def guardar(self, ruta):
+        """
+        Escribe el índice como .npz sin comprimir (se carga con un solo read).
+        Se escribe en un temporal y se renombra para que ningún worker lea un archivo a medias.
+        """
+        os.makedirs(os.path.dirname(ruta) or '.', exist_ok=True)
+        temporal = f'{ruta}.tmp'
+        with open(temporal, 'wb') as archivo:
+            np.savez(
+                archivo, ids=self.ids, xs=self.xs, ys=self.ys, inicios=self.inicios,
+                tamano_celda=self.tamano_celda, version=self.version or 0,
+                grupos=self.grupos if self.grupos is not None else np.empty(0, dtype=np.int64),
+            )
+        os.replace(temporal, ruta)
+
+    @classmethod
+    def cargar(cls, ruta):
+        with np.load(ruta) as datos:
+            # Los snapshots sin grupos (o de antes de tenerlos) cargan con grupos=None
+            grupos = datos['grupos'] if 'grupos' in datos and len(datos['grupos']) == len(datos['ids']) else None
+            return cls(
+                datos['ids'], datos['xs'], datos['ys'], datos['inicios'],
+                float(datos['tamano_celda']), int(datos['version']), grupos,
+            )
+
+    # --- Consultas ---
+
+    def _candidatos(self, x0, x1, y0, y1):
+        """
+        Posiciones de los puntos en las celdas que cubren el rectángulo [x0, x1] x [y0, y1].
+        """
+        lado = self.celdas_por_lado
+        cx0, cx1 = (int(c) for c in self._celda(np.array([x0, x1]), self.tamano_celda, lado))
+        cy0, cy1 = (int(c) for c in self._celda(np.array([y0, y1]), self.tamano_celda, lado))
+        tramos = [
+            np.arange(self.inicios[cy * lado + cx0], self.inicios[cy * lado + cx1 + 1])
+            for cy in range(cy0, cy1 + 1)
+        ]
+        return np.concatenate(tramos) if tramos else np.empty(0, dtype=np.int64)
+
+    def _filtrar(self, posiciones, excluir=None, grupo=None):
+        if excluir is not None:
+            posiciones = posiciones[self.ids[posiciones] != excluir]
+        if grupo is not None:
+            posiciones = posiciones[self.grupos[posiciones] == grupo]
+        return posiciones
+
+    def _distancias(self, posiciones, x, y):
+        return np.sqrt((self.xs[posiciones] - x)**2 + (self.ys[posiciones] - y)**2)
+
+    def en_radio(self, x, y, radio, excluir=None, grupo=None):
+        """
+        (posiciones, distancias) de los puntos a distancia <= radio, de más cercano a más lejano.
+        """
+        posiciones = self._filtrar(self._candidatos(x - radio, x + radio, y - radio, y + radio), excluir, grupo)
+        distancias = self._distancias(posiciones, x, y)
+        dentro = distancias <= radio
+        posiciones, distancias = posiciones[dentro], distancias[dentro]
+        orden = np.argsort(distancias, kind='stable')
+        return posiciones[orden], distancias[orden]
+
+    def cercanos(self, x, y, k, radio=None, excluir=None, grupo=None):
+        """
+        Los k puntos más cercanos a (x, y), opcionalmente limitados a un radio y a un grupo.
+        Amplía la búsqueda anillo a anillo de celdas hasta que el k-ésimo candidato
+        está más cerca que cualquier punto fuera del área recorrida.
+        """
+        if radio is not None:
+            posiciones, distancias = self.en_radio(x, y, radio, excluir, grupo)
+            return posiciones[:k], distancias[:k]
+
+        alcance = self.tamano_celda
+        while True:
+            posiciones = self._filtrar(self._candidatos(x - alcance, x + alcance, y - alcance, y + alcance), excluir, grupo)
+            distancias = self._distancias(posiciones, x, y)
+            # Desde cualquier punto del plano, un alcance de 200 ya cubre todas las celdas
+            cubre_todo = alcance >= 2 * LIMITE
+            if len(posiciones) >= k or cubre_todo:
+                if len(posiciones) > k:
+                    mejores = np.argpartition(distancias, k - 1)[:k]
+                    posiciones, distancias = posiciones[mejores], distancias[mejores]
+                # Cualquier punto fuera del cuadrado está a más de `alcance` de (x, y)
+                if cubre_todo or (len(distancias) and distancias.max() <= alcance):
+                    orden = np.argsort(distancias, kind='stable')
+                    return posiciones[orden], distancias[orden]
+            alcance *= 2
+
+    def fuerza_bruta(self, x, y, k):
+        """
+        Recorrido completo, como referencia para el benchmark.
+        """
+        distancias = np.sqrt((self.xs - x)**2 + (self.ys - y)**2)
+        mejores = np.argpartition(distancias, k - 1)[:k] if k < len(distancias) else np.arange(len(distancias))
+        orden = mejores[np.argsort(distancias[mejores], kind='stable')]
+        return orden, distancias[orden]
+
+# --- Índices del worker ---
+
+_partidos = None
+_indice_sesiones = None
+_firma_sesiones = None
+_lock = threading.Lock()
+
+def obtener_indice_partidos():
+    """
+    (índice de ranking, índice espacial de sus partidos), construidos del mismo snapshot:
+    los ids del espacial son posiciones del de ranking, así que se piden siempre juntos.
+    """
+    global _partidos
+    posiciones = obtener_indice_posiciones()
+    par = _partidos
+    if par is not None and par[0] is posiciones:
+        return par
+
+    with _lock:
+        if _partidos is None or _partidos[0] is not posiciones:
+            _partidos = (posiciones, IndiceEspacial.construir(
+                np.arange(len(posiciones)), posiciones.xs, posiciones.ys, version=posiciones.version
+            ))
+        return _partidos
+
+def construir_indice_sesiones():
+    """
+    Índice de los resultados de las sesiones completadas, leído por bloques con iterator().
+    Cada punto lleva su elección como grupo (0 si no tiene).
+    """
+    from .models import UsuarioSesion
+
+    filas = (
+        UsuarioSesion.objects.filter(completado=True, resultado_x__isnull=False, resultado_y__isnull=False)
+        .values_list('id', 'resultado_x', 'resultado_y', 'eleccion_id')
+        .iterator(chunk_size=10_000)
+    )
+    ids, xs, ys, elecciones = [], [], [], []
+    for sesion_id, x, y, eleccion_id in filas:
+        ids.append(sesion_id)
+        xs.append(float(x))
+        ys.append(float(y))
+        elecciones.append(eleccion_id or 0)
+    return IndiceEspacial.construir(ids, xs, ys, grupos=elecciones)
+
+def obtener_indice_sesiones():
+    """
+    Índice de sesiones cargado del snapshot de INDICE_SESIONES_RUTA.
+    Se recarga cuando el archivo cambia (lo regenera `manage.py indice_espacial`);
+    devuelve None si todavía no existe.
+    """
+    global _indice_sesiones, _firma_sesiones
+    ruta = settings.INDICE_SESIONES_RUTA
+    try:
+        estado = os.stat(ruta)
+    except FileNotFoundError:
+        return None
+    firma = (estado.st_mtime_ns, estado.st_size)
+    if _indice_sesiones is not None and _firma_sesiones == firma:
+        return _indice_sesiones
+
+    with _lock:
+        if _indice_sesiones is None or _firma_sesiones != firma:
+            _indice_sesiones = IndiceEspacial.cargar(ruta)
+            _firma_sesiones = firma
+        return _indice_sesiones
@@ -0,0 +1,200 @@
+"""
+Exportación masiva de sesiones con sus respuestas para análisis: CSV, JSON Lines
+o Parquet (este último con pyarrow), filtrada por elección y rango de fechas.
+
+Todo son generadores: las sesiones y sus respuestas se leen con dos cursores
+del lado del servidor ordenados por id de sesión y se cruzan al vuelo, así que
+exportar millones de filas usa memoria constante y solo dos consultas.
+Las sesiones empaquetadas y las archivadas no tienen filas en UsuarioRespuesta;
+sus respuestas salen de los bytes. Lo que siga en un buffer write-behind sin
+volcar no se exporta.
+"""
+import csv
+import datetime
+import io
+import json
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from core.replicas import ALIAS_REPLICA, replica_disponible
+from .empaquetado import desempaquetar, obtener_mapa_preguntas
+from .models import UsuarioSesion, UsuarioRespuesta, SesionArchivada
+
+COLUMNAS = [
+    'id', 'token', 'usuario_id', 'eleccion_id', 'region_id', 'fecha',
+    'completado', 'resultado_x', 'resultado_y', 'respuestas',
+]
+
+# Filas por cursor del lado del servidor
+TAMANO_CURSOR = 2000
+
+# Filas por trozo de la respuesta (CSV/JSONL) y por row group (Parquet)
+FILAS_POR_TROZO = 1000
+FILAS_POR_GRUPO = 50_000
+
+def rango_fechas(desde=None, hasta=None):
+    """
+    'YYYY-MM-DD' -> (inicio, fin) como datetimes con zona, fin exclusivo
+    (hasta incluye el día entero). Lanza ValueError si alguna fecha no es válida.
+    """
+    limites = []
+    for valor, dias in ((desde, 0), (hasta, 1)):
+        if not valor:
+            limites.append(None)
+            continue
+        fecha = parse_date(valor)
+        if fecha is None:
+            raise ValueError(valor)
+        limites.append(timezone.make_aware(datetime.datetime.combine(fecha + datetime.timedelta(days=dias), datetime.time.min)))
+    return tuple(limites)
+
+def _filtrar(queryset, eleccion_id, inicio, fin):
+    filtro = Q()
+    if eleccion_id is not None:
+        filtro &= Q(eleccion_id=eleccion_id)
+    if inicio is not None:
+        filtro &= Q(fecha__gte=inicio)
+    if fin is not None:
+        filtro &= Q(fecha__lt=fin)
+    return queryset.filter(filtro).order_by('id')
+
+def _fila(id, token, usuario_id, eleccion_id, region_id, fecha, completado, x, y, respuestas):
+    return {
+        'id': id, 'token': token, 'usuario_id': usuario_id, 'eleccion_id': eleccion_id, 'region_id': region_id,
+        'fecha': fecha.isoformat(), 'completado': completado,
+        'resultado_x': None if x is None else float(x),
+        'resultado_y': None if y is None else float(y),
+        'respuestas': respuestas,
+    }
+
+def filas_exportacion(eleccion_id=None, desde=None, hasta=None, archivadas=True):
+    """
+    Genera un dict por sesión (COLUMNAS, respuestas como {pregunta_id: valor}),
+    primero las activas y después las archivadas. Lee de la réplica si hay una.
+    """
+    alias = ALIAS_REPLICA if replica_disponible() else 'default'
+    inicio, fin = rango_fechas(desde, hasta)
+    campos = ('id', 'token', 'usuario_id', 'eleccion_id', 'region_id', 'fecha', 'completado', 'resultado_x', 'resultado_y', 'respuestas_empaquetadas')
+
+    sesiones = _filtrar(UsuarioSesion.objects.using(alias), eleccion_id, inicio, fin)
+    respuestas = iter(
+        UsuarioRespuesta.objects.using(alias)
+        .filter(sesion__in=sesiones.values('id'))
+        .order_by('sesion_id')
+        .values_list('sesion_id', 'pregunta_id', 'valor')
+        .iterator(chunk_size=TAMANO_CURSOR)
+    )
+    siguiente = next(respuestas, None)
+    for *datos, empaquetadas in sesiones.values_list(*campos).iterator(chunk_size=TAMANO_CURSOR):
+        sesion_id = datos[0]
+        if empaquetadas is not None:
+            valores = desempaquetar(empaquetadas, obtener_mapa_preguntas(datos[3]))
+        else:
+            valores = {}
+            # Filas de sesiones creadas entre las dos consultas: no están en el otro cursor
+            while siguiente is not None and siguiente[0] < sesion_id:
+                siguiente = next(respuestas, None)
+            while siguiente is not None and siguiente[0] == sesion_id:
+                valores[siguiente[1]] = siguiente[2]
+                siguiente = next(respuestas, None)
+        yield _fila(*datos, valores)
+
+    if not archivadas:
+        return
+    archivo = _filtrar(SesionArchivada.objects.using(alias), eleccion_id, inicio, fin)
+    for *datos, empaquetadas in archivo.values_list(*campos).iterator(chunk_size=TAMANO_CURSOR):
+        yield _fila(*datos, desempaquetar(empaquetadas, obtener_mapa_preguntas(datos[3])))
+
+def _por_trozos(filas, tamano):
+    trozo = []
+    for fila in filas:
+        trozo.append(fila)
+        if len(trozo) == tamano:
+            yield trozo
+            trozo = []
+    if trozo:
+        yield trozo
+
+# --- Formatos ---
+
+def exportar_csv(filas):
+    """
+    Una línea por sesión; la columna `respuestas` lleva el JSON {pregunta_id: valor}.
+    """
+    salida = io.StringIO()
+    escritor = csv.writer(salida)
+    escritor.writerow(COLUMNAS)
+    for trozo in _por_trozos(filas, FILAS_POR_TROZO):
+        for fila in trozo:
+            fila['respuestas'] = json.dumps(fila['respuestas'])
+            escritor.writerow(fila.values())
+        yield salida.getvalue()
+        salida.seek(0)
+        salida.truncate()
+    if salida.tell():
+        yield salida.getvalue()
+
+def exportar_jsonl(filas):
+    for trozo in _por_trozos(filas, FILAS_POR_TROZO):
+        yield ''.join(json.dumps(fila, ensure_ascii=False) + '\n' for fila in trozo)
+
+class _Salida(io.RawIOBase):
+    """
+    Archivo de solo escritura que acumula lo que escribe pyarrow hasta que se recoge.
+    """
+    def __init__(self):
+        self.partes = []
+        self.posicion = 0
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        self.partes.append(bytes(datos))
+        self.posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self.posicion
+
+    def recoger(self):
+        datos = b''.join(self.partes)
+        self.partes = []
+        return datos
+
+def parquet_disponible():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def exportar_parquet(filas):
+    """
+    Un row group de FILAS_POR_GRUPO sesiones cada vez, comprimido con zstd.
+    `respuestas` va como JSON, igual que en el CSV.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    esquema = pa.schema([
+        ('id', pa.int64()), ('token', pa.string()), ('usuario_id', pa.int64()),
+        ('eleccion_id', pa.int64()), ('region_id', pa.int64()), ('fecha', pa.string()),
+        ('completado', pa.bool_()), ('resultado_x', pa.float64()), ('resultado_y', pa.float64()),
+        ('respuestas', pa.string()),
+    ])
+    salida = _Salida()
+    with pq.ParquetWriter(salida, esquema, compression='zstd') as escritor:
+        for trozo in _por_trozos(filas, FILAS_POR_GRUPO):
+            for fila in trozo:
+                fila['respuestas'] = json.dumps(fila['respuestas'])
+            escritor.write_table(pa.Table.from_pylist(trozo, schema=esquema))
+            yield salida.recoger()
+    yield salida.recoger()
+
+# formato -> (generador, content type, extensión)
+FORMATOS = {
+    'csv': (exportar_csv, 'text/csv; charset=utf-8', 'csv'),
+    'jsonl': (exportar_jsonl, 'application/x-ndjson; charset=utf-8', 'jsonl'),
+    'parquet': (exportar_parquet, 'application/vnd.apache.parquet', 'parquet'),
+}
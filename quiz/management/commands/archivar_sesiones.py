@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from core.models import Eleccion
+from quiz.archivo import DESTINOS, EscritorSnapshot, archivar_eleccion, elecciones_archivables
+from quiz.models import UsuarioSesion
+
+class Command(BaseCommand):
+    help = "Mueve las sesiones completadas de elecciones pasadas a SesionArchivada o a un snapshot CSV/Parquet."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--anio', type=int, help="Solo la elección de ese año (por defecto todas salvo la actual).")
+        parser.add_argument('--destino', choices=DESTINOS, default='tabla', help="SesionArchivada, csv.gz o parquet.")
+        parser.add_argument('--carpeta', default=settings.ARCHIVO_DIR, help="Carpeta de los snapshots.")
+        parser.add_argument('--lote', type=int, default=1000, help="Sesiones por transacción.")
+        parser.add_argument('--dry-run', action='store_true', help="Solo cuenta lo que se archivaría.")
+
+    def handle(self, *args, **options):
+        if options['anio']:
+            elecciones = Eleccion.objects.filter(anio=options['anio'])
+            if not elecciones.exists():
+                raise CommandError(f"No existe la elección {options['anio']}")
+        else:
+            elecciones = elecciones_archivables()
+
+        if options['destino'] == 'parquet' and not options['dry_run']:
+            try:
+                import pandas  # noqa: F401
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise CommandError("El destino parquet requiere pandas y pyarrow: pip install pandas pyarrow")
+
+        total = 0
+        for eleccion in elecciones.order_by('anio'):
+            if options['dry_run']:
+                cantidad = UsuarioSesion.objects.filter(eleccion=eleccion, completado=True).count()
+            else:
+                escritor = None
+                if options['destino'] != 'tabla':
+                    escritor = EscritorSnapshot(options['carpeta'], eleccion, options['destino'])
+                cantidad = archivar_eleccion(eleccion, escritor, options['lote'])
+            self.stdout.write(f"{eleccion.nombre} ({eleccion.anio}): {cantidad} sesiones")
+            total += cantidad
+
+        accion = "se archivarían" if options['dry_run'] else "archivadas"
+        self.stdout.write(self.style.SUCCESS(f"{total} sesiones {accion}."))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from quiz.empaquetado import desempaquetar_sesiones
+from quiz.models import UsuarioSesion
+from .empaquetar_respuestas import recorrer_por_lotes
+
+class Command(BaseCommand):
+    help = "Vuelve a guardar en UsuarioRespuesta las respuestas de las sesiones empaquetadas."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=500, help="Sesiones por transacción.")
+
+    def handle(self, *args, **options):
+        sesiones = UsuarioSesion.objects.filter(respuestas_empaquetadas__isnull=False)
+        total = recorrer_por_lotes(sesiones, options['lote'], desempaquetar_sesiones)
+        self.stdout.write(self.style.SUCCESS(f"{total} sesiones desempaquetadas."))
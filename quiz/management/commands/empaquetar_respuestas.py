@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from quiz.empaquetado import empaquetar_sesiones
+from quiz.models import UsuarioSesion
+
+class Command(BaseCommand):
+    help = "Convierte las respuestas de UsuarioRespuesta al vector empaquetado de cada sesión y borra las filas."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=500, help="Sesiones por transacción.")
+        parser.add_argument('--solo-completadas', action='store_true', help="Deja en filas las sesiones sin finalizar.")
+
+    def handle(self, *args, **options):
+        sesiones = UsuarioSesion.objects.filter(respuestas_empaquetadas__isnull=True, eleccion__isnull=False)
+        if options['solo_completadas']:
+            sesiones = sesiones.filter(completado=True)
+        total = recorrer_por_lotes(sesiones, options['lote'], empaquetar_sesiones)
+        self.stdout.write(self.style.SUCCESS(f"{total} sesiones empaquetadas."))
+
+def recorrer_por_lotes(sesiones, tamano, convertir):
+    """
+    Recorre las sesiones por id (keyset) y aplica `convertir` a cada lote.
+    """
+    sesiones = sesiones.only('id', 'eleccion_id', 'respuestas_empaquetadas').order_by('id')
+    ultimo_id = 0
+    total = 0
+    while True:
+        lote = list(sesiones.filter(id__gt=ultimo_id)[:tamano])
+        if not lote:
+            return total
+        total += convertir(lote)
+        ultimo_id = lote[-1].id
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.models import Eleccion
+from quiz.exportacion import FORMATOS, filas_exportacion, parquet_disponible, rango_fechas
+
+class Command(BaseCommand):
+    help = "Exporta las sesiones con sus respuestas a CSV, JSON Lines o Parquet con memoria constante."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--formato', choices=FORMATOS, default='csv')
+        parser.add_argument('--anio', type=int, help="Solo la elección de ese año.")
+        parser.add_argument('--desde', help="Fecha inicial YYYY-MM-DD (incluida).")
+        parser.add_argument('--hasta', help="Fecha final YYYY-MM-DD (incluida).")
+        parser.add_argument('--sin-archivadas', action='store_true', help="Deja fuera SesionArchivada.")
+        parser.add_argument('--salida', help="Archivo de destino (por defecto la salida estándar; obligatorio con parquet).")
+
+    def handle(self, *args, **options):
+        formato = options['formato']
+        if formato == 'parquet':
+            if not parquet_disponible():
+                raise CommandError("El formato parquet requiere pyarrow: pip install pyarrow")
+            if not options['salida']:
+                raise CommandError("Con --formato parquet hay que indicar --salida")
+        try:
+            rango_fechas(options['desde'], options['hasta'])
+        except ValueError as e:
+            raise CommandError(f"Fecha inválida: {e}")
+
+        eleccion_id = None
+        if options['anio']:
+            eleccion_id = Eleccion.objects.filter(anio=options['anio']).values_list('id', flat=True).first()
+            if eleccion_id is None:
+                raise CommandError(f"No existe la elección {options['anio']}")
+
+        generador = FORMATOS[formato][0]
+        filas = filas_exportacion(eleccion_id, options['desde'], options['hasta'], archivadas=not options['sin_archivadas'])
+
+        if not options['salida']:
+            for trozo in generador(filas):
+                self.stdout.write(trozo, ending='')
+            return
+
+        if formato == 'parquet':
+            archivo = open(options['salida'], 'wb')
+        else:
+            archivo = open(options['salida'], 'w', encoding='utf-8', newline='')
+        with archivo:
+            for trozo in generador(filas):
+                archivo.write(trozo)
+        self.stdout.write(self.style.SUCCESS(f"Exportación guardada en {options['salida']}"))
@@ -0,0 +1,52 @@
+import time
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from quiz.espacial import IndiceEspacial, LIMITE, construir_indice_sesiones
+
+class Command(BaseCommand):
+    help = "Regenera el snapshot del índice espacial de sesiones completadas. Con --benchmark lo compara con el recorrido completo."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ruta', default=settings.INDICE_SESIONES_RUTA, help="Archivo .npz de destino.")
+        parser.add_argument('--benchmark', type=int, default=0, metavar='CONSULTAS', help="Número de consultas aleatorias a medir.")
+        parser.add_argument('--k', type=int, default=10, help="Vecinos por consulta en el benchmark.")
+        parser.add_argument('--sinteticos', type=int, default=0, help="Mide sobre N puntos aleatorios en lugar de la base de datos (no guarda snapshot).")
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        if options['sinteticos']:
+            generador = np.random.default_rng(0)
+            total = options['sinteticos']
+            indice = IndiceEspacial.construir(
+                np.arange(total), generador.uniform(-LIMITE, LIMITE, total), generador.uniform(-LIMITE, LIMITE, total)
+            )
+        else:
+            indice = construir_indice_sesiones()
+            indice.guardar(options['ruta'])
+            self.stdout.write(f"Snapshot guardado en {options['ruta']}")
+        self.stdout.write(f"{len(indice)} puntos indexados en {time.perf_counter() - inicio:.2f} s")
+
+        if options['benchmark'] and len(indice):
+            self.benchmark(indice, options['benchmark'], min(options['k'], len(indice)))
+
+    def benchmark(self, indice, consultas, k):
+        generador = np.random.default_rng(1)
+        puntos = generador.uniform(-LIMITE, LIMITE, (consultas, 2))
+
+        inicio = time.perf_counter()
+        rejilla = [indice.cercanos(x, y, k)[1] for x, y in puntos]
+        tiempo_rejilla = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        bruta = [indice.fuerza_bruta(x, y, k)[1] for x, y in puntos]
+        tiempo_bruta = time.perf_counter() - inicio
+
+        # Con empates el orden de los ids puede variar; las distancias deben coincidir
+        iguales = all(np.allclose(a, b) for a, b in zip(rejilla, bruta))
+        self.stdout.write(f"Rejilla: {tiempo_rejilla / consultas * 1e6:.1f} µs por consulta")
+        self.stdout.write(f"Fuerza bruta: {tiempo_bruta / consultas * 1e6:.1f} µs por consulta")
+        if iguales:
+            self.stdout.write(self.style.SUCCESS(f"Resultados idénticos; aceleración x{tiempo_bruta / tiempo_rejilla:.1f}"))
+        else:
+            self.stdout.write(self.style.ERROR("La rejilla y la fuerza bruta no coinciden"))
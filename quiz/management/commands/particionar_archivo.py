@@ -0,0 +1,78 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from core.models import Eleccion, Region, Usuario
+from quiz.models import SesionArchivada
+
+class Command(BaseCommand):
+    help = (
+        "Convierte la tabla de SesionArchivada en una tabla particionada por elección (PostgreSQL, LIST sobre eleccion_id). "
+        "Sin --aplicar solo imprime el SQL; si ya está particionada, solo crea las particiones que falten."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--aplicar', action='store_true', help="Ejecuta el SQL en lugar de imprimirlo.")
+
+    def handle(self, *args, **options):
+        if options['aplicar'] and connection.vendor != 'postgresql':
+            raise CommandError("El particionado declarativo solo está disponible en PostgreSQL")
+
+        sentencias = self.particiones() if self.ya_particionada() else self.convertir()
+
+        if not options['aplicar']:
+            for sentencia in sentencias:
+                self.stdout.write(f"{sentencia};")
+            return
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            for sentencia in sentencias:
+                cursor.execute(sentencia)
+        self.stdout.write(self.style.SUCCESS(f"{len(sentencias)} sentencias aplicadas sobre {self.tabla}."))
+
+    @property
+    def tabla(self):
+        return SesionArchivada._meta.db_table
+
+    def particiones(self):
+        return [
+            f"CREATE TABLE IF NOT EXISTS {self.tabla}_e{eleccion_id} PARTITION OF {self.tabla} FOR VALUES IN ({eleccion_id})"
+            for eleccion_id in Eleccion.objects.order_by('id').values_list('id', flat=True)
+        ]
+
+    def ya_particionada(self):
+        if connection.vendor != 'postgresql':
+            return False
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = %s",
+                [self.tabla],
+            )
+            return cursor.fetchone() is not None
+
+    def convertir(self):
+        """
+        Recrea la tabla como particionada y copia las filas. La clave primaria pasa a
+        (id, eleccion_id) porque PostgreSQL exige la columna de partición en ella;
+        los ids siguen siendo únicos porque vienen de UsuarioSesion.
+        """
+        tabla = self.tabla
+        plana = f"{tabla}_plana"
+        referencias = [
+            ('eleccion_id', Eleccion._meta.db_table),
+            ('usuario_id', Usuario._meta.db_table),
+            ('region_id', Region._meta.db_table),
+        ]
+        return [
+            f"ALTER TABLE {tabla} RENAME TO {plana}",
+            f"CREATE TABLE {tabla} (LIKE {plana} INCLUDING DEFAULTS) PARTITION BY LIST (eleccion_id)",
+            f"ALTER TABLE {tabla} ADD PRIMARY KEY (id, eleccion_id)",
+            f"CREATE INDEX {tabla}_token_idx ON {tabla} (token)",
+            *(
+                f"ALTER TABLE {tabla} ADD FOREIGN KEY ({columna}) REFERENCES {destino} (id) DEFERRABLE INITIALLY DEFERRED"
+                for columna, destino in referencias
+            ),
+            f"CREATE TABLE {tabla}_default PARTITION OF {tabla} DEFAULT",
+            # Las particiones por elección se crean antes de copiar para que las filas no caigan en la default
+            *self.particiones(),
+            f"INSERT INTO {tabla} SELECT * FROM {plana}",
+            f"DROP TABLE {plana}",
+        ]
@@ -0,0 +1,74 @@
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+from django.core.management.base import BaseCommand, CommandError
+
+# Ruta de cada endpoint en la API síncrona y en la asíncrona
+RUTAS = {
+    'matches': ('/api/quiz/{token}/matches/', '/api/async/quiz/{token}/matches/'),
+    'posiciones': ('/api/partido-posiciones/', '/api/async/partido-posiciones/'),
+    'finalizar': ('/api/quiz/{token}/finalizar/', '/api/async/quiz/{token}/finalizar/'),
+}
+
+class Command(BaseCommand):
+    help = (
+        "Prueba de carga contra un servidor en marcha: compara la API síncrona (gunicorn/WSGI) "
+        "con la asíncrona (uvicorn/ASGI) lanzando peticiones concurrentes al mismo endpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wsgi', default='http://127.0.0.1:8000', help="URL base del servidor WSGI.")
+        parser.add_argument('--asgi', default='http://127.0.0.1:8001', help="URL base del servidor ASGI.")
+        parser.add_argument('--endpoint', choices=RUTAS.keys(), default='matches')
+        parser.add_argument('--token', help="Token de una sesión finalizada (matches y finalizar).")
+        parser.add_argument('--concurrencia', type=int, default=50)
+        parser.add_argument('--peticiones', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=1, help="Workers de cada servidor, para informar por worker.")
+
+    def handle(self, *args, **options):
+        if options['endpoint'] != 'posiciones' and not options['token']:
+            raise CommandError("--token es obligatorio para este endpoint")
+
+        ruta_wsgi, ruta_asgi = (r.format(token=options['token']) for r in RUTAS[options['endpoint']])
+        metodo = 'POST' if options['endpoint'] == 'finalizar' else 'GET'
+        for nombre, url in (('WSGI', options['wsgi'] + ruta_wsgi), ('ASGI', options['asgi'] + ruta_asgi)):
+            self.medir(nombre, url, metodo, options)
+
+    def medir(self, nombre, url, metodo, options):
+        def peticion(_):
+            inicio = time.perf_counter()
+            try:
+                with urlopen(Request(url, method=metodo, data=b'' if metodo == 'POST' else None), timeout=30) as respuesta:
+                    respuesta.read()
+                    ok = respuesta.status < 400
+            except (HTTPError, URLError, OSError):
+                ok = False
+            return ok, time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrencia']) as ejecutor:
+            resultados = list(ejecutor.map(peticion, range(options['peticiones'])))
+        total = time.perf_counter() - inicio
+
+        latencias = sorted(latencia for ok, latencia in resultados if ok)
+        errores = len(resultados) - len(latencias)
+        if not latencias:
+            self.stdout.write(self.style.ERROR(f"{nombre}: todas las peticiones fallaron ({url})"))
+            return
+
+        por_segundo = len(latencias) / total
+        percentiles = statistics.quantiles(latencias, n=100) if len(latencias) > 1 else latencias * 99
+        self.stdout.write(json.dumps({
+            "servidor": nombre,
+            "url": url,
+            "concurrencia": options['concurrencia'],
+            "peticiones_por_segundo": round(por_segundo, 1),
+            "por_worker": round(por_segundo / options['workers'], 1),
+            "p50_ms": round(percentiles[49] * 1000, 1),
+            "p95_ms": round(percentiles[94] * 1000, 1),
+            "p99_ms": round(percentiles[98] * 1000, 1),
+            "errores": errores,
+        }, ensure_ascii=False))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.models import Eleccion
+from quiz.posiciones import recalcular_posiciones
+
+class Command(BaseCommand):
+    help = "Recalcula desde PartidoRespuesta las sumas y posiciones de partidoposicioncache (corrige cualquier deriva)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--anio', type=int, help="Solo la elección de ese año (por defecto todas).")
+
+    def handle(self, *args, **options):
+        eleccion_id = None
+        if options['anio']:
+            eleccion_id = Eleccion.objects.filter(anio=options['anio']).values_list('id', flat=True).first()
+            if eleccion_id is None:
+                raise CommandError(f"No existe la elección {options['anio']}")
+
+        filas = recalcular_posiciones(eleccion_id)
+        self.stdout.write(self.style.SUCCESS(f"{filas} posiciones de partido recalculadas."))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from quiz.ranking import obtener_tabla_rankings
+
+class Command(BaseCommand):
+    help = "Construye la tabla de rankings precalculada de la elección actual e informa de su tamaño en memoria."
+
+    def handle(self, *args, **options):
+        tabla = obtener_tabla_rankings()
+        self.stdout.write(f"Valores en X: {len(tabla.posicion_x)}")
+        self.stdout.write(f"Valores en Y: {len(tabla.posicion_y)}")
+        self.stdout.write(f"Partidos: {len(tabla.indice)}")
+        self.stdout.write(f"Puntos: {tabla.puntos}")
+        self.stdout.write(self.style.SUCCESS(f"Memoria: {tabla.memoria / 1024 / 1024:.2f} MB por worker"))
@@ -0,0 +1,20 @@
+import time
+from django.core.management.base import BaseCommand
+from quiz.buffer_respuestas import volcar_pendientes
+
+class Command(BaseCommand):
+    help = "Vuelca a la base de datos los buffers write-behind de respuestas, incluidos los que dejó un worker caído."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--una-vez', action='store_true', help="Vuelca lo pendiente y termina en lugar de repetir.")
+        parser.add_argument('--intervalo', type=float, default=10.0, help="Segundos entre volcados.")
+
+    def handle(self, *args, **options):
+        while True:
+            sesiones, respuestas = volcar_pendientes()
+            if sesiones:
+                self.stdout.write(f"{respuestas} respuestas volcadas de {sesiones} sesiones")
+
+            if options['una_vez']:
+                break
+            time.sleep(options['intervalo'])
@@ -0,0 +1,34 @@
+# Generated by Django 6.0.1 on 2026-10-18 07:26
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def eliminar_respuestas_duplicadas(apps, schema_editor):
+    # Antes de la restricción podían existir varias filas por (sesion, pregunta):
+    # conservamos solo la más reciente de cada par
+    UsuarioRespuesta = apps.get_model('quiz', 'UsuarioRespuesta')
+    duplicadas = (
+        UsuarioRespuesta.objects.values('sesion_id', 'pregunta_id')
+        .annotate(ultima=Max('id'), total=models.Count('id'))
+        .filter(total__gt=1)
+    )
+    for grupo in list(duplicadas):
+        UsuarioRespuesta.objects.filter(
+            sesion_id=grupo['sesion_id'], pregunta_id=grupo['pregunta_id'], id__lt=grupo['ultima']
+        ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(eliminar_respuestas_duplicadas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='usuariorespuesta',
+            constraint=models.UniqueConstraint(fields=('sesion', 'pregunta'), name='usuariorespuesta_sesion_pregunta_unica'),
+        ),
+    ]
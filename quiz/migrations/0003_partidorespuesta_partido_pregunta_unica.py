@@ -0,0 +1,33 @@
+# Generated by Django 6.0.1 on 2026-10-18 08:20
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def eliminar_posturas_duplicadas(apps, schema_editor):
+    # Conservamos solo la postura más reciente de cada (partido, pregunta)
+    PartidoRespuesta = apps.get_model('quiz', 'PartidoRespuesta')
+    duplicadas = (
+        PartidoRespuesta.objects.values('partido_id', 'pregunta_id')
+        .annotate(ultima=Max('id'), total=models.Count('id'))
+        .filter(total__gt=1)
+    )
+    for grupo in list(duplicadas):
+        PartidoRespuesta.objects.filter(
+            partido_id=grupo['partido_id'], pregunta_id=grupo['pregunta_id'], id__lt=grupo['ultima']
+        ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0002_usuariorespuesta_sesion_pregunta_unica'),
+    ]
+
+    operations = [
+        migrations.RunPython(eliminar_posturas_duplicadas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='partidorespuesta',
+            constraint=models.UniqueConstraint(fields=('partido', 'pregunta'), name='partidorespuesta_partido_pregunta_unica'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-18 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0003_partidorespuesta_partido_pregunta_unica'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='usuariosesion',
+            name='token',
+            field=models.CharField(editable=False, max_length=16, unique=True),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 6.0.1 on 2026-10-18 10:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('quiz', '0004_alter_usuariosesion_token'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usuariosesion',
+            name='region',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.region'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 6.0.1 on 2026-10-18 11:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('quiz', '0005_usuariosesion_region'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usuariosesion',
+            name='buffer_pendiente',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='usuariosesion',
+            index=models.Index(condition=models.Q(('buffer_pendiente', True)), fields=['buffer_pendiente'], name='usuariosesion_buffer_idx'),
+        ),
+    ]
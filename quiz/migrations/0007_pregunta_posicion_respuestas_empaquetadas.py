@@ -0,0 +1,41 @@
+# Generated by Django 6.0.1 on 2026-10-18 12:05
+
+from django.db import migrations, models
+
+
+def numerar_preguntas(apps, schema_editor):
+    # Las preguntas existentes se numeran por id dentro de cada elección
+    Pregunta = apps.get_model('quiz', 'Pregunta')
+    siguiente = {}
+    cambiadas = []
+    for pregunta in Pregunta.objects.order_by('eleccion_id', 'id').only('id', 'eleccion_id'):
+        pregunta.posicion = siguiente.get(pregunta.eleccion_id, 0)
+        siguiente[pregunta.eleccion_id] = pregunta.posicion + 1
+        cambiadas.append(pregunta)
+    Pregunta.objects.bulk_update(cambiadas, ['posicion'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('quiz', '0006_usuariosesion_buffer_pendiente'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pregunta',
+            name='posicion',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='usuariosesion',
+            name='respuestas_empaquetadas',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.RunPython(numerar_preguntas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='pregunta',
+            constraint=models.UniqueConstraint(fields=('eleccion', 'posicion'), name='pregunta_eleccion_posicion_unica'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0.1 on 2026-10-18 12:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('quiz', '0007_pregunta_posicion_respuestas_empaquetadas'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SesionArchivada',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('token', models.CharField(db_index=True, max_length=16)),
+                ('fecha', models.DateTimeField()),
+                ('resultado_x', models.DecimalField(decimal_places=2, max_digits=5, null=True)),
+                ('resultado_y', models.DecimalField(decimal_places=2, max_digits=5, null=True)),
+                ('completado', models.BooleanField(default=True)),
+                ('respuestas_empaquetadas', models.BinaryField()),
+                ('fecha_archivado', models.DateTimeField(auto_now_add=True)),
+                ('eleccion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.eleccion')),
+                ('region', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.region')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
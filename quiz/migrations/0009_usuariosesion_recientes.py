@@ -0,0 +1,20 @@
+# Generated by Django 6.0.1 on 2026-10-18 15:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('quiz', '0008_sesionarchivada'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usuariosesion',
+            index=models.Index(fields=['-fecha', '-id'], name='usuariosesion_recientes_idx'),
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 6.0.1 on 2026-10-18 15:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F, Q, Sum
+
+
+def _eje(total, count):
+    # Igual que quiz.utils._normalizar_eje
+    if count == 0:
+        return 0.0
+    return max(-100, min(100, float(total / (count * 2) * 100)))
+
+
+def separar_por_eleccion(apps, schema_editor):
+    # Una fila por partido y elección con sus sumas; las filas antiguas sin elección
+    # solo se conservan para partidos que no tienen respuestas
+    PartidoPosicion = apps.get_model('quiz', 'PartidoPosicion')
+    PartidoRespuesta = apps.get_model('quiz', 'PartidoRespuesta')
+
+    activas = Q(pregunta__estado='activa')
+    ponderado = F('valor') * F('pregunta__direccion')
+    filas = PartidoRespuesta.objects.filter(pregunta__eleccion__isnull=False).values('partido_id', 'pregunta__eleccion_id').annotate(
+        suma_x=Sum(ponderado, filter=activas & Q(pregunta__eje='X')),
+        conteo_x=Count('id', filter=activas & Q(pregunta__eje='X')),
+        suma_y=Sum(ponderado, filter=activas & Q(pregunta__eje='Y')),
+        conteo_y=Count('id', filter=activas & Q(pregunta__eje='Y')),
+    )
+    nuevas = []
+    for fila in filas:
+        suma_x, conteo_x, suma_y, conteo_y = (fila[c] or 0 for c in ('suma_x', 'conteo_x', 'suma_y', 'conteo_y'))
+        if conteo_x or conteo_y:
+            nuevas.append(PartidoPosicion(
+                partido_id=fila['partido_id'], eleccion_id=fila['pregunta__eleccion_id'],
+                suma_x=suma_x, conteo_x=conteo_x, suma_y=suma_y, conteo_y=conteo_y,
+                posicion_x=_eje(suma_x, conteo_x), posicion_y=_eje(suma_y, conteo_y),
+            ))
+    PartidoPosicion.objects.filter(partido_id__in={fila.partido_id for fila in nuevas}).delete()
+    PartidoPosicion.objects.bulk_create(nuevas, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('quiz', '0009_usuariosesion_recientes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='partidoposicion',
+            name='conteo_x',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='partidoposicion',
+            name='conteo_y',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='partidoposicion',
+            name='eleccion',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='core.eleccion'),
+        ),
+        migrations.AddField(
+            model_name='partidoposicion',
+            name='suma_x',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='partidoposicion',
+            name='suma_y',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(separar_por_eleccion, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='partidoposicion',
+            constraint=models.UniqueConstraint(fields=('partido', 'eleccion'), name='partidoposicion_partido_eleccion_unica'),
+        ),
+    ]
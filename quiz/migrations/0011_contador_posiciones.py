@@ -0,0 +1,25 @@
+# Generated by Django 6.0.1 on 2026-10-18 18:12
+
+from django.db import migrations
+from django.db.models import Max
+
+
+def inicializar_contadores(apps, schema_editor):
+    # El contador empieza después de la mayor posición usada en cada elección
+    Eleccion = apps.get_model('core', 'Eleccion')
+    Pregunta = apps.get_model('quiz', 'Pregunta')
+    ultimas = Pregunta.objects.filter(posicion__isnull=False).values('eleccion_id').annotate(ultima=Max('posicion'))
+    for fila in ultimas:
+        Eleccion.objects.filter(pk=fila['eleccion_id']).update(siguiente_posicion=fila['ultima'] + 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_eleccion_siguiente_posicion'),
+        ('quiz', '0010_partidoposicion_eleccion_totales'),
+    ]
+
+    operations = [
+        migrations.RunPython(inicializar_contadores, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,7 @@
-from django.db import models
-from core.models import Partido, Usuario, Eleccion
-import uuid
+from django.db import models, transaction, IntegrityError
+from django.db.models import F
+from core.models import Partido, Usuario, Eleccion, Region
+from .tokens import generar_token
 
 class Pregunta(models.Model):
     EJES = (('X', 'Económico'), ('Y', 'Social'))
@@ -12,6 +13,37 @@ class Pregunta(models.Model):
     direccion = models.IntegerField() # SQL: tinyint(4) (+1 o -1)
     estado = models.CharField(max_length=20, choices=ESTADOS, default='activa')
     categoria = models.CharField(max_length=50, blank=True, null=True)
+    # Orden fijo de la pregunta en su elección: índice del byte en UsuarioSesion.respuestas_empaquetadas
+    posicion = models.PositiveIntegerField(null=True, blank=True, editable=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['eleccion', 'posicion'], name='pregunta_eleccion_posicion_unica'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        # Para saber en save() si la pregunta se movió a otra elección
+        instancia._eleccion_cargada = instancia.__dict__.get('eleccion_id')
+        return instancia
+
+    def save(self, *args, **kwargs):
+        if self.eleccion_id != getattr(self, '_eleccion_cargada', self.eleccion_id):
+            # Su posición era un byte de la otra elección
+            self.posicion = None
+        if self.posicion is None and self.eleccion_id:
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'posicion'}
+            with transaction.atomic():
+                # Bloquear la elección serializa a quienes numeran preguntas en ella
+                self.posicion = Eleccion.objects.select_for_update().values_list('siguiente_posicion', flat=True).get(pk=self.eleccion_id)
+                # update() y no save(): para las señales no es un cambio de la elección
+                Eleccion.objects.filter(pk=self.eleccion_id).update(siguiente_posicion=F('siguiente_posicion') + 1)
+                super().save(*args, **kwargs)
+        else:
+            super().save(*args, **kwargs)
+        self._eleccion_cargada = self.eleccion_id
 
 class PartidoRespuesta(models.Model):
     partido = models.ForeignKey(Partido, on_delete=models.CASCADE)
@@ -19,33 +51,104 @@ class PartidoRespuesta(models.Model):
     valor = models.IntegerField() # SQL: tinyint(4) (-2 a +2)
     fuente = models.CharField(max_length=500, blank=True, null=True)
 
+    class Meta:
+        # Una postura por partido y pregunta: permite el upsert masivo del importador
+        constraints = [
+            models.UniqueConstraint(fields=['partido', 'pregunta'], name='partidorespuesta_partido_pregunta_unica'),
+        ]
+
 class PartidoPosicion(models.Model):
     partido = models.ForeignKey(Partido, on_delete=models.CASCADE)
+    # Una fila por partido y elección; None en las filas cargadas a mano sin elección
+    eleccion = models.ForeignKey(Eleccion, on_delete=models.CASCADE, null=True, blank=True)
     posicion_x = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
     posicion_y = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    # Suma ponderada (valor * dirección) y número de respuestas a preguntas activas por eje,
+    # mantenidas por las señales de PartidoRespuesta (ver quiz/posiciones.py)
+    suma_x = models.IntegerField(default=0, editable=False)
+    conteo_x = models.IntegerField(default=0, editable=False)
+    suma_y = models.IntegerField(default=0, editable=False)
+    conteo_y = models.IntegerField(default=0, editable=False)
     
     fecha_calculo = models.DateTimeField(auto_now=True)
 
     class Meta:
         # Esto asegura que use el nombre de tabla que tienes en tu SQL
         db_table = 'partidoposicioncache'
+        constraints = [
+            models.UniqueConstraint(fields=['partido', 'eleccion'], name='partidoposicion_partido_eleccion_unica'),
+        ]
 
 class UsuarioSesion(models.Model):
     usuario = models.ForeignKey(Usuario, on_delete=models.SET_NULL, null=True, blank=True)
     fecha = models.DateTimeField(auto_now_add=True)
-    token = models.CharField(max_length=10, unique=True, editable=False) # SQL: token varchar(10)
+    # Los tokens antiguos tienen 10 caracteres hex; los nuevos, 12 en base32 (ver quiz/tokens.py)
+    token = models.CharField(max_length=16, unique=True, editable=False) # SQL: token varchar(16)
     resultado_x = models.DecimalField(max_digits=5, decimal_places=2, null=True)
     resultado_y = models.DecimalField(max_digits=5, decimal_places=2, null=True)
     completado = models.BooleanField(default=False)
     eleccion = models.ForeignKey('core.Eleccion', on_delete=models.SET_NULL, null=True, blank=True)
+    # Región declarada al empezar el quiz, para el mapa de calor por región
+    region = models.ForeignKey(Region, on_delete=models.SET_NULL, null=True, blank=True)
+    # Hay respuestas en el buffer write-behind sin volcar (ver quiz/buffer_respuestas.py)
+    buffer_pendiente = models.BooleanField(default=False, editable=False)
+    # Modo compacto: un byte con signo por pregunta (Pregunta.posicion) en lugar de filas
+    # en UsuarioRespuesta; None = las respuestas viven en UsuarioRespuesta (ver quiz/empaquetado.py)
+    respuestas_empaquetadas = models.BinaryField(null=True, blank=True, editable=False)
+
+    class Meta:
+        # Solo indexa las pocas sesiones con buffer abierto
+        indexes = [
+            models.Index(fields=['buffer_pendiente'], condition=models.Q(buffer_pendiente=True), name='usuariosesion_buffer_idx'),
+            # Listado de administración paginado por (-fecha, -id)
+            models.Index(fields=['-fecha', '-id'], name='usuariosesion_recientes_idx'),
+        ]
+
+    # Reintentos ante una colisión del token generado antes de rendirse
+    INTENTOS_TOKEN = 5
 
     def save(self, *args, **kwargs):
-        if not self.token:
-            self.token = uuid.uuid4().hex[:10].upper()
-        super().save(*args, **kwargs)
+        if self.token:
+            return super().save(*args, **kwargs)
+
+        for intento in range(self.INTENTOS_TOKEN):
+            self.token = generar_token()
+            try:
+                # Savepoint propio para poder reintentar dentro de una transacción externa
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                colision = UsuarioSesion.objects.filter(token=self.token).exists()
+                self.token = ''
+                if not colision or intento == self.INTENTOS_TOKEN - 1:
+                    raise
 
 class UsuarioRespuesta(models.Model):
     sesion = models.ForeignKey(UsuarioSesion, on_delete=models.CASCADE, related_name='respuestas')
     pregunta = models.ForeignKey(Pregunta, on_delete=models.CASCADE)
     valor = models.IntegerField() # SQL: tinyint(4)
-    fecha_respuesta = models.DateTimeField(auto_now_add=True)
\ No newline at end of file
+    fecha_respuesta = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # Una sola respuesta por pregunta y sesión: permite el upsert masivo de /answers
+        constraints = [
+            models.UniqueConstraint(fields=['sesion', 'pregunta'], name='usuariorespuesta_sesion_pregunta_unica'),
+        ]
+
+class SesionArchivada(models.Model):
+    """
+    Sesión completada de una elección pasada, movida fuera de UsuarioSesion por
+    `manage.py archivar_sesiones`. Conserva el id y el token originales y guarda
+    las respuestas empaquetadas (ver quiz/empaquetado.py), sin filas en UsuarioRespuesta.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    token = models.CharField(max_length=16, db_index=True)
+    usuario = models.ForeignKey(Usuario, on_delete=models.SET_NULL, null=True, blank=True)
+    eleccion = models.ForeignKey(Eleccion, on_delete=models.CASCADE)
+    region = models.ForeignKey(Region, on_delete=models.SET_NULL, null=True, blank=True)
+    fecha = models.DateTimeField()
+    resultado_x = models.DecimalField(max_digits=5, decimal_places=2, null=True)
+    resultado_y = models.DecimalField(max_digits=5, decimal_places=2, null=True)
+    completado = models.BooleanField(default=True)
+    respuestas_empaquetadas = models.BinaryField()
+    fecha_archivado = models.DateTimeField(auto_now_add=True)
@@ -0,0 +1,131 @@
+"""
+Posiciones de los partidos mantenidas de forma incremental.
+
+Cada fila de partidoposicioncache guarda, para un partido y una elección, la suma
+ponderada y el número de respuestas a preguntas activas de cada eje; la posición
+es _normalizar_eje(suma, conteo). Las señales de PartidoRespuesta aplican la
+diferencia de cada alta, edición o borrado sobre esa única fila, sin recorrer
+las demás respuestas del partido.
+
+Los caminos que no disparan señales (el upsert masivo del importador) o que
+cambian el aporte de todas las respuestas de una pregunta (eje, dirección o
+estado) llaman a recalcular_posiciones, igual que `manage.py recalcular_posiciones`
+para corregir cualquier deriva.
+"""
+from collections import Counter
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from core.cache import invalidar_version
+from .models import PartidoPosicion, PartidoRespuesta
+from .ranking import VERSION_POSICIONES
+from .utils import _normalizar_eje
+
+CAMPOS_TOTALES = ('suma_x', 'conteo_x', 'suma_y', 'conteo_y')
+
+def aporte(eje, direccion, estado, valor):
+    """
+    Lo que suma una respuesta a los totales de su partido: {'suma_x': ..., 'conteo_x': 1}.
+    Vacío si la pregunta no está activa.
+    """
+    if estado != 'activa' or eje not in ('X', 'Y'):
+        return {}
+    eje = eje.lower()
+    return {f'suma_{eje}': valor * direccion, f'conteo_{eje}': 1}
+
+def aplicar(partido_id, eleccion_id, antes, despues):
+    """
+    Cambia la fila (partido, elección) en despues - antes bajo SELECT ... FOR UPDATE.
+    """
+    deltas = Counter(despues)
+    deltas.subtract(antes)
+    deltas = {campo: delta for campo, delta in deltas.items() if delta}
+    if not deltas or eleccion_id is None:
+        return
+
+    with transaction.atomic():
+        fila = PartidoPosicion.objects.select_for_update().filter(partido_id=partido_id, eleccion_id=eleccion_id).first()
+        if fila is None:
+            # Quitar de una fila que no existe pasa al borrar en cascada un partido o una elección
+            if not any(campo.startswith('conteo') and delta > 0 for campo, delta in deltas.items()):
+                return
+            fila = _crear_fila(partido_id, eleccion_id)
+
+        for campo, delta in deltas.items():
+            setattr(fila, campo, getattr(fila, campo) + delta)
+        if not fila.conteo_x and not fila.conteo_y:
+            # Sin respuestas activas el partido deja de aparecer, como antes de importarlo
+            fila.delete()
+            return
+        fila.posicion_x = _normalizar_eje(fila.suma_x, fila.conteo_x)
+        fila.posicion_y = _normalizar_eje(fila.suma_y, fila.conteo_y)
+        fila.save()
+
+def _crear_fila(partido_id, eleccion_id):
+    try:
+        with transaction.atomic():
+            return PartidoPosicion.objects.create(partido_id=partido_id, eleccion_id=eleccion_id)
+    except IntegrityError:
+        # Otro worker la creó a la vez
+        return PartidoPosicion.objects.select_for_update().get(partido_id=partido_id, eleccion_id=eleccion_id)
+
+def totales_por_partido(eleccion_id=None, partidos=None):
+    """
+    {(partido_id, eleccion_id): {suma_x, conteo_x, suma_y, conteo_y}} con un solo GROUP BY.
+    """
+    respuestas = PartidoRespuesta.objects.filter(pregunta__eleccion__isnull=False)
+    if eleccion_id is not None:
+        respuestas = respuestas.filter(pregunta__eleccion_id=eleccion_id)
+    if partidos is not None:
+        respuestas = respuestas.filter(partido_id__in=partidos)
+
+    activas = Q(pregunta__estado='activa')
+    ponderado = F('valor') * F('pregunta__direccion')
+    filas = respuestas.values('partido_id', 'pregunta__eleccion_id').annotate(
+        suma_x=Sum(ponderado, filter=activas & Q(pregunta__eje='X')),
+        conteo_x=Count('id', filter=activas & Q(pregunta__eje='X')),
+        suma_y=Sum(ponderado, filter=activas & Q(pregunta__eje='Y')),
+        conteo_y=Count('id', filter=activas & Q(pregunta__eje='Y')),
+    )
+    return {
+        (fila['partido_id'], fila['pregunta__eleccion_id']): {campo: fila[campo] or 0 for campo in CAMPOS_TOTALES}
+        for fila in filas
+    }
+
+def recalcular_posiciones(eleccion_id=None, partidos=None):
+    """
+    Recalcula desde PartidoRespuesta las filas de la elección (o todas) y de los
+    partidos indicados (o todos). Devuelve cuántas filas quedaron.
+    """
+    totales = {clave: t for clave, t in totales_por_partido(eleccion_id, partidos).items() if t['conteo_x'] or t['conteo_y']}
+    filas = [
+        PartidoPosicion(
+            partido_id=partido_id, eleccion_id=eleccion, **t,
+            posicion_x=_normalizar_eje(t['suma_x'], t['conteo_x']),
+            posicion_y=_normalizar_eje(t['suma_y'], t['conteo_y']),
+        )
+        for (partido_id, eleccion), t in totales.items()
+    ]
+
+    existentes = PartidoPosicion.objects.filter(eleccion__isnull=False)
+    if eleccion_id is not None:
+        existentes = existentes.filter(eleccion_id=eleccion_id)
+    if partidos is not None:
+        existentes = existentes.filter(partido_id__in=partidos)
+
+    with transaction.atomic():
+        # Filas de partidos que ya no tienen respuestas activas en la elección
+        sobrantes = [
+            fila_id for fila_id, partido_id, eleccion in existentes.values_list('id', 'partido_id', 'eleccion_id')
+            if (partido_id, eleccion) not in totales
+        ]
+        PartidoPosicion.objects.filter(id__in=sobrantes).delete()
+        PartidoPosicion.objects.bulk_create(
+            filas,
+            update_conflicts=True,
+            unique_fields=['partido', 'eleccion'],
+            update_fields=[*CAMPOS_TOTALES, 'posicion_x', 'posicion_y', 'fecha_calculo'],
+            batch_size=500,
+        )
+        # bulk_create no dispara señales
+        invalidar_version(VERSION_POSICIONES)
+    return len(filas)
@@ -0,0 +1,260 @@
+import math
+import threading
+import numpy as np
+from django.core.cache import cache
+from django.db.models import Count, Q
+from core.cache import CacheLRU, obtener_version
+from core.replicas import en_primaria
+
+# Nombre del grupo de versión que invalida todo lo derivado de partidoposicioncache
+VERSION_POSICIONES = 'posiciones'
+
+# La distancia máxima posible en un plano de -100 a 100 es
+# la diagonal de (-100, -100) a (100, 100)
+# dist = sqrt((100 - (-100))^2 + (100 - (-100))^2) = sqrt(200^2 + 200^2)
+DISTANCIA_MAXIMA = math.sqrt(80000)
+
+# Por encima de este tamaño no se construye la tabla y se usa siempre el índice
+MAXIMO_MEMORIA_TABLA = 32 * 1024 * 1024
+
+# Rankings ya calculados por sesión: en memoria del worker y en la cache compartida
+TAMANO_LRU_RANKINGS = 4096
+TIMEOUT_RANKING = 60 * 60 * 24
+
+def posiciones_de_eleccion(queryset, eleccion):
+    """
+    Filas de partidoposicioncache de la elección, más las cargadas a mano sin elección
+    de los partidos que no tienen una fila propia en ella.
+    """
+    if eleccion is None:
+        return queryset.filter(eleccion__isnull=True)
+    con_fila = queryset.model.objects.filter(eleccion=eleccion).values('partido_id')
+    return queryset.filter(Q(eleccion=eleccion) | Q(eleccion__isnull=True) & ~Q(partido_id__in=con_fila))
+
+class IndicePosiciones:
+    """
+    Copia en memoria de partidoposicioncache: coordenadas en arrays de NumPy
+    y los campos que muestra Resultado.jsx en listas paralelas.
+    """
+    def __init__(self, version, ids, nombres, siglas, xs, ys):
+        self.version = version
+        self.ids = ids
+        self.nombres = nombres
+        self.siglas = siglas
+        self.xs = np.array(xs, dtype=np.float64)
+        self.ys = np.array(ys, dtype=np.float64)
+        # Floats de Python ya convertidos para no hacerlo en cada respuesta
+        self.coordenadas = list(zip(xs, ys))
+
+    @classmethod
+    def construir(cls, version, eleccion_id=None):
+        from .catalogo import resolver_eleccion
+        from .models import PartidoPosicion
+
+        # Sin elección, la actual: la de los usuarios que hacen el quiz
+        eleccion = eleccion_id if eleccion_id is not None else resolver_eleccion()
+        filas = posiciones_de_eleccion(PartidoPosicion.objects.all(), eleccion).order_by('id').values_list(
+            'partido_id', 'partido__nombre', 'partido__sigla', 'posicion_x', 'posicion_y'
+        )
+        ids, nombres, siglas, xs, ys = [], [], [], [], []
+        for partido_id, nombre, sigla, px, py in filas:
+            ids.append(partido_id)
+            nombres.append(nombre)
+            siglas.append(sigla)
+            xs.append(float(px or 0))
+            ys.append(float(py or 0))
+        return cls(version, ids, nombres, siglas, xs, ys)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def afinidades(self, usuario_x, usuario_y):
+        """
+        Afinidad (0 a 100) del usuario con cada partido, en el orden del índice.
+        """
+        # Distancia euclidiana clásica, invertida para obtener afinidad
+        distancias = np.sqrt((self.xs - float(usuario_x))**2 + (self.ys - float(usuario_y))**2)
+        # astype trunca hacia cero igual que int()
+        return ((1 - (distancias / DISTANCIA_MAXIMA)) * 100).astype(np.int64)
+
+    def ranking(self, usuario_x, usuario_y):
+        afinidades = self.afinidades(usuario_x, usuario_y)
+        # Orden estable: a igual afinidad se respeta el orden original
+        orden = np.argsort(-afinidades, kind='stable')
+        return [self.entrada(i, int(afinidades[i])) for i in orden.tolist()]
+
+    def entrada(self, i, afinidad):
+        px, py = self.coordenadas[i]
+        return {
+            'id': self.ids[i],
+            'nombre': self.nombres[i],
+            'sigla': self.siglas[i],
+            # Partido no tiene este atributo (vive en PartidoMetadata), por lo que
+            # el contrato con el frontend siempre ha sido el valor por defecto
+            'candidato_presidencial': 'Candidato por definir',
+            'match_percentage': afinidad,
+            'posicion': {'x': px, 'y': py}
+        }
+
+class TablaRankings:
+    """
+    Ranking precalculado para cada coordenada alcanzable por un usuario.
+    Cada eje vale total / (2 * respondidas) * 100, así que con n preguntas activas
+    solo existen unos pocos cientos de valores distintos (redondeados a 2 decimales
+    como la columna decimal(5,2)). Guarda el orden de los partidos y su afinidad
+    por punto, y responder es buscar dos índices en un dict.
+    """
+    def __init__(self, version, indice, valores_x, valores_y):
+        self.version = version
+        self.indice = indice
+        self.posicion_x = {valor: i for i, valor in enumerate(valores_x)}
+        self.posicion_y = {valor: i for i, valor in enumerate(valores_y)}
+
+        partidos = len(indice)
+        self.ordenes = np.empty((len(valores_x), len(valores_y), partidos), dtype=np.int16)
+        self.afinidades = np.empty((len(valores_x), len(valores_y), partidos), dtype=np.uint8)
+        ys = np.array(valores_y, dtype=np.float64)[:, None]
+        # Fila a fila (una x, todas las y) para no materializar todas las distancias a la vez
+        for i, x in enumerate(valores_x):
+            distancias = np.sqrt((indice.xs - x)**2 + (indice.ys - ys)**2)
+            afinidades = ((1 - (distancias / DISTANCIA_MAXIMA)) * 100).astype(np.int64)
+            ordenes = np.argsort(-afinidades, axis=1, kind='stable')
+            self.ordenes[i] = ordenes
+            self.afinidades[i] = np.take_along_axis(afinidades, ordenes, axis=1)
+
+    @classmethod
+    def construir(cls, version, indice, preguntas_x, preguntas_y):
+        """
+        Si la tabla superaría MAXIMO_MEMORIA_TABLA se construye vacía y todo cae al índice.
+        """
+        valores_x = valores_alcanzables(preguntas_x)
+        valores_y = valores_alcanzables(preguntas_y)
+        # 2 bytes de orden + 1 de afinidad por partido y punto
+        if len(valores_x) * len(valores_y) * len(indice) * 3 > MAXIMO_MEMORIA_TABLA:
+            valores_x = valores_y = []
+        return cls(version, indice, valores_x, valores_y)
+
+    @property
+    def puntos(self):
+        return len(self.posicion_x) * len(self.posicion_y)
+
+    @property
+    def memoria(self):
+        # Bytes de los arrays; los dicts de coordenadas son despreciables a su lado
+        return self.ordenes.nbytes + self.afinidades.nbytes
+
+    def ranking(self, usuario_x, usuario_y):
+        """
+        Devuelve None si la coordenada no está en la tabla (por ejemplo, de otra elección).
+        """
+        i = self.posicion_x.get(round(float(usuario_x), 2))
+        j = self.posicion_y.get(round(float(usuario_y), 2))
+        if i is None or j is None:
+            return None
+        afinidades = self.afinidades[i, j].tolist()
+        return [self.indice.entrada(p, afinidad) for p, afinidad in zip(self.ordenes[i, j].tolist(), afinidades)]
+
+def valores_alcanzables(preguntas):
+    """
+    Valores posibles de un eje con hasta `preguntas` respuestas entre -2 y 2.
+    """
+    from .utils import _normalizar_eje
+
+    valores = {0.0}
+    for respondidas in range(1, preguntas + 1):
+        for total in range(-2 * respondidas, 2 * respondidas + 1):
+            valores.add(round(_normalizar_eje(total, respondidas), 2))
+    return sorted(valores)
+
+# Índices y tablas por elección: la actual y las de sesiones antiguas que aún se consultan
+_indices = CacheLRU(8)
+_tablas = CacheLRU(8)
+_lock = threading.Lock()
+
+def obtener_indice_posiciones(eleccion_id=None):
+    """
+    Devuelve el índice del worker para la elección (por defecto la actual),
+    reconstruyéndolo solo si alguien incrementó la versión de 'posiciones'
+    desde la última vez.
+    """
+    clave = (obtener_version(VERSION_POSICIONES), eleccion_id)
+    indice = _indices.get(clave)
+    if indice is not None:
+        return indice
+
+    with _lock:
+        indice = _indices.get(clave)
+        if indice is None:
+            with en_primaria():
+                indice = IndicePosiciones.construir(clave[0], eleccion_id)
+            _indices.set(clave, indice)
+        return indice
+
+def _preguntas_por_eje(eleccion_id=None):
+    from .catalogo import resolver_eleccion
+    from .models import Pregunta
+
+    eleccion = eleccion_id if eleccion_id is not None else resolver_eleccion()
+    conteos = dict(
+        Pregunta.objects.filter(eleccion=eleccion, estado='activa')
+        .values_list('eje').annotate(total=Count('id'))
+    ) if eleccion else {}
+    return conteos.get('X', 0), conteos.get('Y', 0)
+
+def obtener_tabla_rankings(eleccion_id=None):
+    """
+    Tabla de rankings del worker para la elección (por defecto la actual).
+    Se reconstruye cuando cambian las posiciones de los partidos o las preguntas.
+    """
+    from .catalogo import VERSION_PREGUNTAS
+
+    indice = obtener_indice_posiciones(eleccion_id)
+    clave = (indice.version, obtener_version(VERSION_PREGUNTAS), eleccion_id)
+    tabla = _tablas.get(clave)
+    if tabla is not None:
+        return tabla
+
+    with _lock:
+        tabla = _tablas.get(clave)
+        if tabla is None:
+            with en_primaria():
+                preguntas_x, preguntas_y = _preguntas_por_eje(eleccion_id)
+            tabla = TablaRankings.construir(clave[:2], indice, preguntas_x, preguntas_y)
+            _tablas.set(clave, tabla)
+        return tabla
+
+def ranking_por_coordenadas(usuario_x, usuario_y, eleccion_id=None):
+    """
+    Busca el ranking en la tabla precalculada y, si la coordenada no está, lo calcula con el índice.
+    """
+    ranking = obtener_tabla_rankings(eleccion_id).ranking(usuario_x, usuario_y)
+    if ranking is None:
+        ranking = obtener_indice_posiciones(eleccion_id).ranking(usuario_x, usuario_y)
+    return ranking
+
+_rankings = CacheLRU(TAMANO_LRU_RANKINGS)
+
+def obtener_ranking_sesion(sesion):
+    """
+    Ranking de una sesión finalizada contra los partidos de su elección, memorizado
+    por token y versión de 'posiciones'. Primero busca en el LRU del worker, después en la cache compartida y
+    solo si falla en ambas lo calcula con el índice.
+    """
+    version = obtener_version(VERSION_POSICIONES)
+    # Redondeamos como la columna decimal(5,2): así /finalizar (floats recién calculados)
+    # y /matches (valores leídos de la base) comparten la misma entrada
+    x = round(float(sesion.resultado_x), 2)
+    y = round(float(sesion.resultado_y), 2)
+    # Las coordenadas van en la clave por si la sesión se vuelve a finalizar
+    clave = f'ranking:{version}:{sesion.eleccion_id}:{sesion.token}:{x:.2f}:{y:.2f}'
+
+    ranking = _rankings.get(clave)
+    if ranking is not None:
+        return ranking
+
+    ranking = cache.get(clave)
+    if ranking is None:
+        ranking = ranking_por_coordenadas(x, y, sesion.eleccion_id)
+        cache.set(clave, ranking, timeout=TIMEOUT_RANKING)
+    _rankings.set(clave, ranking)
+    return ranking
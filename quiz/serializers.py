@@ -1,6 +1,6 @@
 from rest_framework import serializers
 from .models import Pregunta, PartidoRespuesta, UsuarioSesion, UsuarioRespuesta, PartidoPosicion
-from core.serializers import EleccionSerializer
+from core.serializers import EleccionSerializer, ProyeccionMixin
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
 class PreguntaSerializer(serializers.ModelSerializer):
@@ -20,14 +20,15 @@ class UsuarioRespuestaSerializer(serializers.ModelSerializer):
         model = UsuarioRespuesta
         fields = ['pregunta', 'valor'] # No incluimos sesion aquí porque se suele enviar en el contexto
 
-class UsuarioSesionSerializer(serializers.ModelSerializer):
+class UsuarioSesionSerializer(ProyeccionMixin, serializers.ModelSerializer):
     usuario_id = serializers.PrimaryKeyRelatedField(
         source='usuario', 
         read_only=True, 
         allow_null=True
     )
     
-    respuestas = UsuarioRespuestaSerializer(many=True, read_only=True)
+    # Misma salida [{pregunta, valor}] tanto si la sesión usa UsuarioRespuesta como si está empaquetada
+    respuestas = serializers.SerializerMethodField()
 
     class Meta:
         model = UsuarioSesion
@@ -44,6 +45,14 @@ class UsuarioSesionSerializer(serializers.ModelSerializer):
         # 'eleccion' debe estar aquí para que el POST de React no falle al no enviarlo
         read_only_fields = ['token', 'resultado_x', 'resultado_y', 'fecha', 'respuestas', 'eleccion_id']
 
+    def get_respuestas(self, sesion):
+        from .empaquetado import esta_empaquetada, leer_respuestas
+
+        if esta_empaquetada(sesion):
+            return [{'pregunta': pregunta_id, 'valor': valor} for pregunta_id, valor in leer_respuestas(sesion).items()]
+        # En el listado viene de prefetch_related, sin consulta por sesión
+        return UsuarioRespuestaSerializer(sesion.respuestas.all(), many=True).data
+
 class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
     @classmethod
     def get_token(cls, user):
@@ -69,7 +78,7 @@ class PartidoPosicionSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = PartidoPosicion
-        fields = ['id', 'partido', 'nombre_partido', 'sigla_partido', 'posicion_x', 'posicion_y', 'fecha_calculo']
+        fields = ['id', 'partido', 'eleccion', 'nombre_partido', 'sigla_partido', 'posicion_x', 'posicion_y', 'fecha_calculo']
 
 class PartidoPosicionSerializer(serializers.ModelSerializer):
     # Traemos datos del partido para que el frontend sepa de quién es cada punto
@@ -83,6 +92,7 @@ class PartidoPosicionSerializer(serializers.ModelSerializer):
             'partido', 
             'nombre_partido', 
             'sigla_partido', 
+            'eleccion',
             'posicion_x', 
             'posicion_y', 
             'fecha_calculo'
@@ -0,0 +1,89 @@
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+from core.cache import invalidar_version
+from core.models import Partido, Eleccion
+from .catalogo import VERSION_PREGUNTAS
+from .comparacion import VERSION_COMPARACION
+from .models import Pregunta, PartidoRespuesta, PartidoPosicion
+from .ranking import VERSION_POSICIONES
+from . import posiciones
+
+# Campos de Pregunta que deciden cuánto aporta cada respuesta a la posición de un partido
+CAMPOS_APORTE = ('eleccion_id', 'eje', 'direccion', 'estado')
+
+@receiver([post_save, post_delete], sender=PartidoPosicion)
+@receiver([post_save, post_delete], sender=Partido)
+@receiver([post_save, post_delete], sender=Eleccion)
+def invalidar_posiciones(sender, **kwargs):
+    # Cualquier escritura en partidoposicioncache (o en el nombre/sigla de un partido,
+    # o un cambio de elección actual) obliga a reconstruir el índice de ranking de cada worker
+    invalidar_version(VERSION_POSICIONES)
+
+@receiver(post_init, sender=PartidoRespuesta)
+def recordar_respuesta_partido(sender, instance, **kwargs):
+    # Estado cargado para aplicar solo la diferencia en post_save (None si viene diferido)
+    campos = ('partido_id', 'pregunta_id', 'valor')
+    instance._respuesta_inicial = tuple(instance.__dict__.get(campo) for campo in campos) if instance.pk else None
+
+def _aporte_respuesta(pregunta_id, valor):
+    """
+    (eleccion_id, aporte) de una respuesta a la pregunta indicada.
+    """
+    pregunta = Pregunta.objects.filter(id=pregunta_id).values_list(*CAMPOS_APORTE).first()
+    if pregunta is None:
+        return None, {}
+    eleccion_id, eje, direccion, estado = pregunta
+    return eleccion_id, posiciones.aporte(eje, direccion, estado, valor)
+
+@receiver(post_save, sender=PartidoRespuesta)
+def actualizar_posicion_partido(sender, instance, created, **kwargs):
+    antes = None if created else instance._respuesta_inicial
+    instance._respuesta_inicial = (instance.partido_id, instance.pregunta_id, instance.valor)
+    eleccion_despues, despues = _aporte_respuesta(instance.pregunta_id, instance.valor)
+
+    if antes is not None and None in antes:
+        # No sabemos qué contaba antes: recalculamos solo este partido
+        posiciones.recalcular_posiciones(eleccion_despues, [instance.partido_id])
+        return
+
+    if antes is None:
+        posiciones.aplicar(instance.partido_id, eleccion_despues, {}, despues)
+        return
+
+    partido_antes, pregunta_antes, valor_antes = antes
+    eleccion_antes, aporte_antes = _aporte_respuesta(pregunta_antes, valor_antes)
+    if (partido_antes, eleccion_antes) == (instance.partido_id, eleccion_despues):
+        posiciones.aplicar(instance.partido_id, eleccion_despues, aporte_antes, despues)
+    else:
+        posiciones.aplicar(partido_antes, eleccion_antes, aporte_antes, {})
+        posiciones.aplicar(instance.partido_id, eleccion_despues, {}, despues)
+
+@receiver(post_delete, sender=PartidoRespuesta)
+def descontar_posicion_partido(sender, instance, **kwargs):
+    eleccion_id, aporte = _aporte_respuesta(instance.pregunta_id, instance.valor)
+    posiciones.aplicar(instance.partido_id, eleccion_id, aporte, {})
+
+@receiver(post_init, sender=Pregunta)
+def recordar_pregunta(sender, instance, **kwargs):
+    instance._aporte_inicial = tuple(instance.__dict__.get(campo) for campo in CAMPOS_APORTE)
+
+@receiver(post_save, sender=Pregunta)
+def recalcular_por_pregunta(sender, instance, created, **kwargs):
+    # Cambiar eje, dirección o estado cambia el aporte de todas sus respuestas
+    actual = tuple(getattr(instance, campo) for campo in CAMPOS_APORTE)
+    antes, instance._aporte_inicial = instance._aporte_inicial, actual
+    if created or antes == actual:
+        return
+    for eleccion_id in {antes[0], actual[0]} - {None}:
+        posiciones.recalcular_posiciones(eleccion_id)
+
+@receiver([post_save, post_delete], sender=PartidoRespuesta)
+@receiver([post_save, post_delete], sender=Pregunta)
+@receiver([post_save, post_delete], sender=Partido)
+def invalidar_comparacion(sender, **kwargs):
+    invalidar_version(VERSION_COMPARACION)
+
+@receiver([post_save, post_delete], sender=Pregunta)
+@receiver([post_save, post_delete], sender=Eleccion)
+def invalidar_preguntas(sender, **kwargs):
+    invalidar_version(VERSION_PREGUNTAS)
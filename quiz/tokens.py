@@ -0,0 +1,28 @@
+import secrets
+import time
+
+# Base32 de Crockford: sin I, L, O ni U para evitar confusiones al dictarlo
+ALFABETO = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+
+# 7 caracteres de segundos (32^7 s ≈ 1000 años) + 5 aleatorios (~33 millones por segundo)
+CARACTERES_TIEMPO = 7
+CARACTERES_ALEATORIOS = 5
+LONGITUD_TOKEN = CARACTERES_TIEMPO + CARACTERES_ALEATORIOS
+
+def _codificar(numero, longitud):
+    caracteres = []
+    for _ in range(longitud):
+        numero, resto = divmod(numero, 32)
+        caracteres.append(ALFABETO[resto])
+    return ''.join(reversed(caracteres))
+
+def generar_token(instante=None):
+    """
+    Token de sesión de 12 caracteres con prefijo de tiempo.
+    Los tokens nuevos son siempre mayores que los anteriores, así los INSERT
+    caen al final del índice único en vez de repartirse por todo el B-tree.
+    Tiene otra longitud que los tokens hex de 10 caracteres, así que nunca chocan con ellos.
+    """
+    segundos = int(time.time() if instante is None else instante)
+    aleatorio = secrets.randbits(5 * CARACTERES_ALEATORIOS)
+    return _codificar(segundos, CARACTERES_TIEMPO) + _codificar(aleatorio, CARACTERES_ALEATORIOS)
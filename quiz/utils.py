@@ -1,63 +1,132 @@
-import math
+from django.db.models import Count, F, Q, Sum
+
+def _normalizar_eje(total, count):
+    """
+    Convierte la suma ponderada de un eje en una coordenada entre -100 y 100.
+    """
+    if count == 0:
+        return 0.0
+
+    # El valor máximo posible es count * 2 (si todas son "Muy a favor" = 2)
+    resultado = (total / (count * 2)) * 100
+    return max(-100, min(100, float(resultado)))
 
 def calcular_posicion(queryset_respuestas):
     """
     Calcula las coordenadas X e Y basándose en las respuestas proporcionadas.
     Normaliza el resultado entre -100 y 100.
+
+    Sirve tanto para UsuarioRespuesta como para PartidoRespuesta: ambos ejes
+    (sumas y conteos) se resuelven en un único aggregate dentro de la base de datos.
+    """
+    return _posicion_desde_totales(queryset_respuestas.aggregate(**_agregados_posicion()))
+
+async def acalcular_posicion(queryset_respuestas):
+    """
+    Igual que calcular_posicion, con el ORM asíncrono (vistas ASGI).
+    """
+    return _posicion_desde_totales(await queryset_respuestas.aaggregate(**_agregados_posicion()))
+
+def _agregados_posicion():
+    activas = Q(pregunta__estado='activa')
+    eje_x = activas & Q(pregunta__eje='X')
+    eje_y = activas & Q(pregunta__eje='Y')
+
+    # Multiplicamos el valor de la respuesta por la dirección de la pregunta
+    ponderado = F('valor') * F('pregunta__direccion')
+
+    return {
+        'total_x': Sum(ponderado, filter=eje_x),
+        'count_x': Count('id', filter=eje_x),
+        'total_y': Sum(ponderado, filter=eje_y),
+        'count_y': Count('id', filter=eje_y),
+    }
+
+def _posicion_desde_totales(totales):
+    return (
+        _normalizar_eje(totales['total_x'] or 0, totales['count_x']),
+        _normalizar_eje(totales['total_y'] or 0, totales['count_y']),
+    )
+
+def calcular_posicion_desde_tuplas(respuestas):
+    """
+    Versión en memoria de calcular_posicion para cuando las respuestas ya están cargadas.
+    Recibe tuplas (eje, direccion, valor) de preguntas activas y no toca la base de datos.
+    """
+    total = {'X': 0, 'Y': 0}
+    count = {'X': 0, 'Y': 0}
+
+    for eje, direccion, valor in respuestas:
+        if eje not in total:
+            continue
+        total[eje] += valor * direccion
+        count[eje] += 1
+
+    return _normalizar_eje(total['X'], count['X']), _normalizar_eje(total['Y'], count['Y'])
+
+def validar_respuestas(respuestas_data, eleccion_id=None):
+    """
+    Valida todo el lote de respuestas de /answers antes de escribir nada.
+    Devuelve ({pregunta_id: valor}, rechazadas), con una sola consulta a Pregunta.
+    """
+    from .models import Pregunta
+
+    validas, rechazadas = revisar_formato_respuestas(respuestas_data)
+
+    # 2. Todas las preguntas deben existir en la elección de la sesión
+    preguntas = Pregunta.objects.filter(id__in=validas.keys())
+    if eleccion_id:
+        preguntas = preguntas.filter(eleccion_id=eleccion_id)
+    existentes = set(preguntas.values_list('id', flat=True))
+
+    return descartar_respuestas_ajenas(validas, rechazadas, existentes)
+
+def revisar_formato_respuestas(respuestas_data):
+    """
+    Primera parte de validar_respuestas, sin base de datos: forma y rango de cada item.
+    Devuelve ({pregunta_id: (indice, valor)}, rechazadas).
+    """
+    validas = {}
+    rechazadas = []
+
+    # 1. Forma y rango de cada item (si una pregunta se repite, gana la última)
+    for indice, item in enumerate(respuestas_data):
+        try:
+            pregunta_id = int(item['pregunta_id'])
+            valor = int(item['valor'])
+        except (KeyError, TypeError, ValueError):
+            rechazadas.append({"indice": indice, "error": "Se requieren 'pregunta_id' y 'valor' numéricos"})
+            continue
+
+        if not -2 <= valor <= 2:
+            rechazadas.append({"indice": indice, "pregunta_id": pregunta_id, "error": "El valor debe estar entre -2 y 2"})
+            continue
+
+        validas.pop(pregunta_id, None)
+        validas[pregunta_id] = (indice, valor)
+
+    return validas, rechazadas
+
+def descartar_respuestas_ajenas(validas, rechazadas, existentes):
     """
-    respuestas_activas = queryset_respuestas.filter(pregunta__estado='activa').select_related('pregunta')
-    
-    def procesar_eje(nombre_eje):
-        eje_data = respuestas_activas.filter(pregunta__eje=nombre_eje)
-        
-        # Multiplicamos el valor de la respuesta por la dirección de la pregunta
-        total = sum(r.valor * r.pregunta.direccion for r in eje_data)
-        
-        count = eje_data.count()
-        
-        if count == 0:
-            return 0.0
-            
-        # El valor máximo posible es count * 2 (si todas son "Muy a favor" = 2)
-        resultado = (total / (count * 2)) * 100
-        return max(-100, min(100, float(resultado)))
-
-    return procesar_eje('X'), procesar_eje('Y')
+    Segunda parte de validar_respuestas: rechaza las preguntas que no están en `existentes`.
+    """
+    for pregunta_id, (indice, valor) in list(validas.items()):
+        if pregunta_id not in existentes:
+            rechazadas.append({"indice": indice, "pregunta_id": pregunta_id, "error": "La pregunta no pertenece a la elección de la sesión"})
+            del validas[pregunta_id]
+
+    rechazadas.sort(key=lambda r: r['indice'])
+    return {pregunta_id: valor for pregunta_id, (indice, valor) in validas.items()}, rechazadas
 
 def obtener_ranking_partidos(usuario_x, usuario_y):
     """
     Compara las coordenadas del usuario con las posiciones de los partidos
     y devuelve el formato exacto que espera Resultado.jsx
+
+    Usa la tabla precalculada del worker (o su índice si la coordenada no está),
+    así que no consulta la base de datos mientras nadie haya recalculado partidoposicioncache.
     """
-    from .models import PartidoPosicion
-    
-    posiciones = PartidoPosicion.objects.select_related('partido').all()
-    ranking = []
-    
-    # La distancia máxima posible en un plano de -100 a 100 es 
-    # la diagonal de (-100, -100) a (100, 100)
-    # dist = sqrt((100 - (-100))^2 + (100 - (-100))^2) = sqrt(200^2 + 200^2)
-    distancia_maxima = math.sqrt(80000)
-
-    for pos in posiciones:
-        px, py = float(pos.posicion_x or 0), float(pos.posicion_y or 0)
-        ux, uy = float(usuario_x), float(usuario_y)
-
-        # Distancia euclidiana clásica
-        distancia = math.sqrt((px - ux)**2 + (py - uy)**2)
-        
-        # Invertimos la distancia para obtener afinidad (0 a 100)
-        afinidad = (1 - (distancia / distancia_maxima)) * 100
-        
-        ranking.append({
-            'id': pos.partido.id,
-            'nombre': pos.partido.nombre,
-            'sigla': pos.partido.sigla,
-            'candidato_presidencial': getattr(pos.partido, 'candidato_presidencial', 'Candidato por definir'),
-            'match_percentage': int(afinidad),
-            'posicion': {'x': px, 'y': py}
-        })
-    
-    ranking.sort(key=lambda x: x['match_percentage'], reverse=True)
-    
-    return ranking
\ No newline at end of file
+    from .ranking import ranking_por_coordenadas
+
+    return ranking_por_coordenadas(usuario_x, usuario_y)
@@ -1,46 +1,125 @@
-from django.db import transaction
+import math
+from django.conf import settings
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_cache_control
 from rest_framework import viewsets, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticatedOrReadOnly
 from rest_framework.views import APIView
-from .models import Pregunta, UsuarioSesion, UsuarioRespuesta, PartidoRespuesta, PartidoPosicion
+from .models import Pregunta, UsuarioSesion, UsuarioRespuesta, PartidoRespuesta, PartidoPosicion, SesionArchivada
 from .serializers import (
     PreguntaSerializer, UsuarioSesionSerializer, UsuarioRespuestaSerializer,
     MyTokenObtainPairSerializer, PartidoRespuestaSerializer, PartidoPosicionSerializer
 )
-from .utils import calcular_posicion, obtener_ranking_partidos
+from .catalogo import obtener_bundle_preguntas, resolver_eleccion
+from .comparacion import MAXIMO_PARTIDOS, obtener_tabla_comparacion
+from .espacial import obtener_indice_partidos, obtener_indice_sesiones
+from .ranking import DISTANCIA_MAXIMA, obtener_ranking_sesion, posiciones_de_eleccion
+from .empaquetado import (
+    calcular_posicion_empaquetada, empaquetadas_por_defecto, escribir_respuestas, esta_empaquetada,
+    obtener_mapa_preguntas, tiene_respuestas
+)
+from .acuerdo import acuerdo_por_partido
+from .buffer_respuestas import bufferizar, respuestas_combinadas, valores_combinados, volcar_buffer, write_behind_activo
+from .utils import calcular_posicion, calcular_posicion_desde_tuplas, validar_respuestas
+from core.contadores import leer_contadores, QUIZZES_COMPLETADOS, TOTAL_USUARIOS, TOTAL_PARTIDOS
 from core.models import Usuario, Partido
+from core.pagination import CursorPaginacion, CursorPaginacionOpcional, CursorPaginacionRecientes
+from core.serializers import campos_pedidos
+from core.replicas import LecturaReplicaMixin
 from rest_framework_simplejwt.views import TokenObtainPairView
 
-class PreguntaViewSet(viewsets.ModelViewSet):
+class PreguntaViewSet(LecturaReplicaMixin, viewsets.ModelViewSet):
     serializer_class = PreguntaSerializer
     permission_classes = [AllowAny]
+    # Lista plana por defecto; el admin pagina con ?page_size= y ?cursor=
+    pagination_class = CursorPaginacionOpcional
     
     def get_queryset(self):
-        queryset = Pregunta.objects.all()
+        # select_related evita una consulta de elección por pregunta (eleccion_info)
+        queryset = Pregunta.objects.select_related('eleccion')
         anio = self.request.query_params.get('anio')
         if anio:
             queryset = queryset.filter(eleccion__anio=anio)
         return queryset
 
+    @action(detail=False, methods=['get'], url_path='bundle')
+    def bundle(self, request):
+        """
+        Preguntas activas de una elección (?anio=, por defecto la actual) listas para el quiz.
+        Se sirven pre-serializadas desde la cache con ETag fuerte y Cache-Control largo.
+        """
+        eleccion = resolver_eleccion(request.query_params.get('anio'))
+        if not eleccion:
+            return Response({"error": "No se encontró la elección"}, status=404)
+
+        contenido, huella = obtener_bundle_preguntas(eleccion)
+        etag = f'"{huella}"'
+
+        response = get_conditional_response(request._request, etag=etag)
+        if response is None:
+            response = HttpResponse(contenido, content_type='application/json')
+        response['ETag'] = etag
+        patch_cache_control(response, public=True, max_age=settings.PREGUNTAS_BUNDLE_MAX_AGE)
+        return response
+
+# Máximo de resultados en las consultas espaciales
+MAXIMO_CERCANOS = 100
+
+# Los ejes del mapa político van de -100 a 100
+LIMITE_EJE = 100
+
+def coordenada(valor):
+    """
+    Lee una coordenada del mapa; lanza ValueError si no es un número dentro de los ejes.
+    float() acepta 'nan' e 'inf', que romperían las distancias del índice.
+    """
+    numero = float(valor)
+    if not math.isfinite(numero) or abs(numero) > LIMITE_EJE:
+        raise ValueError
+    return numero
+
+def parametros_espaciales(params, k_defecto=10):
+    """
+    Lee ?k= y ?radio= de una consulta espacial; lanza ValueError si no son válidos.
+    """
+    k = int(params.get('k', k_defecto))
+    radio = float(params['radio']) if params.get('radio') else None
+    if not 1 <= k <= MAXIMO_CERCANOS or (radio is not None and not 0 < radio < math.inf):
+        raise ValueError
+    return k, radio
+
 class UsuarioSesionViewSet(viewsets.ModelViewSet):
     queryset = UsuarioSesion.objects.all()
     serializer_class = UsuarioSesionSerializer
     lookup_field = 'token' 
+    pagination_class = CursorPaginacionRecientes
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            campos = campos_pedidos(self.request)
+            if campos is None or 'respuestas' in campos:
+                # Una sola consulta de respuestas por página
+                queryset = queryset.prefetch_related('respuestas')
+        return queryset
 
     def get_permissions(self):
     # Permitimos create, answers, finalizar, matches y retrieve (ver una sesión)
-        if self.action in ['create', 'answers', 'finalizar_test', 'matches', 'retrieve']:
+        if self.action in ['create', 'answers', 'finalizar_test', 'matches', 'vecinos', 'retrieve']:
             return [AllowAny()]
         return [IsAdminUser()]
     
     def perform_create(self, serializer):
-        from core.models import Eleccion, Usuario
+        from core.models import Eleccion, Usuario, Region
         
-        # 1. Obtener usuario si viene en el JSON
+        # 1. Obtener usuario (y región opcional para el mapa de calor) si vienen en el JSON
         usuario_id = self.request.data.get('usuario_id')
         usuario = Usuario.objects.filter(id=usuario_id).first() if usuario_id else None
+        region_id = self.request.data.get('region_id')
+        region = Region.objects.filter(id=region_id).first() if str(region_id or '').isdigit() else None
 
         # 2. Buscar elección actual con respaldo (Fallback)
         # Primero busca la marcada como actual, si no hay, toma la del año más reciente
@@ -57,7 +136,9 @@ class UsuarioSesionViewSet(viewsets.ModelViewSet):
             )
         
         # 4. Guardar con los objetos reales
-        serializer.save(usuario=usuario, eleccion=eleccion_activa)
+        # En modo compacto la sesión nace con el vector vacío en lugar de usar UsuarioRespuesta
+        empaquetadas = b'' if empaquetadas_por_defecto() else None
+        serializer.save(usuario=usuario, eleccion=eleccion_activa, region=region, respuestas_empaquetadas=empaquetadas)
 
     @action(detail=False, methods=['post'], url_path='answers')
     def answers(self, request):
@@ -73,17 +154,25 @@ class UsuarioSesionViewSet(viewsets.ModelViewSet):
         if not sesion:
             return Response({"error": "Sesión no encontrada"}, status=404)
 
-        try:
-            with transaction.atomic():
-                for item in respuestas_data:
-                    UsuarioRespuesta.objects.update_or_create(
-                        sesion=sesion,
-                        pregunta_id=item['pregunta_id'],
-                        defaults={'valor': item['valor']}
-                    )
-            return Response({"status": "respuestas_guardadas"}, status=200)
-        except Exception as e:
-            return Response({"error": str(e)}, status=400)
+        if not isinstance(respuestas_data, list):
+            return Response({"error": "'answers' debe ser una lista"}, status=400)
+
+        # Validamos el lote completo antes de escribir
+        validas, rechazadas = validar_respuestas(respuestas_data, sesion.eleccion_id)
+        if rechazadas and not validas:
+            return Response({"error": "Ninguna respuesta es válida", "rechazadas": rechazadas}, status=400)
+
+        if write_behind_activo():
+            # Se acumulan en la cache y se vuelcan por lotes
+            bufferizar(sesion, validas)
+        else:
+            # Upsert en UsuarioRespuesta o fusión en los bytes si la sesión está empaquetada
+            escribir_respuestas(sesion, validas)
+        return Response({
+            "status": "respuestas_guardadas",
+            "guardadas": len(validas),
+            "rechazadas": rechazadas
+        }, status=200)
 
     @action(detail=True, methods=['post'], url_path='finalizar')
     def finalizar_test(self, request, token=None):
@@ -92,36 +181,87 @@ class UsuarioSesionViewSet(viewsets.ModelViewSet):
         """
         sesion = self.get_object()
         respuestas_queryset = sesion.respuestas.all()
-        
-        if not respuestas_queryset.exists():
-            return Response({"error": "No hay respuestas para calcular"}, status=400)
 
-        posX, posY = calcular_posicion(respuestas_queryset)
+        if sesion.buffer_pendiente:
+            # Write-behind: calculamos con lo guardado más lo que sigue en el buffer y lo volcamos
+            valores = valores_combinados(sesion)
+            tuplas = respuestas_combinadas(sesion, valores)
+            if not tuplas and not respuestas_queryset.exists():
+                return Response({"error": "No hay respuestas para calcular"}, status=400)
+            posX, posY = calcular_posicion_desde_tuplas(tuplas)
+            volcar_buffer(sesion)
+        elif esta_empaquetada(sesion):
+            if not tiene_respuestas(sesion.respuestas_empaquetadas):
+                return Response({"error": "No hay respuestas para calcular"}, status=400)
+            valores = sesion.respuestas_empaquetadas
+            posX, posY = calcular_posicion_empaquetada(valores, obtener_mapa_preguntas(sesion.eleccion_id))
+        else:
+            if not respuestas_queryset.exists():
+                return Response({"error": "No hay respuestas para calcular"}, status=400)
+            posX, posY = calcular_posicion(respuestas_queryset)
+            valores = dict(respuestas_queryset.values_list('pregunta_id', 'valor')) if sesion.eleccion_id else {}
         
         sesion.resultado_x = posX
         sesion.resultado_y = posY
         sesion.completado = True
         sesion.save()
 
-        ranking = obtener_ranking_partidos(posX, posY)
+        # Deja el ranking memorizado para las visitas a /matches
+        ranking = obtener_ranking_sesion(sesion)
 
         return Response({
             "status": "finalizado",
             "token": sesion.token,
             "resultados": {"x": float(posX), "y": float(posY)},
-            "ranking": ranking
+            "ranking": ranking,
+            # Coincidencia pregunta a pregunta con cada partido de la elección
+            "acuerdo": acuerdo_por_partido(sesion.eleccion_id, valores)
         })
     
     # 1. Obtener afinidades (Ranking)
     @action(detail=True, methods=['get'], url_path='matches')
     def matches(self, request, token=None):
-        sesion = self.get_object()
+        sesion = self.get_queryset().filter(token=token).first()
+        if sesion is None:
+            # Las sesiones de elecciones pasadas pueden estar ya archivadas
+            sesion = get_object_or_404(SesionArchivada, token=token)
         
         if not sesion.completado:
             return Response({"error": "El quiz no ha sido finalizado"}, status=400)
 
-        ranking = obtener_ranking_partidos(sesion.resultado_x, sesion.resultado_y)
-        return Response(ranking)
+        return Response(obtener_ranking_sesion(sesion))
+
+    @action(detail=True, methods=['get'], url_path='vecinos')
+    def vecinos(self, request, token=None):
+        """
+        Resultados de otros usuarios de la misma elección más cercanos al de esta sesión (?k=, ?radio=).
+        Sale del snapshot del índice espacial; no expone tokens ni usuarios.
+        """
+        sesion = self.get_object()
+        if not sesion.completado:
+            return Response({"error": "El quiz no ha sido finalizado"}, status=400)
+        try:
+            k, radio = parametros_espaciales(request.query_params)
+        except ValueError:
+            return Response({"error": "'k' debe estar entre 1 y 100 y 'radio' ser positivo"}, status=400)
+
+        indice = obtener_indice_sesiones()
+        # Un snapshot sin elecciones por punto es de antes de separarlas: hay que regenerarlo
+        if indice is None or indice.grupos is None:
+            return Response({"error": "El índice de sesiones aún no se ha generado"}, status=503)
+
+        # Solo se comparan resultados de la misma elección
+        grupo = sesion.eleccion_id or 0
+        cercanos, distancias = indice.cercanos(
+            float(sesion.resultado_x), float(sesion.resultado_y), k, radio, excluir=sesion.id, grupo=grupo
+        )
+        return Response({
+            "total_indexadas": indice.total(grupo),
+            "vecinos": [
+                {"x": indice.xs[i], "y": indice.ys[i], "distancia": round(distancia, 2)}
+                for i, distancia in zip(cercanos.tolist(), distancias.tolist())
+            ]
+        })
 
     # 2. Vincular sesión anónima a un usuario
     @action(detail=False, methods=['post'], url_path='link-session')
@@ -141,6 +281,7 @@ class UsuarioRespuestaViewSet(viewsets.ModelViewSet):
     queryset = UsuarioRespuesta.objects.all()
     serializer_class = UsuarioRespuestaSerializer
     permission_classes = [IsAdminUser]
+    pagination_class = CursorPaginacion
 
 class MyTokenObtainPairView(TokenObtainPairView):
     serializer_class = MyTokenObtainPairSerializer
@@ -161,66 +302,85 @@ class PartidoPosicionViewSet(viewsets.ReadOnlyModelViewSet):
         # filtramos a través de las respuestas del partido si fuera necesario.
         return queryset
 
-class MetricsDashboardView(APIView):
+class MetricsDashboardView(LecturaReplicaMixin, APIView):
     permission_classes = [AllowAny]
 
     def get(self, request, format=None):
-        # Ajustado a 'completado=True' del nuevo modelo
-        quizzes_completados = UsuarioSesion.objects.filter(completado=True).count()
-        votantes_registrados = Usuario.objects.count()        
-        partidos_analizados = Partido.objects.count()
+        # Leemos la tabla de contadores en lugar de hacer COUNT(*) en cada visita
+        contadores, reconciliado = leer_contadores()
+        quizzes_completados = contadores[QUIZZES_COMPLETADOS]
+        votantes_registrados = contadores[TOTAL_USUARIOS]
+        partidos_analizados = contadores[TOTAL_PARTIDOS]
 
         data = [
             {"value": f"{quizzes_completados:,}+", "label": "Quizzes completados"},
             {"value": f"{votantes_registrados:,}+", "label": "Votantes informados"},
             {"value": str(partidos_analizados), "label": "Partidos analizados"}
         ]
-        return Response(data)
+        response = Response(data)
+        # El cuerpo es una lista que consume la landing, así que la antigüedad va en una cabecera
+        if reconciliado:
+            response['X-Contadores-Reconciliados'] = reconciliado.isoformat()
+        return response
     
-class ComparisonTableView(APIView):
+class ComparisonTableView(LecturaReplicaMixin, APIView):
+    """
+    Tabla comparativa de la landing. Acepta ?anio=2026 y ?partidos=1,2,3
+    (por defecto los tres primeros partidos, como mucho MAXIMO_PARTIDOS);
+    la respuesta sale de la cache.
+    """
     permission_classes = [AllowAny]
 
     def get(self, request):
-        categorias = Pregunta.objects.values_list('categoria', flat=True).distinct()
-        partidos = Partido.objects.all()[:3] 
-        # En el nuevo modelo de Partido el campo es 'nombre'
-        nombres_partidos = [p.nombre for p in partidos]
-
-        rows = []
-        for cat in categorias:
-            if not cat: continue # Saltar categorías vacías
-            row = {"topic": cat}
-            for i, p in enumerate(partidos):
-                letra = chr(97 + i)
-                resp = PartidoRespuesta.objects.filter(
-                    partido=p, 
-                    pregunta__categoria=cat
-                ).first()
-                
-                # Puedes mapear el valor (-2 a 2) a texto
-                row[letra] = self._mapear_valor_a_texto(resp.valor) if resp else "Sin postura"
-            rows.append(row)
+        anio = request.query_params.get('anio')
+        partidos = request.query_params.get('partidos')
 
-        return Response({
-            "headers": nombres_partidos,
-            "rows": rows
-        })
+        try:
+            anio = int(anio) if anio else None
+            partido_ids = [int(i) for i in partidos.split(',') if i.strip()] if partidos else None
+        except ValueError:
+            return Response({"error": "'anio' y 'partidos' deben ser numéricos"}, status=400)
 
-    def _mapear_valor_a_texto(self, valor):
-        mapeo = {
-            2: "Muy a favor",
-            1: "A favor",
-            0: "Neutral",
-            -1: "En contra",
-            -2: "Muy en contra"
-        }
-        return mapeo.get(valor, "Sin datos")
-    
-class PartidoPosicionViewSet(viewsets.ReadOnlyModelViewSet):
+        if partido_ids:
+            # Sin repetidos y en el orden pedido: ?partidos=1,1 y ?partidos=1 comparten cache
+            partido_ids = list(dict.fromkeys(partido_ids))
+            if len(partido_ids) > MAXIMO_PARTIDOS:
+                return Response({"error": f"Se pueden comparar como mucho {MAXIMO_PARTIDOS} partidos"}, status=400)
+
+        return Response(obtener_tabla_comparacion(anio, partido_ids))
+
+class PartidoPosicionViewSet(LecturaReplicaMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet para visualizar las coordenadas calculadas de los partidos.
     Solo lectura, ya que el cálculo se realiza internamente.
     """
     queryset = PartidoPosicion.objects.all().select_related('partido')
     serializer_class = PartidoPosicionSerializer
-    permission_classes = [AllowAny]
\ No newline at end of file
+    permission_classes = [AllowAny]
+
+    def get_queryset(self):
+        # ?anio= elige la elección; por defecto la actual, la misma que usa el ranking
+        eleccion = resolver_eleccion(self.request.query_params.get('anio'))
+        return posiciones_de_eleccion(super().get_queryset(), eleccion)
+
+    @action(detail=False, methods=['get'], url_path='cercanos')
+    def cercanos(self, request):
+        """
+        Los k partidos más cercanos a ?x=&y=, opcionalmente dentro de ?radio=.
+        """
+        try:
+            x = coordenada(request.query_params['x'])
+            y = coordenada(request.query_params['y'])
+            k, radio = parametros_espaciales(request.query_params, k_defecto=5)
+        except (KeyError, ValueError):
+            return Response({"error": "Se requieren 'x' e 'y' entre -100 y 100; 'k' entre 1 y 100 y 'radio' positivo"}, status=400)
+
+        posiciones, indice = obtener_indice_partidos()
+        cercanos, distancias = indice.cercanos(x, y, k, radio)
+        data = []
+        # Los ids del índice espacial son las posiciones de cada partido en el índice de ranking
+        for i, distancia in zip(indice.ids[cercanos].tolist(), distancias.tolist()):
+            entrada = posiciones.entrada(i, int((1 - distancia / DISTANCIA_MAXIMA) * 100))
+            entrada['distancia'] = round(distancia, 2)
+            data.append(entrada)
+        return Response(data)
\ No newline at end of file
@@ -0,0 +1,143 @@
+"""
+Versiones asíncronas de los endpoints calientes del quiz, para servir bajo ASGI
+(uvicorn) junto a la API síncrona. Mismo contrato que sus equivalentes DRF:
+
+    POST /api/async/quiz/answers/              -> UsuarioSesionViewSet.answers
+    POST /api/async/quiz/<token>/finalizar/    -> UsuarioSesionViewSet.finalizar_test
+    GET  /api/async/quiz/<token>/matches/      -> UsuarioSesionViewSet.matches
+    GET  /api/async/partido-posiciones/        -> PartidoPosicionViewSet.list
+
+Las consultas usan el ORM asíncrono; el ranking sale del índice del worker
+(CPU y cache), así que se delega en un hilo con sync_to_async.
+"""
+import json
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework.renderers import JSONRenderer
+from .models import Pregunta, UsuarioSesion, UsuarioRespuesta, PartidoPosicion, SesionArchivada
+from .empaquetado import calcular_posicion_empaquetada, escribir_respuestas, esta_empaquetada, obtener_mapa_preguntas, tiene_respuestas
+from .acuerdo import acuerdo_por_partido
+from .buffer_respuestas import bufferizar, respuestas_combinadas, valores_combinados, volcar_buffer, write_behind_activo
+from .catalogo import resolver_eleccion
+from .ranking import obtener_ranking_sesion, posiciones_de_eleccion
+from .serializers import PartidoPosicionSerializer
+from .utils import acalcular_posicion, calcular_posicion_desde_tuplas, descartar_respuestas_ajenas, revisar_formato_respuestas
+
+def _error(mensaje, status, **extra):
+    return JsonResponse({"error": mensaje, **extra}, status=status)
+
+def _no_encontrada():
+    # Mismo cuerpo que el Http404 de get_object() en la API DRF
+    return JsonResponse({"detail": "Not found."}, status=404)
+
+async def _sesion_por_token(token):
+    return await UsuarioSesion.objects.filter(token=token).afirst()
+
+# Sin cookies de sesión de Django, igual que la API DRF: no aplica CSRF
+@csrf_exempt
+@require_POST
+async def answers(request):
+    try:
+        datos = json.loads(request.body or b'{}')
+    except ValueError:
+        return _error("JSON inválido", 400)
+
+    sesion = await _sesion_por_token(datos.get('session_id'))
+    if not sesion:
+        return _error("Sesión no encontrada", 404)
+
+    respuestas_data = datos.get('answers', [])
+    if not isinstance(respuestas_data, list):
+        return _error("'answers' debe ser una lista", 400)
+
+    validas, rechazadas = revisar_formato_respuestas(respuestas_data)
+    preguntas = Pregunta.objects.filter(id__in=validas.keys())
+    if sesion.eleccion_id:
+        preguntas = preguntas.filter(eleccion_id=sesion.eleccion_id)
+    existentes = {pregunta_id async for pregunta_id in preguntas.values_list('id', flat=True)}
+    validas, rechazadas = descartar_respuestas_ajenas(validas, rechazadas, existentes)
+
+    if rechazadas and not validas:
+        return _error("Ninguna respuesta es válida", 400, rechazadas=rechazadas)
+
+    if write_behind_activo():
+        await sync_to_async(bufferizar)(sesion, validas)
+    elif esta_empaquetada(sesion):
+        await sync_to_async(escribir_respuestas)(sesion, validas)
+    else:
+        await UsuarioRespuesta.objects.abulk_create(
+            [UsuarioRespuesta(sesion=sesion, pregunta_id=pregunta_id, valor=valor) for pregunta_id, valor in validas.items()],
+            update_conflicts=True,
+            unique_fields=['sesion', 'pregunta'],
+            update_fields=['valor'],
+        )
+    return JsonResponse({
+        "status": "respuestas_guardadas",
+        "guardadas": len(validas),
+        "rechazadas": rechazadas
+    })
+
+@csrf_exempt
+@require_POST
+async def finalizar(request, token):
+    sesion = await _sesion_por_token(token)
+    if not sesion:
+        return _no_encontrada()
+
+    respuestas = sesion.respuestas.all()
+    if sesion.buffer_pendiente:
+        # Con buffer write-behind el cálculo y el volcado reutilizan la ruta síncrona
+        valores = await sync_to_async(valores_combinados)(sesion)
+        tuplas = await sync_to_async(respuestas_combinadas)(sesion, valores)
+        if not tuplas and not await respuestas.aexists():
+            return _error("No hay respuestas para calcular", 400)
+        posX, posY = calcular_posicion_desde_tuplas(tuplas)
+        await sync_to_async(volcar_buffer)(sesion)
+    elif esta_empaquetada(sesion):
+        if not tiene_respuestas(sesion.respuestas_empaquetadas):
+            return _error("No hay respuestas para calcular", 400)
+        valores = sesion.respuestas_empaquetadas
+        mapa = await sync_to_async(obtener_mapa_preguntas)(sesion.eleccion_id)
+        posX, posY = calcular_posicion_empaquetada(valores, mapa)
+    else:
+        if not await respuestas.aexists():
+            return _error("No hay respuestas para calcular", 400)
+        posX, posY = await acalcular_posicion(respuestas)
+        valores = {}
+        if sesion.eleccion_id:
+            valores = {pregunta_id: valor async for pregunta_id, valor in respuestas.values_list('pregunta_id', 'valor')}
+    sesion.resultado_x = posX
+    sesion.resultado_y = posY
+    sesion.completado = True
+    await sesion.asave()
+
+    ranking = await sync_to_async(obtener_ranking_sesion)(sesion)
+    acuerdo = await sync_to_async(acuerdo_por_partido)(sesion.eleccion_id, valores)
+    return JsonResponse({
+        "status": "finalizado",
+        "token": sesion.token,
+        "resultados": {"x": float(posX), "y": float(posY)},
+        "ranking": ranking,
+        "acuerdo": acuerdo
+    })
+
+@require_GET
+async def matches(request, token):
+    sesion = await _sesion_por_token(token) or await SesionArchivada.objects.filter(token=token).afirst()
+    if not sesion:
+        return _no_encontrada()
+    if not sesion.completado:
+        return _error("El quiz no ha sido finalizado", 400)
+
+    ranking = await sync_to_async(obtener_ranking_sesion)(sesion)
+    return JsonResponse(ranking, safe=False)
+
+@require_GET
+async def partido_posiciones(request):
+    eleccion = await sync_to_async(resolver_eleccion)(request.GET.get('anio'))
+    posiciones = [p async for p in posiciones_de_eleccion(PartidoPosicion.objects.select_related('partido'), eleccion)]
+    # Con el partido ya cargado el serializer no consulta la base de datos
+    data = PartidoPosicionSerializer(posiciones, many=True).data
+    return HttpResponse(JSONRenderer().render(data), content_type='application/json')
@@ -1,10 +1,33 @@
+import csv
+import datetime
+import gzip
+import io
+import json
+import os
+import tempfile
+from unittest import mock
+from asgiref.sync import iscoroutinefunction
+from openpyxl import Workbook
 from rest_framework.test import APITestCase
 from rest_framework import status
-from quiz.models import UsuarioSesion, Pregunta
-from core.models import Eleccion
+from django.core.cache import cache
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import override_settings
+from django.utils import timezone
+from django.core.files.uploadedfile import SimpleUploadedFile
+from quiz import ranking
+from quiz.buffer_respuestas import bufferizar, leer_buffer, volcar_buffer, volcar_pendientes
+from quiz.checks import revisar_write_behind
+from quiz.empaquetado import escribir_respuestas
+from quiz.models import UsuarioSesion, UsuarioRespuesta, Pregunta, PartidoRespuesta, PartidoPosicion, SesionArchivada
+from core.instrumentacion import InstrumentacionMiddleware, estadisticas
+from core.models import Eleccion, Partido, PartidoMetadata, Region, Usuario
+from dashboard.models import ImportacionJob
 
-class ApiTest(APITestCase):
+class BaseApiTest(APITestCase):
     def setUp(self):
+        cache.clear()
         self.eleccion = Eleccion.objects.create(nombre="Test", anio=2026)
         self.pregunta = Pregunta.objects.create(
                         eleccion=self.eleccion, 
@@ -16,6 +39,7 @@ class ApiTest(APITestCase):
                     )
         self.sesion = UsuarioSesion.objects.create()
 
+class ApiTest(BaseApiTest):
     def test_finalizar_test_endpoint(self):
         # Primero guardamos una respuesta via API o DB
         self.sesion.respuestas.create(pregunta=self.pregunta, valor=2)
@@ -25,4 +49,596 @@ class ApiTest(APITestCase):
         
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertTrue(response.data['resultados']['x'] > 0)
-        self.assertEqual(response.data['status'], 'finalizado')
\ No newline at end of file
+        self.assertEqual(response.data['status'], 'finalizado')
+
+    def test_answers_guarda_lote_y_reporta_rechazos(self):
+        self.sesion.eleccion = self.eleccion
+        self.sesion.save()
+        otra_eleccion = Eleccion.objects.create(nombre="Otra", anio=2021)
+        ajena = Pregunta.objects.create(eleccion=otra_eleccion, eje='Y', direccion=1, texto="Ajena")
+
+        payload = {"session_id": self.sesion.token, "answers": [
+            {"pregunta_id": self.pregunta.id, "valor": 1},
+            {"pregunta_id": ajena.id, "valor": 2},
+            {"pregunta_id": self.pregunta.id, "valor": 5},
+        ]}
+        response = self.client.post('/api/quiz/answers/', payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['guardadas'], 1)
+        self.assertEqual([r['indice'] for r in response.data['rechazadas']], [1, 2])
+
+        # Reenviar la misma pregunta actualiza la fila existente
+        payload["answers"] = [{"pregunta_id": self.pregunta.id, "valor": -2}]
+        self.client.post('/api/quiz/answers/', payload, format='json')
+        self.assertEqual(list(self.sesion.respuestas.values_list('valor', flat=True)), [-2])
+
+    def test_comparison_se_invalida_al_importar_respuestas(self):
+        partido = Partido.objects.create(nombre="Alfa", nombre_largo="Partido Alfa", sigla="ALF")
+        url = f'/api/comparison/?anio=2026&partidos={partido.id}'
+
+        response = self.client.get(url)
+        self.assertEqual(response.data, {"headers": ["Alfa"], "rows": [{"topic": "General", "a": "Sin postura"}]})
+
+        PartidoRespuesta.objects.create(partido=partido, pregunta=self.pregunta, valor=2)
+        response = self.client.get(url)
+        self.assertEqual(response.data["rows"], [{"topic": "General", "a": "Muy a favor"}])
+
+    def test_comparison_deduplica_y_limita_partidos(self):
+        partido = Partido.objects.create(nombre="Alfa", nombre_largo="Partido Alfa", sigla="ALF")
+        response = self.client.get(f'/api/comparison/?partidos={partido.id},{partido.id}')
+        self.assertEqual(response.data["headers"], ["Alfa"])
+
+        muchos = ','.join(str(i) for i in range(1, 12))
+        response = self.client.get(f'/api/comparison/?partidos={muchos}')
+        self.assertEqual(response.status_code, 400)
+
+    def test_metrics_lee_contadores_actualizados_por_senales(self):
+        response = self.client.get('/api/metrics/')
+        self.assertEqual(response.data[0]["value"], "0+")
+        self.assertIn('X-Contadores-Reconciliados', response)
+
+        self.sesion.completado = True
+        self.sesion.save()
+        UsuarioSesion.objects.create(completado=True)
+        self.sesion.save()  # Guardar de nuevo no vuelve a contar
+
+        response = self.client.get('/api/metrics/')
+        self.assertEqual(response.data[0]["value"], "2+")
+
+    def test_partidos_lista_en_una_consulta_y_responde_304(self):
+        for sigla in ("AAA", "BBB", "CCC"):
+            partido = Partido.objects.create(nombre=sigla, nombre_largo=sigla, sigla=sigla)
+            PartidoMetadata.objects.create(partido=partido, color_primario="#FF0000")
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/partidos/')
+        self.assertEqual(response.data[0]["color_primario"], "#FF0000")
+
+        etag = response['ETag']
+        response = self.client.get('/api/partidos/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        PartidoMetadata.objects.filter(partido__sigla="AAA").get().save()
+        response = self.client.get('/api/partidos/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_bundle_preguntas_responde_304_y_se_invalida(self):
+        url = '/api/preguntas/bundle/?anio=2026'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([p['id'] for p in response.json()['preguntas']], [self.pregunta.id])
+        self.assertIn('max-age', response['Cache-Control'])
+        etag = response['ETag']
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        Pregunta.objects.create(eleccion=self.eleccion, eje='Y', direccion=1, texto="Nueva", estado='activa')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()['preguntas']), 2)
+
+        # Sin parámetros de cursor la lista sigue siendo plana
+        self.assertIsInstance(self.client.get('/api/preguntas/').data, list)
+        paginada = self.client.get('/api/preguntas/?page_size=1')
+        self.assertEqual(len(paginada.data['results']), 1)
+        self.assertIsNotNone(paginada.data['next'])
+
+    def test_listado_de_sesiones_paginado_con_prefetch_y_proyeccion(self):
+        admin = Usuario.objects.create_superuser(email="admin@test.pe", username="admin", password="x")
+        self.client.force_authenticate(admin)
+        for valor in (1, 2):
+            UsuarioSesion.objects.create().respuestas.create(pregunta=self.pregunta, valor=valor)
+
+        with self.assertNumQueries(2):
+            pagina = self.client.get('/api/quiz/', {'page_size': 2}).json()
+        self.assertEqual([s['respuestas'] for s in pagina['results']], [[{'pregunta': self.pregunta.id, 'valor': 2}], [{'pregunta': self.pregunta.id, 'valor': 1}]])
+        siguiente = self.client.get(pagina['next']).json()
+        self.assertEqual([s['token'] for s in siguiente['results']], [self.sesion.token])
+
+        with self.assertNumQueries(1):
+            pagina = self.client.get('/api/quiz/', {'fields': 'token,completado'}).json()
+        self.assertEqual(set(pagina['results'][0]), {'token', 'completado'})
+
+class ImportacionApiTest(BaseApiTest):
+    """
+    Importadores del dashboard y su cola de jobs.
+    """
+    def test_importar_respuestas_resuelve_en_memoria_y_reporta_filas(self):
+        admin = Usuario.objects.create_superuser(email="admin@test.pe", username="admin", password="x")
+        self.client.force_authenticate(admin)
+        partido = Partido.objects.create(nombre="Alfa", nombre_largo="Partido Alfa", sigla="ALF")
+
+        contenido = (
+            "pregunta_texto,partido,valor,fuente\n"
+            " test ,alf,1,plan\n"
+            "Test,Alfa,2,debate\n"
+            "No existe,Alfa,1,\n"
+            "Test,Beta,1,\n"
+        )
+        archivo = SimpleUploadedFile("respuestas.csv", contenido.encode('utf-8'), content_type="text/csv")
+        response = self.client.post('/api/dashboard/importar-respuestas/?en_segundo_plano=false', {"archivo": archivo, "eleccion": 2026})
+
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(len(response.data["errores"]), 2)
+        respuesta = PartidoRespuesta.objects.get(partido=partido, pregunta=self.pregunta)
+        self.assertEqual((respuesta.valor, respuesta.fuente), (2, "debate"))
+        self.assertEqual(float(PartidoPosicion.objects.get(partido=partido).posicion_x), 100.0)
+
+    def test_importar_partidos_acepta_csv_con_punto_y_coma_y_xlsx(self):
+        admin = Usuario.objects.create_superuser(email="admin@test.pe", username="admin", password="x")
+        self.client.force_authenticate(admin)
+
+        contenido = "\ufeffnombre;nombre_largo;sigla\nAlfa;Partido Alfa;ALF\n".encode('utf-8')
+        archivo = SimpleUploadedFile("partidos.csv", contenido, content_type="text/csv")
+        response = self.client.post('/api/dashboard/importar-partidos/?en_segundo_plano=false', {"archivo": archivo})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        libro = Workbook()
+        libro.active.append(["nombre", "nombre_largo", "sigla"])
+        libro.active.append(["Alfa", "Partido Alfa Renovado", "ALF"])
+        libro.active.append(["Beta", "Partido Beta", "BET"])
+        contenido = io.BytesIO()
+        libro.save(contenido)
+        archivo = SimpleUploadedFile("partidos.xlsx", contenido.getvalue())
+        response = self.client.post('/api/dashboard/importar-partidos/?en_segundo_plano=false', {"archivo": archivo})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            list(Partido.objects.order_by('id').values_list('nombre', 'nombre_largo', 'sigla')),
+            [("Alfa", "Partido Alfa Renovado", "ALF"), ("Beta", "Partido Beta", "BET")]
+        )
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+    def test_importacion_en_segundo_plano_reporta_progreso(self):
+        admin = Usuario.objects.create_superuser(email="admin@test.pe", username="admin", password="x")
+        self.client.force_authenticate(admin)
+
+        archivo = SimpleUploadedFile("partidos.csv", b"nombre,nombre_largo,sigla\nAlfa,Partido Alfa,ALF\nBeta,Partido Beta,BET\n")
+        response = self.client.post('/api/dashboard/importar-partidos/', {"archivo": archivo})
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertFalse(Partido.objects.exists())
+
+        call_command('procesar_importaciones', '--una-vez', stdout=io.StringIO())
+
+        response = self.client.get(response.data["url"])
+        self.assertEqual(response.data["estado"], "completado")
+        self.assertEqual((response.data["filas_totales"], response.data["filas_procesadas"]), (2, 2))
+        self.assertEqual(response.data["errores"], [])
+        self.assertEqual(Partido.objects.count(), 2)
+
+    def test_importaciones_solo_para_administradores(self):
+        for url in ('/api/dashboard/importar-candidatos/', '/api/dashboard/importar-metadata/'):
+            self.assertEqual(self.client.post(url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        usuario = Usuario.objects.create_user(email="user@test.pe", username="user", password="x")
+        self.client.force_authenticate(usuario)
+        for url in ('/api/dashboard/importar-candidatos/', '/api/dashboard/importar-metadata/'):
+            self.assertEqual(self.client.post(url).status_code, status.HTTP_403_FORBIDDEN)
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp(), IMPORTACION_JOB_TIMEOUT=60, IMPORTACION_JOB_INTENTOS=2)
+    def test_jobs_abandonados_vuelven_a_la_cola(self):
+        hace_rato = timezone.now() - datetime.timedelta(minutes=5)
+        archivo = SimpleUploadedFile("partidos.csv", b"nombre,nombre_largo,sigla\nAlfa,Partido Alfa,ALF\n")
+        abandonado = ImportacionJob.objects.create(
+            tipo='partidos', archivo=archivo, estado='procesando', intentos=1, fecha_inicio=hace_rato, fecha_latido=hace_rato,
+        )
+        agotado = ImportacionJob.objects.create(
+            tipo='partidos', archivo=archivo, estado='procesando', intentos=2, fecha_inicio=hace_rato, fecha_latido=hace_rato,
+        )
+        vivo = ImportacionJob.objects.create(
+            tipo='partidos', archivo=archivo, estado='procesando', intentos=1, fecha_inicio=hace_rato, fecha_latido=timezone.now(),
+        )
+
+        call_command('procesar_importaciones', '--una-vez', stdout=io.StringIO())
+
+        abandonado.refresh_from_db()
+        self.assertEqual((abandonado.estado, abandonado.intentos), ('completado', 2))
+        self.assertTrue(Partido.objects.filter(sigla="ALF").exists())
+        agotado.refresh_from_db()
+        self.assertEqual((agotado.estado, agotado.codigo_estado), ('error', 500))
+        vivo.refresh_from_db()
+        self.assertEqual(vivo.estado, 'procesando')
+
+class RespuestasApiTest(BaseApiTest):
+    """
+    Escritura de respuestas: vistas async, write-behind y empaquetado.
+    """
+    def test_endpoints_async_tienen_el_mismo_contrato(self):
+        partido = Partido.objects.create(nombre="Alfa", nombre_largo="Partido Alfa", sigla="ALF")
+        PartidoPosicion.objects.create(partido=partido, posicion_x=50, posicion_y=0)
+
+        payload = {"session_id": self.sesion.token, "answers": [{"pregunta_id": self.pregunta.id, "valor": 2}, {"valor": 1}]}
+        response = self.client.post('/api/async/quiz/answers/', payload, format='json')
+        self.assertEqual(response.json()['guardadas'], 1)
+        self.assertEqual(response.json()['rechazadas'][0]['indice'], 1)
+
+        finalizado = self.client.post(f'/api/async/quiz/{self.sesion.token}/finalizar/').json()
+        self.assertEqual(finalizado['resultados'], {"x": 100.0, "y": 0.0})
+
+        asincrono = self.client.get(f'/api/async/quiz/{self.sesion.token}/matches/').json()
+        self.assertEqual(asincrono, self.client.get(f'/api/quiz/{self.sesion.token}/matches/').json())
+        self.assertEqual(
+            self.client.get('/api/async/partido-posiciones/').json(),
+            self.client.get('/api/partido-posiciones/').json()
+        )
+        self.assertEqual(self.client.get('/api/async/quiz/NOEXISTE/matches/').status_code, 404)
+
+    @override_settings(RESPUESTAS_WRITE_BEHIND=True, RESPUESTAS_BUFFER_MAXIMO=3)
+    def test_write_behind_acumula_en_cache_y_vuelca(self):
+        otra = Pregunta.objects.create(eleccion=self.eleccion, eje='Y', direccion=1, texto="Otra", estado='activa')
+        self.sesion.respuestas.create(pregunta=otra, valor=-2)
+
+        payload = {"session_id": self.sesion.token, "answers": [{"pregunta_id": self.pregunta.id, "valor": 2}]}
+        self.client.post('/api/quiz/answers/', payload, format='json')
+        self.assertFalse(UsuarioRespuesta.objects.filter(pregunta=self.pregunta).exists())
+
+        # /finalizar combina lo guardado con el buffer y lo vuelca
+        response = self.client.post(f'/api/quiz/{self.sesion.token}/finalizar/')
+        self.assertEqual(response.data['resultados'], {"x": 100.0, "y": -100.0})
+        self.assertEqual(UsuarioRespuesta.objects.get(sesion=self.sesion, pregunta=self.pregunta).valor, 2)
+
+        # Un buffer huérfano lo recupera el comando
+        payload["answers"] = [{"pregunta_id": self.pregunta.id, "valor": -1}]
+        self.client.post('/api/quiz/answers/', payload, format='json')
+        call_command('volcar_respuestas', '--una-vez', stdout=io.StringIO())
+        self.sesion.refresh_from_db()
+        self.assertFalse(self.sesion.buffer_pendiente)
+        self.assertEqual(UsuarioRespuesta.objects.get(sesion=self.sesion, pregunta=self.pregunta).valor, -1)
+
+    @override_settings(RESPUESTAS_WRITE_BEHIND=True)
+    def test_write_behind_no_pierde_respuestas_que_llegan_durante_un_volcado(self):
+        otra = Pregunta.objects.create(eleccion=self.eleccion, eje='Y', direccion=1, texto="Otra", estado='activa')
+        # Dos instancias de la misma sesión, como dos peticiones en paralelo
+        peticion = UsuarioSesion.objects.get(pk=self.sesion.pk)
+        bufferizar(peticion, {self.pregunta.id: 1})
+        volcar_buffer(UsuarioSesion.objects.get(pk=self.sesion.pk))
+
+        # La instancia de la petición sigue creyendo que la marca está puesta
+        bufferizar(peticion, {otra.id: 2})
+        self.sesion.refresh_from_db()
+        self.assertTrue(self.sesion.buffer_pendiente)
+
+        # Una respuesta que llega mientras el volcado escribe espera al bloqueo de la sesión
+        def escribir_y_responder(sesion, valores):
+            escribir_respuestas(sesion, valores)
+            with mock.patch('quiz.buffer_respuestas.BLOQUEO_TTL', 0), self.assertRaises(TimeoutError):
+                bufferizar(peticion, {self.pregunta.id: -2})
+
+        with mock.patch('quiz.buffer_respuestas.escribir_respuestas', side_effect=escribir_y_responder):
+            volcar_buffer(self.sesion)
+        bufferizar(peticion, {self.pregunta.id: -2})
+        self.sesion.refresh_from_db()
+        self.assertTrue(self.sesion.buffer_pendiente)
+        self.assertEqual(leer_buffer(self.sesion), {self.pregunta.id: -2})
+
+        volcar_pendientes()
+        self.assertEqual(dict(self.sesion.respuestas.values_list('pregunta_id', 'valor')), {self.pregunta.id: -2, otra.id: 2})
+
+    @override_settings(RESPUESTAS_WRITE_BEHIND=True)
+    def test_write_behind_solo_escribe_al_abrir_el_buffer(self):
+        otra = Pregunta.objects.create(eleccion=self.eleccion, eje='Y', direccion=1, texto="Otra", estado='activa')
+        payload = {"session_id": self.sesion.token, "answers": [{"pregunta_id": self.pregunta.id, "valor": 2}]}
+        self.client.post('/api/quiz/answers/', payload, format='json')
+
+        # Solo se leen la sesión y las preguntas; el buffer no toca la base de datos
+        payload["answers"] = [{"pregunta_id": otra.id, "valor": 1}]
+        with self.assertNumQueries(2):
+            self.client.post('/api/quiz/answers/', payload, format='json')
+        sesion = UsuarioSesion.objects.get(pk=self.sesion.pk)
+        with self.assertNumQueries(0):
+            bufferizar(sesion, {otra.id: -1})
+        self.assertTrue(sesion.buffer_pendiente)
+        self.assertEqual(leer_buffer(sesion), {self.pregunta.id: 2, otra.id: -1})
+
+    def test_write_behind_exige_cache_compartida(self):
+        with override_settings(RESPUESTAS_WRITE_BEHIND=True):
+            self.assertEqual([e.id for e in revisar_write_behind(None)], ['quiz.E001'])
+        compartida = {'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'cache'}}
+        with override_settings(RESPUESTAS_WRITE_BEHIND=True, CACHES=compartida):
+            self.assertEqual(revisar_write_behind(None), [])
+
+    def test_respuestas_empaquetadas_mantienen_contrato_y_resultado(self):
+        otra = Pregunta.objects.create(eleccion=self.eleccion, eje='Y', direccion=-1, texto="Otra", estado='activa')
+        self.assertEqual((self.pregunta.posicion, otra.posicion), (0, 1))
+        self.sesion.eleccion = self.eleccion
+        self.sesion.save()
+        self.sesion.respuestas.create(pregunta=self.pregunta, valor=1)
+        self.sesion.respuestas.create(pregunta=otra, valor=-2)
+
+        url = f'/api/quiz/{self.sesion.token}/'
+        antes = self.client.get(url).json()
+        call_command('empaquetar_respuestas', stdout=io.StringIO())
+        self.sesion.refresh_from_db()
+        self.assertEqual(bytes(self.sesion.respuestas_empaquetadas), bytes([1, 254]))
+        self.assertFalse(UsuarioRespuesta.objects.filter(sesion=self.sesion).exists())
+        self.assertEqual(self.client.get(url).json(), antes)
+
+        # Escribir y puntuar leen directamente los bytes
+        payload = {"session_id": self.sesion.token, "answers": [{"pregunta_id": self.pregunta.id, "valor": 2}]}
+        self.client.post('/api/quiz/answers/', payload, format='json')
+        response = self.client.post(f'/api/quiz/{self.sesion.token}/finalizar/')
+        self.assertEqual(response.data['resultados'], {"x": 100.0, "y": 100.0})
+
+        call_command('desempaquetar_respuestas', stdout=io.StringIO())
+        self.assertEqual(dict(self.sesion.respuestas.values_list('pregunta_id', 'valor')), {self.pregunta.id: 2, otra.id: -2})
+
+    def test_empaquetar_se_salta_sesiones_con_preguntas_fuera_del_mapa(self):
+        pasada = Eleccion.objects.create(nombre="Pasada", anio=2021)
+        ajena = Pregunta.objects.create(eleccion=pasada, eje='X', direccion=1, texto="Ajena", estado='activa')
+        self.sesion.eleccion = self.eleccion
+        self.sesion.save()
+        self.sesion.respuestas.create(pregunta=self.pregunta, valor=1)
+        self.sesion.respuestas.create(pregunta=ajena, valor=2)
+
+        call_command('empaquetar_respuestas', stdout=io.StringIO())
+        self.sesion.refresh_from_db()
+        self.assertIsNone(self.sesion.respuestas_empaquetadas)
+        self.assertEqual(self.sesion.respuestas.count(), 2)
+
+class RankingApiTest(BaseApiTest):
+    """
+    Matches, consultas espaciales y coincidencia con los partidos.
+    """
+    def test_matches_memoriza_ranking_por_version_de_posiciones(self):
+        partido = Partido.objects.create(nombre="Alfa", nombre_largo="Partido Alfa", sigla="ALF")
+        posicion = PartidoPosicion.objects.create(partido=partido, posicion_x=50, posicion_y=0)
+        self.sesion.respuestas.create(pregunta=self.pregunta, valor=2)
+        self.client.post(f'/api/quiz/{self.sesion.token}/finalizar/')
+
+        url = f'/api/quiz/{self.sesion.token}/matches/'
+        # /finalizar dejó el ranking en cache: solo se consulta la sesión
+        ranking._rankings.clear()
+        with self.assertNumQueries(1):
+            primera = self.client.get(url).data
+        self.assertEqual(primera[0]['match_percentage'], 82)
+
+        # Reimportar posiciones cambia la versión y recalcula
+        posicion.posicion_x = 100
+        posicion.save()
+        self.assertEqual(self.client.get(url).data[0]['match_percentage'], 100)
+
+    def test_matches_de_una_sesion_de_otra_eleccion_usa_sus_partidos(self):
+        pasada = Eleccion.objects.create(nombre="Pasada", anio=2021)
+        vieja = Pregunta.objects.create(eleccion=pasada, eje='X', direccion=1, texto="Vieja", estado='activa')
+        alfa = Partido.objects.create(nombre="Alfa", nombre_largo="Partido Alfa", sigla="ALF")
+        beta = Partido.objects.create(nombre="Beta", nombre_largo="Partido Beta", sigla="BET")
+        PartidoRespuesta.objects.create(partido=alfa, pregunta=self.pregunta, valor=2)
+        PartidoRespuesta.objects.create(partido=alfa, pregunta=vieja, valor=-2)
+        PartidoRespuesta.objects.create(partido=beta, pregunta=vieja, valor=2)
+
+        sesiones = {}
+        for eleccion, pregunta in ((self.eleccion, self.pregunta), (pasada, vieja)):
+            sesion = sesiones[eleccion.anio] = UsuarioSesion.objects.create(eleccion=eleccion)
+            sesion.respuestas.create(pregunta=pregunta, valor=-2)
+            self.client.post(f'/api/quiz/{sesion.token}/finalizar/')
+
+        # Cada sesión se compara con las posiciones de los partidos en su propia elección
+        actual = self.client.get(f'/api/quiz/{sesiones[2026].token}/matches/').data
+        self.assertEqual([(p['id'], p['posicion']['x']) for p in actual], [(alfa.id, 100.0)])
+        anterior = self.client.get(f'/api/quiz/{sesiones[2021].token}/matches/').data
+        self.assertEqual([(p['id'], p['posicion']['x'], p['match_percentage']) for p in anterior], [(alfa.id, -100.0, 100), (beta.id, 100.0, 29)])
+        asincrono = self.client.get(f'/api/async/quiz/{sesiones[2021].token}/matches/').json()
+        self.assertEqual(asincrono, anterior)
+
+    def test_consultas_espaciales_rechazan_coordenadas_fuera_del_mapa(self):
+        for consulta in ('x=nan&y=0', 'x=0&y=inf', 'x=101&y=0', 'x=0&y=0&radio=nan', 'x=0&y=0&radio=inf', 'x=0&y=0&radio=-1'):
+            response = self.client.get(f'/api/partido-posiciones/cercanos/?{consulta}')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, consulta)
+
+        self.sesion.resultado_x, self.sesion.resultado_y, self.sesion.completado = 0, 0, True
+        self.sesion.save()
+        response = self.client.get(f'/api/quiz/{self.sesion.token}/vecinos/?radio=nan')
+        self.assertEqual(response.data, {"error": "'k' debe estar entre 1 y 100 y 'radio' ser positivo"})
+
+    def test_consultas_espaciales_de_partidos_y_sesiones(self):
+        cerca = Partido.objects.create(nombre="Cerca", nombre_largo="Partido Cerca", sigla="CER")
+        lejos = Partido.objects.create(nombre="Lejos", nombre_largo="Partido Lejos", sigla="LEJ")
+        PartidoPosicion.objects.create(partido=cerca, posicion_x=10, posicion_y=10)
+        PartidoPosicion.objects.create(partido=lejos, posicion_x=-90, posicion_y=-90)
+
+        response = self.client.get('/api/partido-posiciones/cercanos/?x=0&y=0&k=5&radio=50')
+        self.assertEqual([p['id'] for p in response.data], [cerca.id])
+        self.assertEqual(response.data[0]['distancia'], 14.14)
+        self.assertEqual(self.client.get('/api/partido-posiciones/cercanos/?x=0').status_code, 400)
+
+        self.sesion.resultado_x, self.sesion.resultado_y, self.sesion.completado = 0, 0, True
+        self.sesion.save()
+        for x in (5, 50, -100):
+            UsuarioSesion.objects.create(resultado_x=x, resultado_y=0, completado=True)
+        # Una sesión de otra elección no es vecina aunque esté más cerca
+        UsuarioSesion.objects.create(eleccion=self.eleccion, resultado_x=1, resultado_y=0, completado=True)
+
+        with tempfile.TemporaryDirectory() as carpeta, override_settings(INDICE_SESIONES_RUTA=f'{carpeta}/sesiones.npz'):
+            url = f'/api/quiz/{self.sesion.token}/vecinos/?k=2'
+            self.assertEqual(self.client.get(url).status_code, 503)
+            call_command('indice_espacial', stdout=io.StringIO())
+            response = self.client.get(url)
+        self.assertEqual(response.data['total_indexadas'], 4)
+        self.assertEqual([v['x'] for v in response.data['vecinos']], [5.0, 50.0])
+
+    def test_finalizar_devuelve_acuerdo_por_pregunta_con_cada_partido(self):
+        otra = Pregunta.objects.create(eleccion=self.eleccion, eje='Y', direccion=1, texto="Otra", estado='activa')
+        afin = Partido.objects.create(nombre="Afín", sigla="AF")
+        opuesto = Partido.objects.create(nombre="Opuesto", sigla="OP")
+        PartidoRespuesta.objects.create(partido=afin, pregunta=self.pregunta, valor=2)
+        PartidoRespuesta.objects.create(partido=afin, pregunta=otra, valor=-1)
+        PartidoRespuesta.objects.create(partido=opuesto, pregunta=self.pregunta, valor=-2)
+        self.sesion.eleccion = self.eleccion
+        self.sesion.save()
+        self.sesion.respuestas.create(pregunta=self.pregunta, valor=2)
+        self.sesion.respuestas.create(pregunta=otra, valor=1)
+
+        acuerdo = self.client.post(f'/api/quiz/{self.sesion.token}/finalizar/').data['acuerdo']
+        # Afín: 4/4 en la primera y 2/4 en la segunda; Opuesto: 0/4 en la única común
+        self.assertEqual(acuerdo, [
+            {'id': afin.id, 'sigla': 'AF', 'porcentaje': 75, 'preguntas_en_comun': 2, 'coincide_en': [self.pregunta.id], 'discrepa_en': []},
+            {'id': opuesto.id, 'sigla': 'OP', 'porcentaje': 0, 'preguntas_en_comun': 1, 'coincide_en': [], 'discrepa_en': [self.pregunta.id]},
+        ])
+
+        # Editar una respuesta de partido invalida la matriz memorizada
+        PartidoRespuesta.objects.filter(partido=opuesto).get().delete()
+        acuerdo = self.client.post(f'/api/quiz/{self.sesion.token}/finalizar/').data['acuerdo']
+        self.assertEqual([p['id'] for p in acuerdo], [afin.id])
+
+class ResultadosApiTest(BaseApiTest):
+    """
+    Mapa de calor, archivo de sesiones y exportación.
+    """
+    def test_mapa_calor_se_actualiza_al_finalizar_y_se_reconstruye(self):
+        lima = Region.objects.create(nombre="Lima")
+        self.sesion.eleccion, self.sesion.region = self.eleccion, lima
+        self.sesion.save()
+        self.sesion.respuestas.create(pregunta=self.pregunta, valor=2)
+        self.client.post(f'/api/quiz/{self.sesion.token}/finalizar/')
+
+        data = self.client.get('/api/mapa-calor/?anio=2026').data
+        self.assertEqual(data['total'], 1)
+        # x = 100 cae en la última columna, y = 0 en la fila central
+        self.assertEqual(data['conteos'][10][19], 1)
+
+        # Volver a finalizar con otra respuesta mueve la sesión de celda
+        self.sesion.respuestas.update(valor=-2)
+        self.client.post(f'/api/quiz/{self.sesion.token}/finalizar/')
+        data = self.client.get(f'/api/mapa-calor/?anio=2026&region={lima.id}').data
+        self.assertEqual((data['total'], data['conteos'][10][0]), (1, 1))
+
+        call_command('reconstruir_mapa_calor', stdout=io.StringIO())
+        self.assertEqual(self.client.get('/api/mapa-calor/').data['conteos'][10][0], 1)
+
+    def test_archivar_sesiones_conserva_contadores_mapa_y_matches(self):
+        pasada = Eleccion.objects.create(nombre="Pasada", anio=2021)
+        pregunta = Pregunta.objects.create(eleccion=pasada, eje='X', direccion=1, texto="Vieja", estado='activa')
+        sesiones = [UsuarioSesion.objects.create(eleccion=pasada) for _ in range(2)]
+        for sesion in sesiones:
+            sesion.respuestas.create(pregunta=pregunta, valor=2)
+            self.client.post(f'/api/quiz/{sesion.token}/finalizar/')
+        matches = self.client.get(f'/api/quiz/{sesiones[0].token}/matches/').data
+        metricas = self.client.get('/api/metrics/').data[0]["value"]
+
+        salida = io.StringIO()
+        call_command('archivar_sesiones', '--dry-run', stdout=salida)
+        self.assertIn("2 sesiones se archivarían", salida.getvalue())
+        call_command('archivar_sesiones', '--lote', '1', stdout=io.StringIO())
+        self.assertFalse(UsuarioSesion.objects.filter(eleccion=pasada).exists())
+        self.assertFalse(UsuarioRespuesta.objects.filter(pregunta=pregunta).exists())
+        archivada = SesionArchivada.objects.get(token=sesiones[0].token)
+        self.assertEqual((archivada.id, bytes(archivada.respuestas_empaquetadas)), (sesiones[0].id, bytes([2])))
+
+        # Las sesiones archivadas siguen contando y se siguen encontrando por token
+        self.assertEqual(self.client.get('/api/metrics/').data[0]["value"], metricas)
+        self.assertEqual(self.client.get(f'/api/quiz/{sesiones[0].token}/matches/').data, matches)
+        self.assertEqual(self.client.get('/api/mapa-calor/?anio=2021').data['total'], 2)
+        call_command('reconciliar_contadores', stdout=io.StringIO())
+        call_command('reconstruir_mapa_calor', stdout=io.StringIO())
+        self.assertEqual(self.client.get('/api/metrics/').data[0]["value"], metricas)
+        self.assertEqual(self.client.get('/api/mapa-calor/?anio=2021').data['total'], 2)
+
+    def test_archivar_sesiones_a_snapshot_csv(self):
+        pasada = Eleccion.objects.create(nombre="Pasada", anio=2021)
+        pregunta = Pregunta.objects.create(eleccion=pasada, eje='X', direccion=1, texto="Vieja", estado='activa')
+        sesion = UsuarioSesion.objects.create(eleccion=pasada)
+        sesion.respuestas.create(pregunta=pregunta, valor=-1)
+        self.client.post(f'/api/quiz/{sesion.token}/finalizar/')
+
+        with tempfile.TemporaryDirectory() as carpeta:
+            call_command('archivar_sesiones', '--anio', '2021', '--destino', 'csv', '--carpeta', carpeta, stdout=io.StringIO())
+            ruta = os.path.join(carpeta, f'sesiones_2021_{pasada.id}', 'part-00001.csv.gz')
+            with gzip.open(ruta, 'rt', encoding='utf-8') as archivo:
+                filas = list(csv.DictReader(archivo))
+        self.assertEqual([(f['token'], f['respuestas']) for f in filas], [(sesion.token, f'{{"{pregunta.id}": -1}}')])
+        self.assertFalse(UsuarioSesion.objects.filter(id=sesion.id).exists())
+
+    def test_exportar_resultados_en_streaming(self):
+        otra = Pregunta.objects.create(eleccion=self.eleccion, eje='Y', direccion=1, texto="Otra", estado='activa')
+        self.sesion.eleccion = self.eleccion
+        self.sesion.save()
+        self.sesion.respuestas.create(pregunta=self.pregunta, valor=2)
+        self.sesion.respuestas.create(pregunta=otra, valor=-1)
+        vacia = UsuarioSesion.objects.create(eleccion=self.eleccion)
+        empaquetada = UsuarioSesion.objects.create(eleccion=self.eleccion)
+        empaquetada.respuestas.create(pregunta=otra, valor=1)
+        call_command('empaquetar_respuestas', stdout=io.StringIO())
+        UsuarioSesion.objects.filter(id=empaquetada.id).update(respuestas_empaquetadas=bytes([254, 1]))
+
+        url = '/api/dashboard/exportar-resultados/'
+        self.assertEqual(self.client.get(url).status_code, 401)
+        admin = Usuario.objects.create_superuser(email="admin@test.pe", username="admin", password="x")
+        self.client.force_authenticate(admin)
+
+        response = self.client.get(url, {'formato': 'jsonl', 'anio': 2026})
+        self.assertTrue(response.streaming)
+        filas = [json.loads(linea) for linea in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(
+            [(f['token'], f['respuestas']) for f in filas],
+            [
+                (self.sesion.token, {str(self.pregunta.id): 2, str(otra.id): -1}),
+                (vacia.token, {}),
+                (empaquetada.token, {str(self.pregunta.id): -2, str(otra.id): 1}),
+            ],
+        )
+
+        response = self.client.get(url, {'desde': '2000-01-01', 'hasta': '2000-12-31'})
+        self.assertEqual(b''.join(response.streaming_content).decode().strip(), ','.join(
+            ['id', 'token', 'usuario_id', 'eleccion_id', 'region_id', 'fecha', 'completado', 'resultado_x', 'resultado_y', 'respuestas']
+        ))
+        self.assertEqual(self.client.get(url, {'desde': 'ayer'}).status_code, 400)
+
+        salida = io.StringIO()
+        call_command('exportar_resultados', '--anio', '2026', stdout=salida)
+        filas = list(csv.DictReader(io.StringIO(salida.getvalue())))
+        self.assertEqual(json.loads(filas[0]['respuestas']), {str(self.pregunta.id): 2, str(otra.id): -1})
+        self.assertEqual(len(filas), 3)
+
+class InstrumentacionApiTest(BaseApiTest):
+    def test_instrumentacion_mide_por_endpoint_solo_si_esta_activa(self):
+        estadisticas.reiniciar()
+        self.assertNotIn('Server-Timing', self.client.get('/api/partidos/'))
+
+        with override_settings(INSTRUMENTACION=True):
+            self.client = self.client_class()
+            for _ in range(3):
+                response = self.client.get(f'/api/quiz/{self.sesion.token}/')
+            self.assertRegex(response['Server-Timing'], r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ consultas"$')
+
+            admin = Usuario.objects.create_superuser(email="admin@test.pe", username="admin", password="x")
+            self.client.force_authenticate(admin)
+            data = self.client.get('/api/dashboard/perf/').data
+        self.assertTrue(data['activa'])
+        fila = next(f for f in data['endpoints'] if f['endpoint'] == 'UsuarioSesionViewSet.retrieve')
+        self.assertEqual(fila['peticiones'], 3)
+        consultas = int(response['Server-Timing'].split('desc="')[1].split()[0])
+        self.assertEqual((fila['consultas']['p50'], fila['consultas']['max']), (consultas, consultas))
+        self.assertLessEqual(fila['tiempo_ms']['p50'], fila['tiempo_ms']['max'])
+
+    async def test_instrumentacion_cuenta_consultas_de_vistas_async(self):
+        async def vista(request):
+            return HttpResponse()
+
+        with override_settings(INSTRUMENTACION=True):
+            # En una cadena asíncrona el middleware no obliga a Django a adaptarla a hilos
+            self.assertTrue(iscoroutinefunction(InstrumentacionMiddleware(vista)))
+            self.async_client = self.async_client_class()
+            response = await self.async_client.get('/api/async/partido-posiciones/')
+        # La elección actual (sin ninguna marcada, dos consultas) y las posiciones
+        self.assertRegex(response['Server-Timing'], r'desc="3 consultas"$')
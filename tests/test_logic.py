@@ -1,10 +1,17 @@
-from django.test import TestCase
+import math
+from unittest import mock
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from core.checks import revisar_cache_compartida
 from core.models import Eleccion, Partido
 from quiz.models import Pregunta, UsuarioSesion, UsuarioRespuesta, PartidoPosicion
-from quiz.utils import calcular_posicion, obtener_ranking_partidos
+from quiz.utils import calcular_posicion, calcular_posicion_desde_tuplas, obtener_ranking_partidos
 
 class LogicTest(TestCase):
     def setUp(self):
+        cache.clear()
         self.eleccion = Eleccion.objects.create(nombre="Test", anio=2026)
         # Pregunta Económica (X) - Dirección Positiva
         self.p_econ = Pregunta.objects.create(
@@ -26,4 +33,131 @@ class LogicTest(TestCase):
         # (2 * 1 / 2) * 100 = 100
         # (-2 * -1 / 2) * 100 = 100
         self.assertEqual(posX, 100.0)
-        self.assertEqual(posY, 100.0)
\ No newline at end of file
+        self.assertEqual(posY, 100.0)
+    def test_calculo_en_memoria_coincide_con_base_de_datos(self):
+        sesion = UsuarioSesion.objects.create()
+        p_inactiva = Pregunta.objects.create(
+            eleccion=self.eleccion, eje='X', direccion=1, texto="Inactiva", estado='inactiva'
+        )
+        UsuarioRespuesta.objects.create(sesion=sesion, pregunta=self.p_econ, valor=1)
+        UsuarioRespuesta.objects.create(sesion=sesion, pregunta=self.p_soc, valor=2)
+        UsuarioRespuesta.objects.create(sesion=sesion, pregunta=p_inactiva, valor=-2)
+
+        tuplas = [
+            (r.pregunta.eje, r.pregunta.direccion, r.valor)
+            for r in sesion.respuestas.filter(pregunta__estado='activa').select_related('pregunta')
+        ]
+
+        self.assertEqual(calcular_posicion(sesion.respuestas.all()), (50.0, -100.0))
+        self.assertEqual(calcular_posicion_desde_tuplas(tuplas), (50.0, -100.0))
+
+    def test_ranking_vectorizado_coincide_con_calculo_directo(self):
+        izquierda = Partido.objects.create(nombre="Izq", nombre_largo="Izquierda", sigla="IZ")
+        derecha = Partido.objects.create(nombre="Der", nombre_largo="Derecha", sigla="DE")
+        PartidoPosicion.objects.create(partido=izquierda, posicion_x=-80, posicion_y=10)
+        PartidoPosicion.objects.create(partido=derecha, posicion_x=75.5, posicion_y=-20)
+
+        ranking = obtener_ranking_partidos(60, -10)
+
+        self.assertEqual([p['id'] for p in ranking], [derecha.id, izquierda.id])
+        esperado = int((1 - math.sqrt(15.5**2 + 10**2) / math.sqrt(80000)) * 100)
+        self.assertEqual(ranking[0]['match_percentage'], esperado)
+        self.assertEqual(ranking[0]['posicion'], {'x': 75.5, 'y': -20.0})
+
+        # Recalcular la posición invalida el índice del worker
+        PartidoPosicion.objects.filter(partido=izquierda).get().delete()
+        self.assertEqual([p['id'] for p in obtener_ranking_partidos(60, -10)], [derecha.id])
+
+    def test_tabla_de_rankings_coincide_con_el_indice(self):
+        from quiz.ranking import obtener_indice_posiciones, obtener_tabla_rankings
+        for i, (x, y) in enumerate([(-80, 10), (75.5, -20), (50, -50)]):
+            partido = Partido.objects.create(nombre=f"P{i}", nombre_largo=f"Partido {i}", sigla=f"P{i}")
+            PartidoPosicion.objects.create(partido=partido, posicion_x=x, posicion_y=y)
+
+        tabla = obtener_tabla_rankings()
+        # Una pregunta por eje: cada coordenada solo puede valer -100, -50, 0, 50 o 100
+        self.assertEqual(sorted(tabla.posicion_x), [-100.0, -50.0, 0.0, 50.0, 100.0])
+        self.assertEqual(tabla.memoria, 25 * 3 * 3)
+
+        indice = obtener_indice_posiciones()
+        for x in tabla.posicion_x:
+            for y in tabla.posicion_y:
+                self.assertEqual(tabla.ranking(x, y), indice.ranking(x, y))
+        self.assertIsNone(tabla.ranking(60, -10))
+
+    def test_aviso_si_las_versiones_viven_en_una_cache_por_proceso(self):
+        with override_settings(DEBUG=False):
+            self.assertEqual([aviso.id for aviso in revisar_cache_compartida(None)], ['core.W001'])
+        with override_settings(DEBUG=True):
+            self.assertEqual(revisar_cache_compartida(None), [])
+
+    def test_router_lee_de_replica_solo_en_vistas_de_lectura(self):
+        from core.replicas import (
+            COOKIE_PRIMARIA, PrimariaTrasEscrituraMiddleware, ReplicaRouter, en_primaria, leyendo_de_replica
+        )
+        router = ReplicaRouter()
+        with mock.patch('core.replicas.replica_disponible', return_value=True):
+            self.assertIsNone(router.db_for_read(Partido))
+            with leyendo_de_replica():
+                self.assertEqual(router.db_for_read(Partido), 'replica')
+                with en_primaria():
+                    self.assertIsNone(router.db_for_read(Partido))
+        # Réplica caída: vuelve a la primaria
+        with leyendo_de_replica():
+            self.assertIsNone(router.db_for_read(Partido))
+        self.assertEqual(router.db_for_write(Partido), 'default')
+
+        with mock.patch('core.replicas.replica_configurada', return_value=True):
+            middleware = PrimariaTrasEscrituraMiddleware(lambda request: HttpResponse())
+            escritura = middleware(RequestFactory().post('/api/quiz/answers/'))
+            lectura = middleware(RequestFactory().get('/api/partidos/'))
+        self.assertIn(COOKIE_PRIMARIA, escritura.cookies)
+        self.assertEqual(escritura.cookies[COOKIE_PRIMARIA]['samesite'], 'None')
+        self.assertTrue(escritura.cookies[COOKIE_PRIMARIA]['secure'])
+        self.assertNotIn(COOKIE_PRIMARIA, lectura.cookies)
+
+        # Bajo ASGI el mismo middleware se queda en la cadena asíncrona
+        async def vista(request):
+            return HttpResponse()
+
+        with mock.patch('core.replicas.replica_configurada', return_value=True):
+            middleware = PrimariaTrasEscrituraMiddleware(vista)
+        self.assertTrue(iscoroutinefunction(middleware))
+        escritura = async_to_sync(middleware)(RequestFactory().post('/api/quiz/answers/'))
+        self.assertIn(COOKIE_PRIMARIA, escritura.cookies)
+
+    def test_posiciones_de_partidos_incrementales_por_eleccion(self):
+        import io
+        from django.core.management import call_command
+        from quiz.models import PartidoRespuesta
+        from quiz.ranking import obtener_indice_posiciones
+
+        partido = Partido.objects.create(nombre="Partido A", sigla="PA")
+        pasada = Eleccion.objects.create(nombre="Pasada", anio=2021)
+        vieja = Pregunta.objects.create(eleccion=pasada, eje='X', direccion=1, texto="Vieja", estado='activa')
+
+        econ = PartidoRespuesta.objects.create(partido=partido, pregunta=self.p_econ, valor=2)
+        PartidoRespuesta.objects.create(partido=partido, pregunta=self.p_soc, valor=1)
+        PartidoRespuesta.objects.create(partido=partido, pregunta=vieja, valor=-2)
+        actual = PartidoPosicion.objects.get(partido=partido, eleccion=self.eleccion)
+        self.assertEqual((float(actual.posicion_x), float(actual.posicion_y)), (100.0, -50.0))
+        self.assertEqual(float(PartidoPosicion.objects.get(partido=partido, eleccion=pasada).posicion_x), -100.0)
+
+        # Editar una respuesta solo aplica su diferencia; el ranking usa la elección actual
+        econ.valor = -1
+        econ.save()
+        actual.refresh_from_db()
+        self.assertEqual((actual.suma_x, actual.conteo_x, float(actual.posicion_x)), (-1, 1, -50.0))
+        self.assertEqual(obtener_indice_posiciones().coordenadas, [(-50.0, -50.0)])
+
+        # Desactivar una pregunta recalcula su elección; borrar la última respuesta quita la fila
+        self.p_soc.estado = 'inactiva'
+        self.p_soc.save()
+        actual.refresh_from_db()
+        self.assertEqual((actual.conteo_y, float(actual.posicion_y)), (0, 0.0))
+        econ.delete()
+        self.assertFalse(PartidoPosicion.objects.filter(partido=partido, eleccion=self.eleccion).exists())
+
+        PartidoPosicion.objects.filter(eleccion=pasada).update(suma_x=99, posicion_x=0)
+        call_command('recalcular_posiciones', stdout=io.StringIO())
+        self.assertEqual(float(PartidoPosicion.objects.get(partido=partido, eleccion=pasada).posicion_x), -100.0)
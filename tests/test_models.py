@@ -1,13 +1,58 @@
+from unittest import mock
 from django.test import TestCase
-from quiz.models import UsuarioSesion
-from core.models import Usuario
+from quiz.empaquetado import leer_respuestas
+from quiz.models import Pregunta, UsuarioSesion
+from quiz.tokens import LONGITUD_TOKEN, generar_token
+from core.models import Eleccion, Usuario
 
 class ModelsTest(TestCase):
     def test_generacion_token_sesion(self):
         sesion = UsuarioSesion.objects.create()
         self.assertIsNotNone(sesion.token)
-        self.assertEqual(len(sesion.token), 10)
+        self.assertEqual(len(sesion.token), LONGITUD_TOKEN)
+
+    def test_token_ordenado_por_tiempo_y_reintenta_colisiones(self):
+        self.assertLess(generar_token(1_700_000_000), generar_token(1_700_000_001))
+
+        # Los tokens antiguos de 10 caracteres siguen resolviendo
+        antigua = UsuarioSesion.objects.create(token='ABCDEF1234')
+        self.assertEqual(UsuarioSesion.objects.get(token='ABCDEF1234'), antigua)
+
+        existente = UsuarioSesion.objects.create()
+        with mock.patch('quiz.models.generar_token', side_effect=[existente.token, '0000000ZZZZZ']):
+            sesion = UsuarioSesion.objects.create()
+        self.assertEqual(sesion.token, '0000000ZZZZZ')
+
+    def test_posicion_de_pregunta_al_cambiar_de_eleccion(self):
+        actual = Eleccion.objects.create(nombre="Actual", anio=2026)
+        pasada = Eleccion.objects.create(nombre="Pasada", anio=2021)
+        primera, segunda = (Pregunta.objects.create(eleccion=actual, eje='X', direccion=1, texto=t) for t in "AB")
+        for texto in "CD":
+            Pregunta.objects.create(eleccion=pasada, eje='X', direccion=1, texto=texto)
+        self.assertEqual((primera.posicion, segunda.posicion), (0, 1))
+
+        # Cargada de la base de datos y guardada solo con update_fields
+        movida = Pregunta.objects.get(pk=segunda.pk)
+        movida.eleccion = pasada
+        movida.save(update_fields=['eleccion'])
+        self.assertEqual(Pregunta.objects.get(pk=segunda.pk).posicion, 2)
+        self.assertEqual(list(pasada.preguntas.order_by('posicion').values_list('texto', flat=True)), ["C", "D", "B"])
+
+        movida.texto = "B editada"
+        movida.save()
+        self.assertEqual(Pregunta.objects.get(pk=segunda.pk).posicion, 2)
+
+    def test_posicion_de_pregunta_borrada_no_se_reutiliza(self):
+        eleccion = Eleccion.objects.create(nombre="Actual", anio=2026)
+        a, b = (Pregunta.objects.create(eleccion=eleccion, eje='X', direccion=1, texto=t) for t in "ab")
+        sesion = UsuarioSesion.objects.create(eleccion=eleccion, respuestas_empaquetadas=bytes([1, 2]))
+        b.delete()
+
+        c = Pregunta.objects.create(eleccion=eleccion, eje='X', direccion=1, texto="c")
+        self.assertEqual((a.posicion, c.posicion), (0, 2))
+        # La respuesta que la sesión dio a b no pasa a c
+        self.assertEqual(leer_respuestas(sesion), {a.id: 1})
 
     def test_rol_admin_is_staff(self):
         user = Usuario.objects.create(username="admin_test", rol="admin")
-        self.assertTrue(user.is_staff)
\ No newline at end of file
+        self.assertTrue(user.is_staff)